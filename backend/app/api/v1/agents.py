@@ -1,7 +1,13 @@
+import asyncio
+import time
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.deps import get_current_user, get_db
+from app.core.config import settings
+from app.core.deps import get_current_admin_user, get_current_user, get_db
+from app.core.near_cache import near_cache
+from app.core.redis import browser_state
 from app.models.user import User
 from app.models.agent import Agent, Thread
 from app.schemas.agent import (
@@ -10,15 +16,59 @@ from app.schemas.agent import (
     AgentResponse,
     ThreadCreate,
     ThreadResponse,
+    ThreadBatchCreate,
+    ThreadBatchItem,
+    ThreadBatchResponse,
+    ThreadComplete,
+    ThreadLogAppend,
+    ThreadLogResponse,
+    ScheduleCreate,
+    ScheduleResponse,
     AgentWithThreads
 )
 from app.services.browser_manager import BrowserManager
+from app.services.fair_scheduler import agent_task_queue
+from app.services.run_scheduler import run_scheduler
+from app.services.thread_logs import thread_logs
 from app.crud.agent import agent_crud
 from app.crud.thread import thread_crud
+from app.crud.user import user_crud
 
 router = APIRouter()
 browser_manager = BrowserManager()
 
+# Статусы потоков, занимающих слот лимита агента
+ACTIVE_THREAD_STATUSES = ["created", "running"]
+
+def persist_profile(agent: Agent) -> bool:
+    """Сохранять ли профиль браузера агента между потоками"""
+    return (agent.browser_config or {}).get("persist_profile", settings.BROWSER_PROFILES_DEFAULT)
+
+def browser_options(agent: Agent) -> dict:
+    """Параметры запуска браузера для агента"""
+    browser_config = agent.browser_config or {}
+    # Явный класс в настройках агента важнее пресета и адаптивного подбора
+    explicit_class = browser_config.get("resource_class")
+    return {
+        "preset_id": agent.preset_id,
+        "resource_class": explicit_class or agent.preset.resource_class,
+        "adaptive": explicit_class is None,
+        "persist_profile": persist_profile(agent),
+    }
+
+def launch_task(agent: Agent, thread_id: int) -> dict:
+    """
+    Задача воркеру на запуск браузера потока. Ставится без срока хранения
+    (ttl=0): потерянная задача оставила бы поток в статусе created
+    """
+    return {
+        "type": "launch_thread",
+        "agent_id": agent.id,
+        "thread_id": thread_id,
+        "options": browser_options(agent),
+        "enqueued_at": time.time(),
+    }
+
 @router.post("/agents", response_model=AgentResponse)
 async def create_agent(
     agent_in: AgentCreate,
@@ -26,6 +76,7 @@ async def create_agent(
     current_user: User = Depends(get_current_user)
 ):
     """Создание нового агента"""
+    current_user = await user_crud.get(db, id=current_user.id, profile="with_agents")
     if not current_user.can_create_agent():
         raise HTTPException(
             status_code=403,
@@ -35,12 +86,37 @@ async def create_agent(
     agent = await agent_crud.create(db, obj_in=agent_in, user_id=current_user.id)
     return agent
 
+async def list_page(
+    crud,
+    db: AsyncSession,
+    response: Response,
+    filters: dict,
+    skip: Optional[int],
+    limit: int,
+    cursor: Optional[str]
+) -> list:
+    """
+    Страница списка: со skip - прежний режим OFFSET, иначе пагинация по
+    ключу с курсором следующей страницы в заголовке X-Next-Cursor
+    """
+    if skip is not None:
+        return await crud.get_multi(db, skip=skip, limit=limit, filters=filters)
+    try:
+        objs, next_cursor = await crud.get_page(db, limit=limit, cursor=cursor, filters=filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return objs
+
 @router.get("/agents", response_model=List[AgentResponse])
 async def get_agents(
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
+    skip: Optional[int] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None
 ):
     """Получение списка агентов"""
@@ -48,10 +124,7 @@ async def get_agents(
     if status:
         filters["status"] = status
     
-    agents = await agent_crud.get_multi(
-        db, skip=skip, limit=limit, filters=filters
-    )
-    return agents
+    return await list_page(agent_crud, db, response, filters, skip, limit, cursor)
 
 @router.get("/agents/{agent_id}", response_model=AgentWithThreads)
 async def get_agent(
@@ -60,7 +133,7 @@ async def get_agent(
     current_user: User = Depends(get_current_user)
 ):
     """Получение информации об агенте"""
-    agent = await agent_crud.get(db, id=agent_id)
+    agent = await agent_crud.get(db, id=agent_id, profile="with_threads")
     if not agent:
         raise HTTPException(status_code=404, detail="Агент не найден")
     if agent.user_id != current_user.id:
@@ -92,7 +165,7 @@ async def delete_agent(
     current_user: User = Depends(get_current_user)
 ):
     """Удаление агента"""
-    agent = await agent_crud.get(db, id=agent_id)
+    agent = await agent_crud.get(db, id=agent_id, profile="with_threads")
     if not agent:
         raise HTTPException(status_code=404, detail="Агент не найден")
     if agent.user_id != current_user.id:
@@ -117,14 +190,17 @@ async def create_thread(
     current_user: User = Depends(get_current_user)
 ):
     """Создание нового потока для агента"""
-    agent = await agent_crud.get(db, id=agent_id)
+    agent = await agent_crud.get(db, id=agent_id, profile="with_preset")
     if not agent:
         raise HTTPException(status_code=404, detail="Агент не найден")
     if agent.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
     
-    # Проверка количества активных потоков
-    active_threads = len([t for t in agent.threads if t.status == "running"])
+    # Проверка количества активных потоков: поставленные в очередь на запуск
+    # (created) занимают слот так же, как выполняющиеся
+    active_threads = await thread_crud.count_by_status(
+        db, agent_id=agent_id, statuses=ACTIVE_THREAD_STATUSES
+    )
     if active_threads >= agent.preset.max_threads:
         raise HTTPException(
             status_code=400,
@@ -133,9 +209,19 @@ async def create_thread(
     
     # Создание потока
     thread = await thread_crud.create(db, obj_in=thread_in, agent_id=agent_id)
+
+    # Браузер запустит воркер, поток остается в статусе created
+    if settings.THREAD_LAUNCH_VIA_QUEUE:
+        await agent_task_queue.enqueue(
+            current_user.id, current_user.role, launch_task(agent, thread.id), ttl=0
+        )
+        return thread
     
     # Запуск browser-use в фоне
-    browser_id = await browser_manager.create_browser(agent_id, thread.id)
+    options = browser_options(agent)
+    browser_id = await browser_manager.create_browser(
+        agent_id, thread.id, **options
+    )
     if browser_id:
         thread = await thread_crud.update(
             db,
@@ -150,13 +236,106 @@ async def create_thread(
     
     return thread
 
+@router.post("/agents/{agent_id}/threads/batch", response_model=ThreadBatchResponse)
+async def create_threads_batch(
+    agent_id: int,
+    batch_in: ThreadBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Пакетный запуск нескольких потоков агента"""
+    agent = await agent_crud.get(db, id=agent_id, profile="with_preset")
+    if not agent:
+        raise HTTPException(status_code=404, detail="Агент не найден")
+    if agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
+
+    # Проверка количества активных потоков с учетом всего пакета
+    active_threads = await thread_crud.count_by_status(
+        db, agent_id=agent_id, statuses=ACTIVE_THREAD_STATUSES
+    )
+    if active_threads + batch_in.count > agent.preset.max_threads:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Достигнут лимит активных потоков ({agent.preset.max_threads})"
+        )
+
+    # Все потоки создаются одним INSERT
+    threads = await thread_crud.create_batch(
+        db, obj_in=batch_in.thread, agent_id=agent_id, count=batch_in.count
+    )
+
+    if settings.THREAD_LAUNCH_VIA_QUEUE:
+        await agent_task_queue.enqueue_many(
+            current_user.id,
+            current_user.role,
+            [launch_task(agent, thread.id) for thread in threads],
+            ttl=0
+        )
+        return ThreadBatchResponse(
+            started=0,
+            failed=0,
+            results=[
+                ThreadBatchItem(thread_id=thread.id, status=thread.status)
+                for thread in threads
+            ]
+        )
+
+    # Браузеры запускаются параллельно с ограничением
+    options = browser_options(agent)
+    semaphore = asyncio.Semaphore(settings.THREAD_BATCH_CONCURRENCY)
+
+    async def start(thread: Thread) -> Optional[str]:
+        async with semaphore:
+            return await browser_manager.create_browser(
+                agent_id, thread.id, **options
+            )
+
+    browser_ids = await asyncio.gather(*(start(thread) for thread in threads))
+
+    started_at = datetime.utcnow()
+    outcomes = []
+    results = []
+    for thread, browser_id in zip(threads, browser_ids):
+        if browser_id:
+            outcomes.append({
+                "id": thread.id,
+                "status": "running",
+                "browser_id": browser_id,
+                "start_time": started_at,
+            })
+            results.append(ThreadBatchItem(
+                thread_id=thread.id, status="running", browser_id=browser_id
+            ))
+        else:
+            outcomes.append({
+                "id": thread.id,
+                "status": "error",
+                "error_message": "Не удалось запустить браузер",
+            })
+            results.append(ThreadBatchItem(
+                thread_id=thread.id, status="error", error="Не удалось запустить браузер"
+            ))
+
+    # Результаты записываются одним UPDATE
+    await thread_crud.set_batch_outcomes(db, outcomes=outcomes)
+
+    started = sum(1 for browser_id in browser_ids if browser_id)
+    return ThreadBatchResponse(
+        started=started,
+        failed=len(threads) - started,
+        results=results
+    )
+
 @router.get("/agents/{agent_id}/threads", response_model=List[ThreadResponse])
 async def get_threads(
     agent_id: int,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
+    skip: Optional[int] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None
 ):
     """Получение списка потоков агента"""
@@ -170,10 +349,7 @@ async def get_threads(
     if status:
         filters["status"] = status
     
-    threads = await thread_crud.get_multi(
-        db, skip=skip, limit=limit, filters=filters
-    )
-    return threads
+    return await list_page(thread_crud, db, response, filters, skip, limit, cursor)
 
 @router.post("/agents/{agent_id}/threads/{thread_id}/stop")
 async def stop_thread(
@@ -183,7 +359,7 @@ async def stop_thread(
     current_user: User = Depends(get_current_user)
 ):
     """Остановка потока"""
-    thread = await thread_crud.get(db, id=thread_id)
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
     if not thread or thread.agent_id != agent_id:
         raise HTTPException(status_code=404, detail="Поток не найден")
     if thread.agent.user_id != current_user.id:
@@ -202,4 +378,228 @@ async def stop_thread(
     raise HTTPException(
         status_code=500,
         detail="Не удалось остановить поток"
-    )
\ No newline at end of file
+    )
+
+@router.get("/agents/{agent_id}/threads/{thread_id}/telemetry")
+async def get_thread_telemetry(
+    agent_id: int,
+    thread_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Ряды потребления CPU, памяти и сети браузером потока"""
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
+    if not thread or thread.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Поток не найден")
+    if thread.agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому потоку")
+
+    telemetry = None
+    if thread.browser_id:
+        telemetry = await browser_manager.get_browser_telemetry(thread.browser_id)
+    if not telemetry:
+        raise HTTPException(status_code=404, detail="Нет телеметрии для потока")
+    return telemetry
+
+@router.post("/agents/{agent_id}/threads/{thread_id}/logs")
+async def append_thread_logs(
+    agent_id: int,
+    thread_id: int,
+    log_in: ThreadLogAppend,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Добавление строк в лог потока (запись в базу выполняется пакетами)"""
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
+    if not thread or thread.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Поток не найден")
+    if thread.agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому потоку")
+
+    pending = await thread_logs.append(thread_id, log_in.lines)
+    # Запись в лог - активность потока, откладывающая таймаут простоя
+    if thread.browser_id:
+        await browser_manager.touch_browser(thread.browser_id)
+    return {"appended": len(log_in.lines), "pending": pending}
+
+@router.get("/agents/{agent_id}/threads/{thread_id}/logs", response_model=ThreadLogResponse)
+async def get_thread_logs(
+    agent_id: int,
+    thread_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Лог потока, включая еще не записанные в базу строки"""
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
+    if not thread or thread.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Поток не найден")
+    if thread.agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому потоку")
+
+    return ThreadLogResponse(thread_id=thread_id, logs=await thread_logs.read(db, thread_id))
+
+@router.get("/agents/{agent_id}/telemetry")
+async def get_agent_telemetry(
+    agent_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Сводное потребление ресурсов браузерами агента и его пресета"""
+    agent = await agent_crud.get(db, id=agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Агент не найден")
+    if agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
+
+    return {
+        "agent": await browser_state.get_usage("agent", agent_id),
+        "preset": await browser_state.get_usage("preset", agent.preset_id),
+    }
+
+@router.post("/agents/{agent_id}/schedules", response_model=ScheduleResponse)
+async def create_schedule(
+    agent_id: int,
+    schedule_in: ScheduleCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Отложенный или повторяющийся запуск потока агента"""
+    agent = await agent_crud.get(db, id=agent_id, profile="with_preset")
+    if not agent:
+        raise HTTPException(status_code=404, detail="Агент не найден")
+    if agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
+    if not schedule_in.run_at and not schedule_in.interval:
+        raise HTTPException(status_code=400, detail="Укажите время запуска или интервал")
+
+    return await run_scheduler.create(
+        agent_id,
+        current_user.id,
+        current_user.role,
+        thread=schedule_in.thread.model_dump(),
+        options=browser_options(agent),
+        run_at=schedule_in.run_at.timestamp() if schedule_in.run_at else None,
+        interval=schedule_in.interval
+    )
+
+@router.get("/agents/{agent_id}/schedules", response_model=List[ScheduleResponse])
+async def get_schedules(
+    agent_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Расписания запусков агента"""
+    agent = await agent_crud.get(db, id=agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Агент не найден")
+    if agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
+
+    return await run_scheduler.list_for_agent(agent_id)
+
+@router.delete("/agents/{agent_id}/schedules/{schedule_id}")
+async def delete_schedule(
+    agent_id: int,
+    schedule_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Удаление расписания запусков агента"""
+    agent = await agent_crud.get(db, id=agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Агент не найден")
+    if agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому агенту")
+
+    if not await run_scheduler.delete(agent_id, schedule_id):
+        raise HTTPException(status_code=404, detail="Расписание не найдено")
+    return {"message": "Расписание успешно удалено"}
+
+@router.post("/agents/{agent_id}/threads/{thread_id}/complete", response_model=ThreadResponse)
+async def complete_thread(
+    agent_id: int,
+    thread_id: int,
+    complete_in: ThreadComplete,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Завершение потока с сохранением профиля браузера при успехе"""
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
+    if not thread or thread.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Поток не найден")
+    if thread.agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому потоку")
+
+    if thread.browser_id:
+        await browser_manager.complete_browser(thread.browser_id, complete_in.success)
+
+    thread = await thread_crud.complete_thread(
+        db,
+        thread_id=thread_id,
+        success=complete_in.success,
+        error_message=complete_in.error_message,
+        results=complete_in.results
+    )
+    return thread
+
+@router.post("/agents/{agent_id}/threads/{thread_id}/extend")
+async def extend_thread(
+    agent_id: int,
+    thread_id: int,
+    seconds: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Продление лимита времени работы потока"""
+    thread = await thread_crud.get(db, id=thread_id, profile="with_agent")
+    if not thread or thread.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Поток не найден")
+    if thread.agent.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому потоку")
+
+    if not thread.browser_id or not await browser_manager.extend_browser(thread.browser_id, seconds):
+        raise HTTPException(status_code=400, detail="Поток не выполняется")
+    return {"message": f"Лимит потока продлен на {seconds} с"}
+
+@router.get("/browsers/pool")
+async def get_browser_pool_metrics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Метрики тёплого пула браузеров"""
+    return browser_manager.get_pool_metrics()
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Счетчики локального кеша Redis этого процесса"""
+    return near_cache.stats()
+
+@router.get("/browsers/hosts")
+async def get_browser_hosts(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Состояние Docker-хостов браузеров"""
+    return browser_manager.get_hosts()
+
+@router.post("/browsers/hosts/{host_name}/drain")
+async def drain_browser_host(
+    host_name: str,
+    stop_running: bool = False,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Вывод Docker-хоста из эксплуатации"""
+    if host_name not in browser_manager.hosts.hosts:
+        raise HTTPException(status_code=404, detail="Хост не найден")
+    return await browser_manager.drain_host(host_name, stop_running=stop_running)
+
+@router.post("/browsers/hosts/{host_name}/undrain")
+async def undrain_browser_host(
+    host_name: str,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Возврат Docker-хоста в эксплуатацию"""
+    if host_name not in browser_manager.hosts.hosts:
+        raise HTTPException(status_code=404, detail="Хост не найден")
+    await browser_manager.undrain_host(host_name)
+    return {"message": f"Хост {host_name} возвращен в эксплуатацию"}
@@ -0,0 +1,108 @@
+import json
+import zlib
+from typing import Any, Optional
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# Первый байт закодированного значения. Старые значения - JSON-текст,
+# который начинается с печатного ASCII-символа, поэтому не путается с
+# заголовком. Старший бит заголовка означает сжатие zlib.
+FORMAT_JSON = 0x01
+FORMAT_MSGPACK = 0x02
+COMPRESSED = 0x80
+
+class CodecError(ValueError):
+    """Значение не удалось закодировать или декодировать"""
+
+def json_dumps(value: Any) -> str:
+    """
+    JSON-текст значения, через orjson, если он установлен
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+def json_loads(data: Any) -> Any:
+    """
+    Разбор JSON-текста или байтов
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class Codec:
+    """
+    Кодирование значений Redis в байты с заголовком формата.
+
+    Значения больше порога сжимаются zlib. Декодирование определяет формат
+    по заголовку, значения без заголовка читаются как JSON, поэтому ранее
+    записанные данные остаются доступны после смены кодека.
+    """
+
+    def __init__(
+        self,
+        name: str = "json",
+        compress_threshold: Optional[int] = None,
+        compress_level: Optional[int] = None
+    ):
+        if name not in ("json", "orjson", "msgpack"):
+            raise ValueError(f"Неизвестный кодек {name}")
+        if name == "msgpack" and msgpack is None:
+            raise RuntimeError("Для кодека msgpack нужен пакет msgpack")
+        if name == "orjson" and orjson is None:
+            raise RuntimeError("Для кодека orjson нужен пакет orjson")
+        self.name = name
+        self.compress_threshold = (
+            settings.REDIS_COMPRESS_THRESHOLD if compress_threshold is None else compress_threshold
+        )
+        self.compress_level = compress_level or settings.REDIS_COMPRESS_LEVEL
+
+    def encode(self, value: Any) -> bytes:
+        try:
+            if self.name == "msgpack":
+                header, body = FORMAT_MSGPACK, msgpack.packb(value, use_bin_type=True)
+            elif self.name == "orjson":
+                header, body = FORMAT_JSON, orjson.dumps(value)
+            else:
+                header, body = FORMAT_JSON, json.dumps(value).encode()
+        except (TypeError, ValueError) as e:
+            raise CodecError(str(e)) from e
+
+        if 0 <= self.compress_threshold < len(body):
+            header, body = header | COMPRESSED, zlib.compress(body, self.compress_level)
+        return bytes([header]) + body
+
+    def decode(self, data: bytes) -> Any:
+        try:
+            header = data[0]
+            if header & ~COMPRESSED not in (FORMAT_JSON, FORMAT_MSGPACK):
+                # Значение, записанное до появления кодеков
+                return json_loads(data)
+
+            body = data[1:]
+            if header & COMPRESSED:
+                body = zlib.decompress(body)
+            if header & ~COMPRESSED == FORMAT_MSGPACK:
+                if msgpack is None:
+                    raise CodecError("Для чтения значения нужен пакет msgpack")
+                return msgpack.unpackb(body, raw=False)
+            return json_loads(body)
+        except CodecError:
+            raise
+        except Exception as e:
+            raise CodecError(str(e)) from e
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Кодек из настроек
+    """
+    return Codec(name or settings.REDIS_CODEC)
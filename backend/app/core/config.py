@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, validator
 
@@ -6,6 +6,7 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Replinet"
     VERSION: str = "0.1.0"
     DESCRIPTION: str = "AI Agents Management System"
+    API_V1_STR: str = "/api/v1"
     
     # JWT
     SECRET_KEY: str = "your-secret-key-here"  # в продакшене использовать переменную окружения
@@ -14,10 +15,63 @@ class Settings(BaseSettings):
     
     # База данных
     DATABASE_URL: str
+    CRUD_COUNT_ESTIMATE_MIN: int = 100000  # строк, начиная с которых count(estimate=True) использует оценку
+    CRUD_BULK_CHUNK_SIZE: int = 1000  # строк на один запрос массовых операций
+    CRUD_COPY_MIN_ROWS: int = 10000  # строк, начиная с которых create_many без RETURNING использует COPY
+    DB_RAISE_ON_LAZY_LOAD: bool = False  # для тестов: ошибка при неявной загрузке связей
     
     # Redis
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
+    REDIS_CODEC: str = "json"  # json, orjson или msgpack
+    REDIS_COMPRESS_THRESHOLD: int = 1024  # в байтах, -1 - без сжатия
+    REDIS_COMPRESS_LEVEL: int = 1
+    # Локальный кеш перед Redis: префиксы ключей, например ["browser:", "cache:"]
+    NEAR_CACHE_PREFIXES: List[str] = []
+    NEAR_CACHE_MAX_ENTRIES: int = 10000
+    NEAR_CACHE_TTL: float = 30.0  # в секундах
+    # Кеш чтений CRUD по таблицам: {"agents": 60, "presets": 300, "users": 60}
+    CRUD_CACHE_TTL: Dict[str, int] = {}
+    CRUD_CACHE_VERSION_TTL: int = 7 * 24 * 3600  # должен превышать TTL значений
+
+    # Task Queue
+    TASK_VISIBILITY_TIMEOUT: int = 300  # в секундах, после чего невыполненная задача возвращается в очередь
+    TASK_MAX_DELIVERIES: int = 5  # после стольких выдач задача уходит в очередь недоставленных
+    TASK_REAPER_BATCH_SIZE: int = 100
+    THREAD_LAUNCH_VIA_QUEUE: bool = False  # запуск браузеров потоков воркерами, а не в запросе API
+    TASK_METRICS_QUEUES: List[str] = ["agent_tasks"]  # очереди, публикуемые в /metrics
+
+    # Worker
+    WORKER_CONCURRENCY: int = 10  # задач, выполняемых одновременно одним воркером
+    WORKER_PREFETCH: int = 20  # задач, выбираемых заранее из очереди
+    WORKER_POLL_INTERVAL: float = 1.0  # в секундах, пауза при пустой очереди или нехватке браузеров
+    WORKER_DRAIN_TIMEOUT: float = 60.0  # в секундах, ожидание выполняющихся задач при остановке
+    WORKER_REAPER_INTERVAL: float = 15.0
+    WORKER_METRICS_INTERVAL: float = 60.0
+
+    # Thread Logs
+    THREAD_LOG_FLUSH_INTERVAL: float = 5.0  # в секундах, максимальная задержка записи логов в базу
+    THREAD_LOG_FLUSH_SIZE: int = 500  # строк в потоке, после которых запись выполняется сразу
+    THREAD_LOG_FLUSH_BATCH: int = 200  # потоков за один проход
+    THREAD_LOG_STREAM_MAXLEN: int = 100000  # защитный предел строк в Redis на поток
+
+    # Scheduled Runs
+    SCHEDULE_MIN_INTERVAL: int = 60  # в секундах, минимальный интервал повторяющегося запуска
+    SCHEDULE_JITTER: int = 60  # в секундах, разброс времени запуска повторяющихся расписаний
+    SCHEDULER_BATCH_SIZE: int = 500  # запусков, переносимых в очередь за один проход
+    SCHEDULER_INTERVAL: float = 1.0
+    SCHEDULER_LOCK_TTL: int = 30
+
+    # Веса справедливого распределения задач между пользователями по ролям
+    FAIR_SHARE_WEIGHTS: Dict[str, int] = {
+        "super_admin": 8,
+        "admin": 8,
+        "team_organizer": 6,
+        "team_member": 3,
+        "pro_user": 4,
+        "free_user": 1,
+        "guest": 1,
+    }
     
     # CORS
     CORS_ORIGINS: List[AnyHttpUrl] = [
@@ -41,7 +95,70 @@ class Settings(BaseSettings):
     
     # Browser Settings
     MAX_THREADS_PER_AGENT: int = 5
+    MAX_THREADS_PER_BATCH: int = 50
+    THREAD_BATCH_CONCURRENCY: int = 10  # одновременных запусков браузеров в пакете
     BROWSER_TIMEOUT: int = 30
+    BROWSER_IDLE_TIMEOUT: Optional[int] = None  # в секундах, None - без лимита простоя
+    BROWSER_TIMEOUT_BATCH_SIZE: int = 50
+    MAX_BROWSER_INSTANCES: int = 5
+    BROWSER_LEASE_TTL: int = 60  # в секундах, аренда слота в общем реестре
+    BROWSER_IMAGE: str = "browseruse/browser-use:latest"
+    BROWSER_NETWORK: str = "replinet_network"
+
+    # Классы ресурсов браузеров: имя -> лимиты контейнера (cpu_quota 100000 = 1 CPU).
+    # Класс выбирается в пресете и может быть переопределен в Agent.browser_config
+    BROWSER_RESOURCE_CLASSES: Dict[str, Dict[str, Any]] = {
+        "light": {"mem_limit": "512m", "cpu_quota": 50000},
+        "standard": {"mem_limit": "1g", "cpu_quota": 100000},
+        "heavy": {"mem_limit": "2g", "cpu_quota": 200000},
+    }
+    DEFAULT_BROWSER_RESOURCE_CLASS: str = "standard"
+
+    # Адаптивный режим: класс подбирается по пиковому потреблению последних запусков агента
+    BROWSER_ADAPTIVE_LIMITS: bool = False
+    BROWSER_ADAPTIVE_MIN_RUNS: int = 3
+    BROWSER_ADAPTIVE_HISTORY: int = 20
+    BROWSER_ADAPTIVE_HEADROOM: float = 1.25
+
+    # Тёплый пул: количество заранее запущенных контейнеров по классам ресурсов
+    BROWSER_WARM_POOL_SIZES: Dict[str, int] = {"standard": 2}
+    BROWSER_WARM_POOL_REFILL_INTERVAL: float = 5.0  # в секундах
+
+    # Docker-хосты для размещения браузеров; без url используется docker.from_env().
+    # memory/cpus задают емкость хоста, иначе она берется из docker info
+    DOCKER_HOSTS: List[Dict[str, Any]] = [{"name": "local"}]
+    BROWSER_PLACEMENT_STRATEGY: str = "binpack"  # binpack, least_loaded
+    DOCKER_HOSTS_SYNC_INTERVAL: float = 15.0  # в секундах
+
+    # Телеметрия браузеров: точек в кольцевом буфере (~1 точка в секунду),
+    # максимум одновременных потоков docker stats, интервал выгрузки в Redis
+    BROWSER_TELEMETRY_WINDOW: int = 300
+    BROWSER_TELEMETRY_MAX_STREAMS: int = 256
+    BROWSER_TELEMETRY_FLUSH_INTERVAL: float = 10.0
+
+    # Снимки профилей браузера по агентам (каталог общий для менеджера и Docker-хостов)
+    BROWSER_PROFILES_DIR: str = "/var/lib/replinet/profiles"
+    BROWSER_PROFILE_MAX_BYTES: int = 512 * 1024 ** 2
+    BROWSER_PROFILES_MAX_TOTAL_BYTES: int = 20 * 1024 ** 3
+    # По умолчанию выключено: браузеры с профилем запускаются без тёплого пула
+    BROWSER_PROFILES_DEFAULT: bool = False  # если в browser_config не задан persist_profile
+
+    # Docker: пул потоков для вызовов SDK, лимиты параллельности и таймауты операций
+    DOCKER_EXECUTOR_WORKERS: int = 32
+    DOCKER_OP_CONCURRENCY: Dict[str, int] = {
+        "run": 10,
+        "stop": 20,
+        "inspect": 20,
+        "list": 2,
+        "default": 10,
+    }
+    DOCKER_OP_TIMEOUTS: Dict[str, float] = {
+        "run": 120.0,
+        "stop": 30.0,
+        "inspect": 10.0,
+        "list": 30.0,
+        "default": 30.0,
+    }
     
     # Roles and Permissions
     ROLES: List[str] = [
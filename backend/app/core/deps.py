@@ -44,8 +44,9 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
         
-    # Получаем пользователя из базы
-    user = await user_crud.get(db, id=int(user_id))
+    # Получаем пользователя из базы, минуя кеш: статус и права должны
+    # быть актуальными, а объект не должен попадать в Redis
+    user = await user_crud.get(db, id=int(user_id), cached=False)
     if not user:
         raise credentials_exception
         
@@ -0,0 +1,48 @@
+from typing import Dict, List
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+def _bound(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+def render_queue_metrics(metrics: Dict[str, dict]) -> str:
+    """
+    Метрики очередей (TaskQueue.get_metrics) в текстовом формате Prometheus
+    """
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    gauges = (
+        ("replinet_queue_depth", "depth", "Задачи, ожидающие выдачи"),
+        ("replinet_queue_oldest_task_age_seconds", "oldest_age_seconds", "Возраст старейшей ожидающей задачи"),
+        ("replinet_queue_inflight", "inflight", "Задачи в обработке у воркеров"),
+        ("replinet_queue_dead", "dead", "Недоставленные задачи"),
+    )
+    for name, field, help_text in gauges:
+        family(name, "gauge", help_text)
+        for queue, values in metrics.items():
+            lines.append(f"{name}{_labels(queue=queue)} {values[field]}")
+
+    family("replinet_queue_events_total", "counter", "События очереди по типам")
+    for queue, values in metrics.items():
+        for event, count in values["events"].items():
+            lines.append(f"replinet_queue_events_total{_labels(queue=queue, event=event)} {count}")
+
+    histograms = (
+        ("replinet_queue_wait_seconds", "wait", "Ожидание от постановки до выдачи"),
+        ("replinet_queue_processing_seconds", "run", "Выполнение от выдачи до подтверждения или отказа"),
+    )
+    for name, field, help_text in histograms:
+        family(name, "histogram", help_text)
+        for queue, values in metrics.items():
+            histogram = values[field]
+            for bound, count in histogram["buckets"]:
+                lines.append(f"{name}_bucket{_labels(queue=queue, le=_bound(bound))} {count}")
+            lines.append(f"{name}_sum{_labels(queue=queue)} {histogram['sum']}")
+            lines.append(f"{name}_count{_labels(queue=queue)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class NearCache:
+    """
+    Локальный LRU-кеш с TTL перед Redis.
+
+    Кешируются только ключи с префиксами из NEAR_CACHE_PREFIXES. Значения
+    хранятся в закодированном виде, поэтому каждый читатель получает свою
+    копию. Запись или удаление ключа в любом процессе публикует его имя в
+    канал инвалидации, и все процессы удаляют локальную копию. Пока
+    подписка на канал не активна, кеш не используется.
+    """
+
+    channel = "cache:invalidate"
+
+    def __init__(
+        self,
+        prefixes: Optional[List[str]] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.prefixes = tuple(settings.NEAR_CACHE_PREFIXES if prefixes is None else prefixes)
+        self.max_entries = max_entries or settings.NEAR_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.NEAR_CACHE_TTL
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        # Номера последних инвалидаций ключей: значение, прочитанное до
+        # инвалидации, не попадает в кеш. Для забытых ключей действует _floor
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self._floor = 0
+        self.active = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def matches(self, key: str) -> bool:
+        """
+        Подпадает ли ключ под кеширование (в каком-либо процессе)
+        """
+        return bool(self.prefixes) and key.startswith(self.prefixes)
+
+    def enabled_for(self, key: str) -> bool:
+        return self.active and self.matches(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def generation(self) -> int:
+        """
+        Номер поколения, запоминается перед чтением из Redis
+        """
+        return self._generation
+
+    def put(self, key: str, value: bytes, generation: int):
+        if not self.active or max(self._floor, self._generations.get(key, 0)) > generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._generation += 1
+        self._generations[key] = self._generation
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+        if len(self._generations) > self.max_entries:
+            # Забытые номера заменяются общим нижним порогом
+            self._generations = {}
+            self._floor = self._generation
+
+    def clear(self):
+        self._generation += 1
+        self._generations = {}
+        self._floor = self._generation
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "active": self.active,
+            "prefixes": list(self.prefixes),
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    async def listen(self, client):
+        """
+        Подписка на канал инвалидации с переподключением
+        """
+        if not self.prefixes:
+            return
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self.clear()
+                self.active = True
+                logger.info("Локальный кеш Redis включен")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Подписка на инвалидацию кеша прервана: {e}")
+            finally:
+                # Пропущенные сообщения нельзя восстановить, кеш сбрасывается
+                self.active = False
+                self.clear()
+                await pubsub.close()
+            await asyncio.sleep(1)
+
+# Создаем глобальный экземпляр локального кеша
+near_cache = NearCache()
@@ -1,7 +1,13 @@
-from typing import Any, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 import json
+import os
+import socket
+import time
+import uuid
 import redis.asyncio as redis
 from app.core.config import settings
+from app.core.codecs import CodecError, get_codec, json_dumps, json_loads
+from app.core.near_cache import near_cache
 
 # Создаем пул подключений к Redis
 redis_pool = redis.ConnectionPool(
@@ -12,21 +18,52 @@ redis_pool = redis.ConnectionPool(
     max_connections=10
 )
 
+# Пул без декодирования ответов для значений, записанных кодеком
+redis_binary_pool = redis.ConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=0,
+    decode_responses=False,
+    max_connections=10
+)
+
 class RedisManager:
     def __init__(self):
         self.redis = redis.Redis(connection_pool=redis_pool)
+        self.binary = redis.Redis(connection_pool=redis_binary_pool)
+        self.codec = get_codec()
+        self.near_cache = near_cache
         self.default_ttl = 3600  # 1 час
 
     async def get(self, key: str) -> Optional[Any]:
         """
         Получить значение из Redis
         """
+        cached = self.near_cache.enabled_for(key)
+        value = self.near_cache.get(key) if cached else None
+        if value is None:
+            generation = self.near_cache.generation()
+            value = await self.binary.get(key)
+            if cached and value:
+                self.near_cache.put(key, value, generation)
         try:
-            value = await self.redis.get(key)
-            return json.loads(value) if value else None
-        except (json.JSONDecodeError, TypeError):
+            return self.codec.decode(value) if value else None
+        except CodecError:
             return None
 
+    async def _invalidate(self, *keys: str):
+        """
+        Сбросить локальные копии ключей во всех процессах
+        """
+        keys = [key for key in keys if self.near_cache.matches(key)]
+        if not keys:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                self.near_cache.invalidate(key)
+                pipe.publish(self.near_cache.channel, key)
+            await pipe.execute()
+
     async def set(
         self,
         key: str,
@@ -37,20 +74,24 @@ class RedisManager:
         Установить значение в Redis
         """
         try:
-            serialized = json.dumps(value)
-            return await self.redis.set(
-                key,
-                serialized,
-                ex=ttl or self.default_ttl
-            )
-        except (TypeError, json.JSONError):
+            serialized = self.codec.encode(value)
+        except CodecError:
             return False
+        result = await self.binary.set(
+            key,
+            serialized,
+            ex=ttl or self.default_ttl
+        )
+        await self._invalidate(key)
+        return result
 
     async def delete(self, key: str) -> bool:
         """
         Удалить значение из Redis
         """
-        return await self.redis.delete(key) > 0
+        deleted = await self.redis.delete(key) > 0
+        await self._invalidate(key)
+        return deleted
 
     async def exists(self, key: str) -> bool:
         """
@@ -70,8 +111,175 @@ class RedisManager:
         """
         return await self.redis.decr(key)
 
+    async def acquire_lock(self, name: str, ttl: int) -> Optional[str]:
+        """
+        Захватить блокировку на ttl секунд. Возвращает токен владельца
+        или None, если блокировка занята
+        """
+        token = uuid.uuid4().hex
+        if await self.redis.set(f"lock:{name}", token, nx=True, ex=ttl):
+            return token
+        return None
+
+    async def release_lock(self, name: str, token: str) -> bool:
+        """
+        Освободить блокировку, если она еще принадлежит владельцу токена
+        """
+        return bool(await self.redis.eval(
+            "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+            "return redis.call('DEL', KEYS[1]) else return 0 end",
+            1,
+            f"lock:{name}",
+            token
+        ))
+
+# Резервирование слота: истекшие аренды удаляются, затем проверяется лимит.
+# Время берется из Redis, чтобы аренды не зависели от часов API-процессов.
+RESERVE_CAPACITY_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms)
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('ZADD', KEYS[1], now_ms + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+RENEW_LEASES_SCRIPT = """
+local now = redis.call('TIME')
+local expires = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000) + tonumber(ARGV[1])
+local renewed = 0
+for i = 2, #ARGV do
+    renewed = renewed + redis.call('ZADD', KEYS[1], 'XX', 'CH', expires, ARGV[i])
+end
+return renewed
+"""
+
+# Удаление браузера из реестра вместе с освобождением его аренды,
+# отметками активности и продлениями
+UNREGISTER_BROWSER_SCRIPT = """
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if not value then
+    return false
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+local lease = cjson.decode(value)['lease']
+if lease then
+    redis.call('ZREM', KEYS[2], lease)
+end
+return value
+"""
+
+# Отметка активности браузера из реестра временем Redis
+TOUCH_BROWSER_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+local now = redis.call('TIME')
+redis.call('HSET', KEYS[2], ARGV[1], now[1] .. '.' .. string.format('%06d', tonumber(now[2])))
+return 1
+"""
+
+# Продление лимита браузера из реестра: секунды копятся до того, как их
+# заберет процесс-владелец
+EXTEND_BROWSER_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+return 1
+"""
+
+# Забрать отметки активности и продления браузеров. Для каждого браузера
+# возвращается давность активности по часам Redis (-1, если отметки нет),
+# поэтому процессу не нужно сверять свои часы с часами Redis, и сумма
+# продлений в секундах
+TAKE_DEADLINE_UPDATES_SCRIPT = """
+local now = redis.call('TIME')
+local now_s = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local result = {}
+for i = 1, #ARGV do
+    local at = redis.call('HGET', KEYS[1], ARGV[i])
+    local extension = redis.call('HGET', KEYS[2], ARGV[i])
+    redis.call('HDEL', KEYS[1], ARGV[i])
+    redis.call('HDEL', KEYS[2], ARGV[i])
+    result[2 * i - 1] = at and tostring(now_s - tonumber(at)) or '-1'
+    result[2 * i] = extension or '0'
+end
+return result
+"""
+
+# Удаление записей реестра, аренда которых истекла (процесс-владелец умер)
+PRUNE_REGISTRY_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now_ms)
+local entries = redis.call('HGETALL', KEYS[1])
+local pruned = 0
+for i = 1, #entries, 2 do
+    local lease = cjson.decode(entries[i + 1])['lease']
+    if not lease or not redis.call('ZSCORE', KEYS[2], lease) then
+        redis.call('HDEL', KEYS[1], entries[i])
+        pruned = pruned + 1
+    end
+end
+return pruned
+"""
+
+# Накопление сводки потребления ресурсов: пики по максимуму, суммы для средних
+RECORD_USAGE_SCRIPT = """
+if tonumber(ARGV[1]) > tonumber(redis.call('HGET', KEYS[1], 'peak_cpu') or '0') then
+    redis.call('HSET', KEYS[1], 'peak_cpu', ARGV[1])
+end
+if tonumber(ARGV[2]) > tonumber(redis.call('HGET', KEYS[1], 'peak_memory') or '0') then
+    redis.call('HSET', KEYS[1], 'peak_memory', ARGV[2])
+end
+redis.call('HINCRBYFLOAT', KEYS[1], 'cpu_sum', ARGV[3])
+redis.call('HINCRBYFLOAT', KEYS[1], 'memory_sum', ARGV[4])
+redis.call('HINCRBY', KEYS[1], 'samples', ARGV[5])
+return 1
+"""
+
 class BrowserStateManager(RedisManager):
-    """Менеджер для хранения состояния браузеров"""
+    """
+    Менеджер для хранения состояния браузеров.
+
+    Также служит общим реестром браузеров всех API-процессов: запущенные
+    браузеры хранятся в хеше, а занятые слоты - в виде аренд в sorted set
+    со временем истечения. Аренды продлевает процесс-владелец, поэтому
+    слоты упавших процессов освобождаются сами.
+
+    Назначение контейнеров (агент и поток) дополнительно хранится в хеше
+    по имени контейнера без привязки к аренде: по нему сверка берет под
+    управление браузеры упавших процессов, записи которых уже удалены из
+    реестра.
+
+    Активность и продления лимита браузеров записываются в отдельные хеши
+    любым процессом; процесс-владелец забирает их перед остановкой по
+    дедлайну.
+    """
+
+    registry_key = "browsers:registry"
+    leases_key = "browsers:leases"
+    owners_key = "browsers:owners"
+    activity_key = "browsers:activity"
+    extensions_key = "browsers:extensions"
+
+    def __init__(self):
+        super().__init__()
+        self._reserve = self.redis.register_script(RESERVE_CAPACITY_SCRIPT)
+        self._renew = self.redis.register_script(RENEW_LEASES_SCRIPT)
+        self._unregister = self.redis.register_script(UNREGISTER_BROWSER_SCRIPT)
+        self._prune = self.redis.register_script(PRUNE_REGISTRY_SCRIPT)
+        self._touch = self.redis.register_script(TOUCH_BROWSER_SCRIPT)
+        self._extend = self.redis.register_script(EXTEND_BROWSER_SCRIPT)
+        self._take_updates = self.redis.register_script(TAKE_DEADLINE_UPDATES_SCRIPT)
+        self._record_usage = self.redis.register_script(RECORD_USAGE_SCRIPT)
     
     async def set_browser_state(
         self,
@@ -99,34 +307,661 @@ class BrowserStateManager(RedisManager):
         key = f"browser:{browser_id}:state"
         return await self.delete(key)
 
+    async def reserve_capacity(self, lease_id: str, limit: int, ttl: int) -> bool:
+        """
+        Атомарно занять слот под браузер, если общий лимит не исчерпан
+        """
+        return bool(await self._reserve(
+            keys=[self.leases_key],
+            args=[lease_id, limit, ttl * 1000]
+        ))
+
+    async def renew_leases(self, lease_ids: List[str], ttl: int) -> int:
+        """
+        Продлить аренды слотов одним вызовом
+        """
+        if not lease_ids:
+            return 0
+        return await self._renew(keys=[self.leases_key], args=[ttl * 1000, *lease_ids])
+
+    async def release_capacity(self, lease_id: str) -> bool:
+        """
+        Освободить слот
+        """
+        return await self.redis.zrem(self.leases_key, lease_id) > 0
+
+    async def count_leases(self) -> int:
+        """
+        Количество занятых слотов во всем кластере (без истекших аренд)
+        """
+        return await self.redis.zcount(self.leases_key, int(time.time() * 1000), "+inf")
+
+    async def register_browser(self, browser_id: str, info: dict) -> None:
+        """
+        Добавить браузер в общий реестр
+        """
+        await self.redis.hset(self.registry_key, browser_id, json.dumps(info))
+
+    async def unregister_browser(self, browser_id: str) -> Optional[dict]:
+        """
+        Удалить браузер из реестра и освободить его слот
+        """
+        value = await self._unregister(
+            keys=[self.registry_key, self.leases_key, self.activity_key, self.extensions_key],
+            args=[browser_id]
+        )
+        return json.loads(value) if value else None
+
+    async def touch_browser(self, browser_id: str) -> bool:
+        """
+        Отметить активность браузера любого процесса; дедлайн простоя
+        сдвигает процесс-владелец. False, если браузера нет в реестре
+        """
+        return bool(await self._touch(
+            keys=[self.registry_key, self.activity_key],
+            args=[browser_id]
+        ))
+
+    async def extend_browser(self, browser_id: str, seconds: int) -> bool:
+        """
+        Продлить лимит браузера любого процесса; продление применяет
+        процесс-владелец. False, если браузера нет в реестре
+        """
+        return bool(await self._extend(
+            keys=[self.registry_key, self.extensions_key],
+            args=[browser_id, seconds]
+        ))
+
+    async def take_deadline_updates(
+        self,
+        browser_ids: List[str]
+    ) -> Dict[str, Tuple[Optional[float], int]]:
+        """
+        Забрать отметки активности и продления браузеров: секунд с последней
+        активности (None, если отметки нет) и секунд продления
+        """
+        if not browser_ids:
+            return {}
+        result = await self._take_updates(
+            keys=[self.activity_key, self.extensions_key],
+            args=browser_ids
+        )
+        updates = {}
+        for browser_id, age, extension in zip(browser_ids, result[0::2], result[1::2]):
+            age, extension = float(age), int(extension)
+            if age >= 0 or extension:
+                updates[browser_id] = (age if age >= 0 else None, extension)
+        return updates
+
+    async def get_registered_browser(self, browser_id: str) -> Optional[dict]:
+        """
+        Получить запись браузера из реестра
+        """
+        value = await self.redis.hget(self.registry_key, browser_id)
+        return json.loads(value) if value else None
+
+    async def list_registered_browsers(self) -> Dict[str, dict]:
+        """
+        Все браузеры кластера
+        """
+        entries = await self.redis.hgetall(self.registry_key)
+        return {browser_id: json.loads(value) for browser_id, value in entries.items()}
+
+    async def set_container_owner(self, name: str, info: dict) -> None:
+        """
+        Сохранить назначение контейнера браузера
+        """
+        await self.redis.hset(self.owners_key, name, json.dumps(info))
+
+    async def remove_container_owners(self, names: List[str]) -> int:
+        """
+        Удалить назначения контейнеров
+        """
+        if not names:
+            return 0
+        return await self.redis.hdel(self.owners_key, *names)
+
+    async def list_container_owners(self) -> Dict[str, dict]:
+        """
+        Назначения всех контейнеров браузеров по именам
+        """
+        entries = await self.redis.hgetall(self.owners_key)
+        return {name: json.loads(value) for name, value in entries.items()}
+
+    async def heartbeat(self, instance_id: str, ttl: int) -> None:
+        """
+        Отметить процесс менеджера браузеров живым на ttl секунд
+        """
+        await self.redis.zadd("browsers:instances", {instance_id: time.time() + ttl})
+
+    async def get_live_instances(self) -> Set[str]:
+        """
+        Живые процессы менеджера браузеров
+        """
+        now = time.time()
+        await self.redis.zremrangebyscore("browsers:instances", "-inf", now)
+        return set(await self.redis.zrangebyscore("browsers:instances", now, "+inf"))
+
+    async def set_host_draining(self, host: str, draining: bool) -> None:
+        """
+        Отметить Docker-хост как выводимый из эксплуатации
+        """
+        if draining:
+            await self.redis.sadd("browsers:hosts:draining", host)
+        else:
+            await self.redis.srem("browsers:hosts:draining", host)
+
+    async def get_draining_hosts(self) -> Set[str]:
+        """
+        Docker-хосты, выводимые из эксплуатации
+        """
+        return await self.redis.smembers("browsers:hosts:draining")
+
+    async def prune_registry(self) -> int:
+        """
+        Удалить из реестра браузеры с истекшей арендой
+        """
+        return await self._prune(keys=[self.registry_key, self.leases_key])
+
+    async def publish_telemetry(self, series: Dict[str, dict], ttl: int) -> None:
+        """
+        Опубликовать ряды телеметрии браузеров одним пайплайном
+        """
+        if not series:
+            return
+        async with self.binary.pipeline(transaction=False) as pipe:
+            for browser_id, data in series.items():
+                pipe.set(f"browser:{browser_id}:telemetry", self.codec.encode(data), ex=ttl)
+            await pipe.execute()
+        await self._invalidate(*(f"browser:{browser_id}:telemetry" for browser_id in series))
+
+    async def get_telemetry(self, browser_id: str) -> Optional[dict]:
+        """
+        Получить ряды телеметрии браузера
+        """
+        return await self.get(f"browser:{browser_id}:telemetry")
+
+    async def record_usage(self, usage: List[tuple]) -> None:
+        """
+        Добавить сводки потребления (agent_id, preset_id, сводка) к агрегатам
+        по агентам и пресетам
+        """
+        if not usage:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for agent_id, preset_id, summary in usage:
+                args = [
+                    summary["peak_cpu"],
+                    summary["peak_memory"],
+                    summary["cpu_sum"],
+                    summary["memory_sum"],
+                    summary["samples"],
+                ]
+                await self._record_usage(
+                    keys=[f"telemetry:agent:{agent_id}"], args=args, client=pipe
+                )
+                if preset_id is not None:
+                    await self._record_usage(
+                        keys=[f"telemetry:preset:{preset_id}"], args=args, client=pipe
+                    )
+            await pipe.execute()
+
+    async def record_run_peaks(self, runs: List[tuple], history: int) -> None:
+        """
+        Сохранить пики завершенных запусков (agent_id, peak_cpu, peak_memory),
+        храня не более history последних запусков агента
+        """
+        if not runs:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for agent_id, peak_cpu, peak_memory in runs:
+                key = f"telemetry:agent:{agent_id}:peaks"
+                pipe.lpush(key, json.dumps({"cpu": peak_cpu, "memory": peak_memory}))
+                pipe.ltrim(key, 0, history - 1)
+            await pipe.execute()
+
+    async def get_run_peaks(self, agent_id: int) -> List[dict]:
+        """
+        Пики последних запусков агента
+        """
+        values = await self.redis.lrange(f"telemetry:agent:{agent_id}:peaks", 0, -1)
+        return [json.loads(value) for value in values]
+
+    async def get_usage(self, kind: str, object_id: int) -> Optional[dict]:
+        """
+        Агрегат потребления ресурсов по агенту или пресету (kind: agent, preset)
+        """
+        data = await self.redis.hgetall(f"telemetry:{kind}:{object_id}")
+        if not data:
+            return None
+        samples = int(data.get("samples", 0))
+        return {
+            "samples": samples,
+            "peak_cpu_percent": float(data.get("peak_cpu", 0)),
+            "peak_memory_bytes": float(data.get("peak_memory", 0)),
+            "avg_cpu_percent": float(data.get("cpu_sum", 0)) / samples if samples else 0.0,
+            "avg_memory_bytes": float(data.get("memory_sum", 0)) / samples if samples else 0.0,
+        }
+
+# Верхние границы корзин гистограмм ожидания и выполнения задач, в секундах
+QUEUE_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+# Метрики очереди, которые скрипты очередей ведут в том же вызове. Задачи,
+# ожидающие выдачи, хранятся в sorted set waiting со временем постановки
+# (или возврата) в очередь, время выдачи - в хеше reserved_at. Счетчики и
+# гистограммы - в хеше stats; корзины хранятся без накопления, поле
+# '<имя>:<номер корзины>', последняя корзина - +Inf.
+QUEUE_METRICS_LUA = """
+local latency_buckets = {%s}
+local function queue_now_ms()
+    local now = redis.call('TIME')
+    return tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+end
+local function observe(stats, name, ms)
+    local bucket = #latency_buckets + 1
+    for i, bound in ipairs(latency_buckets) do
+        if ms <= bound then
+            bucket = i
+            break
+        end
+    end
+    redis.call('HINCRBY', stats, name .. ':' .. bucket, 1)
+    redis.call('HINCRBY', stats, name .. ':sum_ms', ms)
+    redis.call('HINCRBY', stats, name .. ':count', 1)
+end
+local function mark_taken(waiting, reserved_at, stats, entry, now_ms)
+    local since = redis.call('ZSCORE', waiting, entry)
+    if since then
+        redis.call('ZREM', waiting, entry)
+        observe(stats, 'wait', now_ms - tonumber(since))
+    end
+    if reserved_at then
+        redis.call('HSET', reserved_at, entry, now_ms)
+    end
+end
+local function mark_finished(reserved_at, stats, entry, now_ms, observed)
+    local since = redis.call('HGET', reserved_at, entry)
+    if since then
+        redis.call('HDEL', reserved_at, entry)
+        if observed then
+            observe(stats, 'run', now_ms - tonumber(since))
+        end
+    end
+end
+""" % ", ".join(str(int(bound * 1000)) for bound in QUEUE_LATENCY_BUCKETS)
+
+# Пакетная постановка задач: счетчик увеличивается один раз на весь пакет.
+# Встроенные задачи хранят данные прямо в записи списка, без отдельного ключа.
+# KEYS: очередь, счетчик, waiting, stats
+ENQUEUE_MANY_SCRIPT = QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local n = #ARGV - 3
+local last = redis.call('INCRBY', KEYS[2], n)
+local ids = {}
+for i = 1, n do
+    local task_id = ARGV[3] .. (last - n + i)
+    local entry = task_id
+    if ARGV[2] == '1' then
+        entry = '{"id":"' .. task_id .. '","data":' .. ARGV[3 + i] .. '}'
+    else
+        redis.call('SET', task_id, ARGV[3 + i], 'EX', ARGV[1])
+    end
+    redis.call('LPUSH', KEYS[1], entry)
+    redis.call('ZADD', KEYS[3], now_ms, entry)
+    ids[i] = task_id
+end
+redis.call('HINCRBY', KEYS[4], 'enqueued', n)
+return ids
+"""
+
+# Извлечение до ARGV[1] задач вместе с данными. Возвращает пары
+# (запись, данные); для встроенных задач данные - false.
+# Задачи с истекшими данными отбрасываются.
+# KEYS: очередь, waiting, stats
+DEQUEUE_MANY_SCRIPT = QUEUE_METRICS_LUA + """
+local entries = redis.call('RPOP', KEYS[1], tonumber(ARGV[1]))
+local result = {}
+if not entries then
+    return result
+end
+local now_ms = queue_now_ms()
+for _, entry in ipairs(entries) do
+    local payload = false
+    local alive = true
+    if string.sub(entry, 1, 1) ~= '{' then
+        payload = redis.call('GET', entry)
+        alive = payload ~= false
+    end
+    if alive then
+        if payload then
+            redis.call('DEL', entry)
+        end
+        mark_taken(KEYS[2], nil, KEYS[3], entry, now_ms)
+        table.insert(result, entry)
+        table.insert(result, payload)
+    else
+        redis.call('ZREM', KEYS[2], entry)
+        redis.call('HINCRBY', KEYS[3], 'expired', 1)
+    end
+end
+redis.call('HINCRBY', KEYS[3], 'dequeued', #result / 2)
+return result
+"""
+
+# Выдача до ARGV[3] задач воркеру: задачи переносятся в его список обработки
+# и получают срок видимости. Возвращает тройки (запись, данные, номер выдачи).
+# KEYS: ключи TaskQueue._keys
+RESERVE_TASKS_SCRIPT = QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local result = {}
+local reserved = 0
+while reserved < tonumber(ARGV[3]) do
+    local entry = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+    if not entry then
+        break
+    end
+    local payload = false
+    local alive = true
+    if string.sub(entry, 1, 1) ~= '{' then
+        payload = redis.call('GET', entry)
+        alive = payload ~= false
+    end
+    if alive then
+        redis.call('ZADD', KEYS[3], now_ms + tonumber(ARGV[1]), entry)
+        redis.call('HSET', KEYS[4], entry, ARGV[2])
+        mark_taken(KEYS[7], KEYS[8], KEYS[9], entry, now_ms)
+        table.insert(result, entry)
+        table.insert(result, payload)
+        table.insert(result, redis.call('HINCRBY', KEYS[5], entry, 1))
+        reserved = reserved + 1
+    else
+        redis.call('LREM', KEYS[2], 1, entry)
+        redis.call('ZREM', KEYS[7], entry)
+        redis.call('HINCRBY', KEYS[9], 'expired', 1)
+    end
+end
+redis.call('HINCRBY', KEYS[9], 'dequeued', reserved)
+return result
+"""
+
+# Подтверждение (ARGV[2] = 'ack') или отказ с возвратом в голову очереди
+# ('requeue') либо без возврата ('drop'). Отказ от задачи, уже
+# возвращенной в очередь по таймауту, ничего не делает.
+# KEYS: ключи TaskQueue._keys
+FINISH_TASK_SCRIPT = QUEUE_METRICS_LUA + """
+if redis.call('ZREM', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+local now_ms = queue_now_ms()
+mark_finished(KEYS[8], KEYS[9], ARGV[1], now_ms, true)
+local worker = redis.call('HGET', KEYS[4], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+if worker then
+    redis.call('LREM', ARGV[3] .. worker, 1, ARGV[1])
+end
+if ARGV[2] == 'requeue' then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+    redis.call('ZADD', KEYS[7], now_ms, ARGV[1])
+    redis.call('HINCRBY', KEYS[9], 'requeued', 1)
+else
+    redis.call('HDEL', KEYS[5], ARGV[1])
+    if string.sub(ARGV[1], 1, 1) ~= '{' then
+        redis.call('DEL', ARGV[1])
+    end
+    redis.call('HINCRBY', KEYS[9], ARGV[2] == 'ack' and 'acked' or 'dropped', 1)
+end
+return 1
+"""
+
+# Возврат в очередь задач с истекшим сроком видимости. Задачи, выданные
+# слишком много раз, переносятся в очередь недоставленных.
+# KEYS: ключи TaskQueue._keys
+REQUEUE_EXPIRED_SCRIPT = QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now_ms, 'LIMIT', 0, tonumber(ARGV[1]))
+local requeued = 0
+for _, task_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[3], task_id)
+    mark_finished(KEYS[8], KEYS[9], task_id, now_ms, false)
+    local worker = redis.call('HGET', KEYS[4], task_id)
+    redis.call('HDEL', KEYS[4], task_id)
+    if worker then
+        redis.call('LREM', ARGV[3] .. worker, 1, task_id)
+    end
+    local deliveries = tonumber(redis.call('HGET', KEYS[5], task_id) or '0')
+    if deliveries >= tonumber(ARGV[2]) then
+        redis.call('HDEL', KEYS[5], task_id)
+        redis.call('LPUSH', KEYS[6], task_id)
+        redis.call('HINCRBY', KEYS[9], 'dead', 1)
+    else
+        redis.call('RPUSH', KEYS[1], task_id)
+        redis.call('ZADD', KEYS[7], now_ms, task_id)
+        requeued = requeued + 1
+    end
+end
+redis.call('HINCRBY', KEYS[9], 'timed_out', #expired)
+return requeued
+"""
+
+# Снимок метрик очереди. KEYS: waiting, inflight, dead, stats. Возвращает
+# глубину, возраст старейшей ожидающей задачи (мс), число выданных,
+# недоставленных и содержимое хеша stats
+QUEUE_STATS_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local age = 0
+if #oldest > 0 then
+    age = now_ms - tonumber(oldest[2])
+end
+return {
+    redis.call('ZCARD', KEYS[1]),
+    age,
+    redis.call('ZCARD', KEYS[2]),
+    redis.call('LLEN', KEYS[3]),
+    redis.call('HGETALL', KEYS[4])
+}
+"""
+
+EXTEND_VISIBILITY_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+return redis.call('ZADD', KEYS[1], 'XX', 'CH', now_ms + tonumber(ARGV[2]), ARGV[1])
+"""
+
 class TaskQueue(RedisManager):
-    """Менеджер очереди задач"""
-    
+    """
+    Менеджер очереди задач.
+
+    Помимо простого извлечения (dequeue) поддерживает надежный режим:
+    reserve атомарно переносит задачу в список обработки воркера и
+    назначает срок видимости. Воркер подтверждает задачу через ack или
+    отказывается через nack; задачи, не подтвержденные в срок (например,
+    воркер упал), requeue_expired возвращает в очередь.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.enqueue_chunk_size = 1000  # задач на один вызов скрипта
+        self._enqueue_many = self.redis.register_script(ENQUEUE_MANY_SCRIPT)
+        self._dequeue_many = self.redis.register_script(DEQUEUE_MANY_SCRIPT)
+        self._reserve = self.redis.register_script(RESERVE_TASKS_SCRIPT)
+        self._finish = self.redis.register_script(FINISH_TASK_SCRIPT)
+        self._requeue_expired = self.redis.register_script(REQUEUE_EXPIRED_SCRIPT)
+        self._extend = self.redis.register_script(EXTEND_VISIBILITY_SCRIPT)
+        self._stats = self.redis.register_script(QUEUE_STATS_SCRIPT)
+
+    def _keys(self, queue_name: str) -> List[str]:
+        """
+        Ключи очереди: ожидающие, обработка воркера, сроки видимости,
+        владельцы, счетчики выдач, недоставленные и ключи метрик (время
+        постановки ожидающих, время выдачи, счетчики и гистограммы)
+        """
+        return [
+            f"queue:{queue_name}",
+            f"queue:{queue_name}:processing:{self.worker_id}",
+            f"queue:{queue_name}:inflight",
+            f"queue:{queue_name}:owners",
+            f"queue:{queue_name}:deliveries",
+            f"queue:{queue_name}:dead",
+            f"queue:{queue_name}:waiting",
+            f"queue:{queue_name}:reserved_at",
+            f"queue:{queue_name}:stats",
+        ]
+
+    @staticmethod
+    def _decode(entry: str, payload: Optional[str]) -> Tuple[str, dict]:
+        """
+        ID и данные задачи по записи списка
+        """
+        if payload is None:
+            inline = json_loads(entry)
+            return inline["id"], inline["data"]
+        return entry, json_loads(payload)
+
     async def enqueue(
         self,
         queue_name: str,
         task_data: dict,
-        ttl: Optional[int] = None
+        ttl: Optional[int] = None,
+        inline: bool = False
     ) -> str:
         """
         Добавить задачу в очередь
         """
-        task_id = f"task:{queue_name}:{await self.increment(f'{queue_name}:counter')}"
-        await self.set(task_id, task_data, ttl)
-        await self.redis.lpush(f"queue:{queue_name}", task_id)
-        return task_id
+        return (await self.enqueue_many(queue_name, [task_data], ttl, inline))[0]
+
+    async def enqueue_many(
+        self,
+        queue_name: str,
+        tasks: List[dict],
+        ttl: Optional[int] = None,
+        inline: bool = False
+    ) -> List[str]:
+        """
+        Добавить пакет задач в очередь за один запрос к Redis.
+
+        При inline данные хранятся в самой записи очереди: отдельные ключи
+        не создаются, но ttl к таким задачам не применяется.
+        """
+        if not tasks:
+            return []
+        keys = [
+            f"queue:{queue_name}",
+            f"{queue_name}:counter",
+            f"queue:{queue_name}:waiting",
+            f"queue:{queue_name}:stats",
+        ]
+        args = [ttl or self.default_ttl, "1" if inline else "0", f"task:{queue_name}:"]
+
+        pipe = self.redis.pipeline(transaction=False)
+        for i in range(0, len(tasks), self.enqueue_chunk_size):
+            chunk = tasks[i:i + self.enqueue_chunk_size]
+            await self._enqueue_many(
+                keys=keys,
+                args=args + [json_dumps(task) for task in chunk],
+                client=pipe
+            )
+        results = await pipe.execute()
+        return [task_id for chunk_ids in results for task_id in chunk_ids]
 
     async def dequeue(self, queue_name: str) -> Optional[dict]:
         """
-        Получить задачу из очереди
+        Получить задачу из очереди без подтверждения
         """
-        task_id = await self.redis.rpop(f"queue:{queue_name}")
-        if not task_id:
-            return None
-            
-        task_data = await self.get(task_id)
-        await self.delete(task_id)
-        return task_data
+        tasks = await self.dequeue_many(queue_name, 1)
+        return tasks[0] if tasks else None
+
+    async def dequeue_many(self, queue_name: str, count: int) -> List[dict]:
+        """
+        Получить до count задач из очереди без подтверждения за один запрос
+        """
+        result = await self._dequeue_many(
+            keys=[f"queue:{queue_name}", f"queue:{queue_name}:waiting", f"queue:{queue_name}:stats"],
+            args=[count]
+        )
+        return [
+            self._decode(entry, payload)[1]
+            for entry, payload in zip(result[::2], result[1::2])
+        ]
+
+    async def reserve(
+        self,
+        queue_name: str,
+        visibility_timeout: Optional[int] = None
+    ) -> Optional[Tuple[str, dict, int]]:
+        """
+        Получить задачу в обработку. Возвращает квитанцию для ack/nack,
+        данные задачи и номер выдачи
+        """
+        tasks = await self.reserve_many(queue_name, 1, visibility_timeout)
+        return tasks[0] if tasks else None
+
+    async def reserve_many(
+        self,
+        queue_name: str,
+        count: int,
+        visibility_timeout: Optional[int] = None
+    ) -> List[Tuple[str, dict, int]]:
+        """
+        Получить до count задач в обработку за один запрос.
+
+        Квитанция совпадает с ID задачи, а для встроенных задач - с
+        записью очереди целиком.
+        """
+        result = await self._reserve(
+            keys=self._keys(queue_name),
+            args=[
+                (visibility_timeout or settings.TASK_VISIBILITY_TIMEOUT) * 1000,
+                self.worker_id,
+                count
+            ]
+        )
+        tasks = []
+        for entry, payload, deliveries in zip(result[::3], result[1::3], result[2::3]):
+            tasks.append((entry, self._decode(entry, payload)[1], int(deliveries)))
+        return tasks
+
+    async def ack(self, queue_name: str, task_id: str) -> bool:
+        """
+        Подтвердить выполнение задачи
+        """
+        return bool(await self._finish(
+            keys=self._keys(queue_name),
+            args=[task_id, "ack", f"queue:{queue_name}:processing:"]
+        ))
+
+    async def nack(self, queue_name: str, task_id: str, requeue: bool = True) -> bool:
+        """
+        Отказаться от задачи, по умолчанию вернув ее в голову очереди
+        """
+        return bool(await self._finish(
+            keys=self._keys(queue_name),
+            args=[task_id, "requeue" if requeue else "drop", f"queue:{queue_name}:processing:"]
+        ))
+
+    async def extend_visibility(self, queue_name: str, task_id: str, seconds: int) -> bool:
+        """
+        Продлить срок видимости задачи, которая еще выполняется
+        """
+        return bool(await self._extend(
+            keys=[f"queue:{queue_name}:inflight"],
+            args=[task_id, seconds * 1000]
+        ))
+
+    async def requeue_expired(self, queue_name: str, batch_size: Optional[int] = None) -> int:
+        """
+        Вернуть в очередь задачи с истекшим сроком видимости
+        """
+        return await self._requeue_expired(
+            keys=self._keys(queue_name),
+            args=[
+                batch_size or settings.TASK_REAPER_BATCH_SIZE,
+                settings.TASK_MAX_DELIVERIES,
+                f"queue:{queue_name}:processing:"
+            ]
+        )
 
     async def get_queue_length(self, queue_name: str) -> int:
         """
@@ -134,7 +969,124 @@ class TaskQueue(RedisManager):
         """
         return await self.redis.llen(f"queue:{queue_name}")
 
+    async def get_inflight_count(self, queue_name: str) -> int:
+        """
+        Количество задач в обработке у всех воркеров
+        """
+        return await self.redis.zcard(f"queue:{queue_name}:inflight")
+
+    async def get_metrics(self, queue_names: List[str]) -> Dict[str, dict]:
+        """
+        Метрики очередей за один запрос: глубина, возраст старейшей задачи,
+        выданные и недоставленные задачи, счетчики событий и гистограммы
+        ожидания и выполнения (корзины с накоплением, по QUEUE_LATENCY_BUCKETS).
+
+        Глубина и возраст учитывают задачи, поставленные после появления
+        метрик. Скорости постановки и извлечения считаются по счетчикам
+        на стороне сборщика метрик.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_name in queue_names:
+            await self._stats(
+                keys=[
+                    f"queue:{queue_name}:waiting",
+                    f"queue:{queue_name}:inflight",
+                    f"queue:{queue_name}:dead",
+                    f"queue:{queue_name}:stats",
+                ],
+                client=pipe
+            )
+        results = await pipe.execute()
+
+        metrics = {}
+        for queue_name, (depth, oldest_age_ms, inflight, dead, raw) in zip(queue_names, results):
+            stats = {field: int(value) for field, value in zip(raw[::2], raw[1::2])}
+            metrics[queue_name] = {
+                "depth": depth,
+                "oldest_age_seconds": oldest_age_ms / 1000,
+                "inflight": inflight,
+                "dead": dead,
+                "events": {
+                    event: stats.get(event, 0)
+                    for event in (
+                        "enqueued", "dequeued", "acked", "requeued",
+                        "dropped", "timed_out", "dead", "expired"
+                    )
+                },
+                "wait": self._histogram(stats, "wait"),
+                "run": self._histogram(stats, "run"),
+            }
+        return metrics
+
+    @staticmethod
+    def _histogram(stats: Dict[str, int], name: str) -> dict:
+        """
+        Гистограмма из хеша stats с накоплением по корзинам
+        """
+        buckets = []
+        cumulative = 0
+        for i, bound in enumerate(QUEUE_LATENCY_BUCKETS + (float("inf"),), start=1):
+            cumulative += stats.get(f"{name}:{i}", 0)
+            buckets.append((bound, cumulative))
+        return {
+            "buckets": buckets,
+            "sum": stats.get(f"{name}:sum_ms", 0) / 1000,
+            "count": stats.get(f"{name}:count", 0),
+        }
+
+# Чтение версии и значения за один вызов
+VERSIONED_GET_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+return {version, redis.call('GET', ARGV[1] .. ':' .. version)}
+"""
+
+class VersionedCache(RedisManager):
+    """
+    Кеш со штампом версии.
+
+    Значение хранится под ключом с номером версии, а запись данных
+    увеличивает версию. Старые значения становятся недостижимы и истекают
+    по TTL, поэтому чтение, начатое до записи, не может вернуть в кеш
+    устаревшие данные под актуальной версией.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._get_versioned = self.binary.register_script(VERSIONED_GET_SCRIPT)
+
+    async def get_versioned(self, key: str, version_key: str) -> Tuple[int, Optional[Any]]:
+        """
+        Текущая версия и значение для нее
+        """
+        version, value = await self._get_versioned(keys=[version_key], args=[key])
+        try:
+            return int(version), self.codec.decode(value) if value else None
+        except CodecError:
+            return int(version), None
+
+    async def set_versioned(self, key: str, version: int, value: Any, ttl: int) -> None:
+        """
+        Сохранить значение, прочитанное при данной версии
+        """
+        try:
+            await self.binary.set(f"{key}:{version}", self.codec.encode(value), ex=ttl)
+        except CodecError:
+            pass
+
+    async def bump(self, version_keys: List[str], ttl: int) -> None:
+        """
+        Увеличить версии ключей одним пайплайном
+        """
+        if not version_keys:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for version_key in version_keys:
+                pipe.incr(version_key)
+                pipe.expire(version_key, ttl)
+            await pipe.execute()
+
 # Создаем глобальные экземпляры менеджеров
 redis_manager = RedisManager()
 browser_state = BrowserStateManager()
-task_queue = TaskQueue()
\ No newline at end of file
+task_queue = TaskQueue()
+model_cache = VersionedCache()
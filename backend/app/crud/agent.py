@@ -1,12 +1,19 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from sqlalchemy import select, and_
+from sqlalchemy import func, select, and_, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from app.crud.base import CRUDBase
 from app.models.agent import Agent, Thread
 from app.schemas.agent import AgentCreate, AgentUpdate, ThreadCreate, ThreadUpdate
 
 class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
+    loader_profiles = {
+        "with_preset": (joinedload(Agent.preset),),
+        "with_threads": (selectinload(Agent.threads),),
+    }
+    cache_exclude = ("credentials",)
+
     async def get_by_user(
         self,
         db: AsyncSession,
@@ -57,7 +64,8 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         """
         Обновить статистику агента
         """
-        agent = await self.get(db, id=agent_id)
+        # Счетчики увеличиваются от актуальных значений, не из кеша
+        agent = await self.get(db, id=agent_id, cached=False)
         if not agent:
             return None
 
@@ -71,9 +79,14 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         db.add(agent)
         await db.commit()
         await db.refresh(agent)
+        await self.invalidate([agent.id])
         return agent
 
 class CRUDThread(CRUDBase[Thread, ThreadCreate, ThreadUpdate]):
+    loader_profiles = {
+        "with_agent": (joinedload(Thread.agent),),
+    }
+
     async def get_by_agent(
         self,
         db: AsyncSession,
@@ -93,6 +106,101 @@ class CRUDThread(CRUDBase[Thread, ThreadCreate, ThreadUpdate]):
         )
         return result.scalars().all()
 
+    async def create_batch(
+        self,
+        db: AsyncSession,
+        *,
+        obj_in: ThreadCreate,
+        agent_id: int,
+        count: int
+    ) -> List[Thread]:
+        """
+        Создать несколько потоков агента многострочным INSERT
+        """
+        now = datetime.utcnow()
+        return await self.create_many(
+            db,
+            objs_in=[obj_in] * count,
+            agent_id=agent_id,
+            logs=[],
+            results={},
+            created_at=now,
+            updated_at=now
+        )
+
+    async def set_batch_outcomes(
+        self,
+        db: AsyncSession,
+        *,
+        outcomes: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Записать результаты запуска пакета потоков одним UPDATE по первичному ключу.
+
+        Каждый элемент: {"id", "status", "browser_id", "error_message", ...}
+        """
+        if not outcomes:
+            return
+        await db.execute(update(Thread), outcomes)
+        await db.commit()
+        await self.invalidate([outcome["id"] for outcome in outcomes])
+
+    async def get_by_ids(
+        self,
+        db: AsyncSession,
+        *,
+        ids: List[int]
+    ) -> List[Thread]:
+        """
+        Получить потоки по списку ID одним запросом
+        """
+        if not ids:
+            return []
+        result = await db.execute(select(Thread).filter(Thread.id.in_(ids)))
+        return result.scalars().all()
+
+    async def fail_orphaned(
+        self,
+        db: AsyncSession,
+        *,
+        live_browser_ids: List[str],
+        updated_before: datetime,
+        error_message: str,
+        only_browser_ids: Optional[List[str]] = None
+    ) -> int:
+        """
+        Перевести в ошибку выполняющиеся потоки, браузеров которых больше нет.
+
+        Потоки, обновленные после updated_before, не затрагиваются: их браузер
+        мог быть запущен уже после получения списка контейнеров. Если задан
+        only_browser_ids, затрагиваются только потоки с этими браузерами.
+        """
+        query = update(Thread).where(
+            Thread.status == "running",
+            Thread.updated_at < updated_before
+        )
+        if only_browser_ids is not None:
+            if not only_browser_ids:
+                return 0
+            query = query.where(Thread.browser_id.in_(only_browser_ids))
+        if live_browser_ids:
+            query = query.where(or_(
+                Thread.browser_id.is_(None),
+                Thread.browser_id.notin_(live_browser_ids)
+            ))
+        result = await db.execute(
+            query.values(
+                status="error",
+                error_message=error_message,
+                browser_id=None,
+                end_time=datetime.utcnow()
+            ).returning(Thread.id).execution_options(synchronize_session=False)
+        )
+        failed_ids = result.scalars().all()
+        await db.commit()
+        await self.invalidate(failed_ids)
+        return len(failed_ids)
+
     async def get_active_threads(
         self,
         db: AsyncSession,
@@ -109,6 +217,23 @@ class CRUDThread(CRUDBase[Thread, ThreadCreate, ThreadUpdate]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def count_by_status(
+        self,
+        db: AsyncSession,
+        *,
+        agent_id: int,
+        statuses: List[str]
+    ) -> int:
+        """
+        Количество потоков агента в указанных статусах
+        """
+        result = await db.execute(
+            select(func.count())
+            .select_from(Thread)
+            .filter(Thread.agent_id == agent_id, Thread.status.in_(statuses))
+        )
+        return result.scalar_one()
+
     async def start_thread(
         self,
         db: AsyncSession,
@@ -130,6 +255,7 @@ class CRUDThread(CRUDBase[Thread, ThreadCreate, ThreadUpdate]):
         db.add(thread)
         await db.commit()
         await db.refresh(thread)
+        await self.invalidate([thread.id])
         return thread
 
     async def complete_thread(
@@ -161,6 +287,7 @@ class CRUDThread(CRUDBase[Thread, ThreadCreate, ThreadUpdate]):
         db.add(thread)
         await db.commit()
         await db.refresh(thread)
+        await self.invalidate([thread.id])
         
         # Обновляем статистику агента
         await agent_crud.update_stats(
@@ -1,32 +1,148 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar, Union
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import select, update, delete
+from redis.exceptions import RedisError
+from sqlalchemy import JSON, DateTime, Select, func, insert, literal, select, text, tuple_, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from app.core.config import settings
+from app.core.redis import model_cache
 from app.models.base import Base
 
+logger = logging.getLogger(__name__)
+
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
-    def __init__(self, model: Type[ModelType]):
+    # Профили загрузки связей: имя -> опции загрузчика (selectinload,
+    # joinedload). Объекты, загруженные с профилем, не берутся из кеша
+    loader_profiles: Dict[str, tuple] = {}
+    # Колонки, которые не попадают в кеш (секреты). У объекта из кеша они
+    # не загружены и читаются из базы при обращении
+    cache_exclude: Tuple[str, ...] = ()
+
+    def __init__(self, model: Type[ModelType], cache_ttl: Optional[int] = None):
         """
         CRUD объект с методами по умолчанию для работы с моделью.
 
         **Параметры**
         * `model`: SQLAlchemy модель
+        * `cache_ttl`: TTL кеша чтений в Redis, по умолчанию из CRUD_CACHE_TTL;
+          без него get и get_multi всегда обращаются к базе
         """
         self.model = model
+        self.cache_ttl = cache_ttl or settings.CRUD_CACHE_TTL.get(model.__tablename__)
+        self.cache_prefix = f"crud:{model.__tablename__}"
+
+    def _options(self, profile: Optional[str]) -> tuple:
+        """
+        Опции загрузчика профиля
+        """
+        if profile is None:
+            return ()
+        try:
+            return self.loader_profiles[profile]
+        except KeyError:
+            raise ValueError(f"Неизвестный профиль загрузки {profile} для {self.cache_prefix}")
+
+    def _apply_filters(self, query: Select, filters: Optional[Dict[str, Any]]) -> Select:
+        """
+        Фильтры на равенство по полям модели; неизвестные поля пропускаются
+        """
+        for field, value in (filters or {}).items():
+            if hasattr(self.model, field):
+                query = query.filter(getattr(self.model, field) == value)
+        return query
 
-    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+    def _dump(self, obj: ModelType) -> Dict[str, Any]:
         """
-        Получить объект по ID.
+        Значения колонок объекта для кеша
         """
+        data = {}
+        for attr in self.model.__mapper__.column_attrs:
+            if attr.key in self.cache_exclude:
+                continue
+            value = getattr(obj, attr.key)
+            data[attr.key] = value.isoformat() if isinstance(value, datetime) else value
+        return data
+
+    async def _load(self, db: AsyncSession, data: Dict[str, Any]) -> ModelType:
+        """
+        Объект из кеша, присоединенный к сессии без запроса к базе
+        """
+        values = {}
+        for attr in self.model.__mapper__.column_attrs:
+            if attr.key in self.cache_exclude:
+                continue
+            value = data.get(attr.key)
+            if value is not None and isinstance(attr.columns[0].type, DateTime):
+                value = datetime.fromisoformat(value)
+            values[attr.key] = value
+        obj = self.model(**values)
+        make_transient_to_detached(obj)
+        return await db.merge(obj, load=False)
+
+    async def invalidate(self, ids: Optional[List[Any]] = None) -> None:
+        """
+        Сбросить кеш объектов и всех списков модели сменой версий.
+        Вызывается после фиксации изменений в базе
+        """
+        if not self.cache_ttl:
+            return
+        version_keys = [f"{self.cache_prefix}:{id}:v" for id in ids or []]
+        version_keys.append(f"{self.cache_prefix}:list:v")
+        try:
+            await model_cache.bump(version_keys, settings.CRUD_CACHE_VERSION_TTL)
+        except RedisError as e:
+            logger.error(f"Не удалось сбросить кеш {self.cache_prefix}: {e}")
+
+    async def get(
+        self,
+        db: AsyncSession,
+        id: Any,
+        cached: bool = True,
+        profile: Optional[str] = None
+    ) -> Optional[ModelType]:
+        """
+        Получить объект по ID, со связями из профиля загрузки profile.
+        """
+        if not (self.cache_ttl and cached) or profile:
+            return await self._get_from_db(db, id, profile)
+
+        key = f"{self.cache_prefix}:{id}"
+        try:
+            version, data = await model_cache.get_versioned(key, f"{key}:v")
+        except RedisError as e:
+            logger.error(f"Кеш {self.cache_prefix} недоступен: {e}")
+            return await self._get_from_db(db, id)
+        if data is not None:
+            return await self._load(db, data)
+
+        obj = await self._get_from_db(db, id)
+        if obj is not None:
+            try:
+                await model_cache.set_versioned(key, version, self._dump(obj), self.cache_ttl)
+            except RedisError:
+                pass
+        return obj
+
+    async def _get_from_db(
+        self,
+        db: AsyncSession,
+        id: Any,
+        profile: Optional[str] = None
+    ) -> Optional[ModelType]:
         result = await db.execute(
-            select(self.model).filter(self.model.id == id)
+            select(self.model).options(*self._options(profile)).filter(self.model.id == id)
         )
-        return result.scalar_one_or_none()
+        return result.unique().scalar_one_or_none()
 
     async def get_multi(
         self,
@@ -39,17 +155,96 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         Получить список объектов с пагинацией и фильтрацией.
         """
-        query = select(self.model)
-        
-        if filters:
-            for field, value in filters.items():
-                if hasattr(self.model, field):
-                    query = query.filter(getattr(self.model, field) == value)
-        
+        if not self.cache_ttl:
+            return await self._get_multi_from_db(db, skip=skip, limit=limit, filters=filters)
+
+        params = json.dumps([skip, limit, filters or {}], sort_keys=True, default=str)
+        key = f"{self.cache_prefix}:list:{hashlib.sha1(params.encode()).hexdigest()}"
+        try:
+            version, rows = await model_cache.get_versioned(key, f"{self.cache_prefix}:list:v")
+        except RedisError as e:
+            logger.error(f"Кеш {self.cache_prefix} недоступен: {e}")
+            return await self._get_multi_from_db(db, skip=skip, limit=limit, filters=filters)
+        if rows is not None:
+            return [await self._load(db, row) for row in rows]
+
+        objs = await self._get_multi_from_db(db, skip=skip, limit=limit, filters=filters)
+        try:
+            await model_cache.set_versioned(
+                key, version, [self._dump(obj) for obj in objs], self.cache_ttl
+            )
+        except RedisError:
+            pass
+        return objs
+
+    async def _get_multi_from_db(
+        self,
+        db: AsyncSession,
+        *,
+        skip: int,
+        limit: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[ModelType]:
+        query = self._apply_filters(select(self.model), filters)
+        # Без сортировки OFFSET не дает стабильных страниц; порядок тот же,
+        # что у get_page, чтобы оба режима отдавали одну первую страницу
+        query = query.order_by(self.model.created_at.desc(), self.model.id.desc())
         query = query.offset(skip).limit(limit)
         result = await db.execute(query)
         return result.scalars().all()
 
+    @staticmethod
+    def encode_cursor(obj: ModelType) -> str:
+        """
+        Непрозрачный курсор страницы по (created_at, id) объекта
+        """
+        raw = json.dumps([obj.created_at.isoformat(), obj.id])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """
+        Позиция (created_at, id) из курсора. ValueError для некорректного курсора
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, id = json.loads(raw)
+            return datetime.fromisoformat(created_at), int(id)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        profile: Optional[str] = None
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        Страница объектов от новых к старым с пагинацией по ключу.
+
+        Вместо OFFSET условие (created_at, id) < позиции курсора, поэтому
+        время ответа не зависит от глубины страницы, а вставка новых строк
+        не приводит к пропускам и повторам. Возвращает объекты и курсор
+        следующей страницы (None на последней).
+        """
+        query = self._apply_filters(select(self.model).options(*self._options(profile)), filters)
+        if cursor:
+            created_at, id = self.decode_cursor(cursor)
+            query = query.filter(
+                tuple_(self.model.created_at, self.model.id) < tuple_(created_at, id)
+            )
+        query = query.order_by(self.model.created_at.desc(), self.model.id.desc()).limit(limit + 1)
+
+        result = await db.execute(query)
+        objs = list(result.unique().scalars().all())
+        if len(objs) <= limit:
+            return objs, None
+        objs = objs[:limit]
+        return objs, self.encode_cursor(objs[-1])
+
     async def create(
         self,
         db: AsyncSession,
@@ -66,6 +261,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await self.invalidate()
         return db_obj
 
     async def update(
@@ -77,20 +273,25 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     ) -> ModelType:
         """
         Обновить объект.
+
+        Поля берутся из obj_in и колонок модели, а не из значений db_obj:
+        у объекта из кеша нет колонок cache_exclude, а их чтение из базы
+        в асинхронной сессии невозможно без явного await
         """
-        obj_data = jsonable_encoder(db_obj)
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.model_dump(exclude_unset=True)
-            
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
-                
+
+        columns = {attr.key for attr in self.model.__mapper__.column_attrs}
+        for field, value in update_data.items():
+            if field in columns:
+                setattr(db_obj, field, value)
+
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await self.invalidate([db_obj.id])
         return db_obj
 
     async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
@@ -100,38 +301,214 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         obj = await self.get(db=db, id=id)
         await db.delete(obj)
         await db.commit()
+        await self.invalidate([id])
         return obj
 
+    def _row(self, obj_in: Union[CreateSchemaType, Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        row = obj_in.model_dump() if isinstance(obj_in, BaseModel) else dict(obj_in)
+        row.update(kwargs)
+        return row
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[CreateSchemaType, Dict[str, Any]]],
+        returning: bool = True,
+        chunk_size: Optional[int] = None,
+        **kwargs: Any
+    ) -> List[ModelType]:
+        """
+        Создать объекты пакетами многострочных INSERT ... RETURNING в одной
+        транзакции.
+
+        Без returning пакеты от CRUD_COPY_MIN_ROWS строк загружаются через
+        COPY (только asyncpg) и метод возвращает пустой список.
+        """
+        rows = [self._row(obj_in, **kwargs) for obj_in in objs_in]
+        if not rows:
+            return []
+        chunk_size = chunk_size or settings.CRUD_BULK_CHUNK_SIZE
+
+        objs: List[ModelType] = []
+        try:
+            if not returning and len(rows) >= settings.CRUD_COPY_MIN_ROWS and await self._can_copy(db):
+                await self._copy_rows(db, rows)
+            else:
+                query = insert(self.model)
+                if returning:
+                    query = query.returning(self.model)
+                for i in range(0, len(rows), chunk_size):
+                    result = await db.execute(query, rows[i:i + chunk_size])
+                    if returning:
+                        objs.extend(result.scalars().all())
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await self.invalidate()
+        return objs
+
+    @staticmethod
+    async def _can_copy(db: AsyncSession) -> bool:
+        connection = await db.connection()
+        return connection.dialect.driver == "asyncpg"
+
+    async def _copy_rows(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        """
+        Загрузка строк через COPY. COPY не применяет значения по умолчанию
+        SQLAlchemy, поэтому они подставляются здесь; первичный ключ
+        назначает последовательность
+        """
+        columns = [
+            column for column in self.model.__table__.columns
+            if not (column.primary_key and column.autoincrement)
+        ]
+        records = []
+        for row in rows:
+            record = []
+            for column in columns:
+                if column.key in row:
+                    value = row[column.key]
+                elif column.default is not None and column.default.is_callable:
+                    value = column.default.arg(None)
+                elif column.default is not None:
+                    value = column.default.arg
+                else:
+                    value = None
+                if isinstance(column.type, JSON) and value is not None:
+                    value = json.dumps(value)
+                record.append(value)
+            records.append(record)
+
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            self.model.__tablename__,
+            records=records,
+            columns=[column.name for column in columns]
+        )
+
+    def _bulk_where(
+        self,
+        query,
+        filters: Optional[Dict[str, Any]],
+        ids: Optional[List[Any]]
+    ):
+        """
+        Условия массовой операции; без фильтров и ID операция запрещена
+        """
+        if not filters and ids is None:
+            raise ValueError("Массовая операция без фильтров и ID затронула бы всю таблицу")
+        query = self._apply_filters(query, filters)
+        if ids is not None:
+            query = query.where(self.model.id.in_(ids))
+        return query.returning(self.model.id).execution_options(synchronize_session=False)
+
+    async def _run_bulk(
+        self,
+        db: AsyncSession,
+        query,
+        filters: Optional[Dict[str, Any]],
+        ids: Optional[List[Any]],
+        chunk_size: Optional[int]
+    ) -> int:
+        """
+        Выполнить UPDATE/DELETE по фильтрам, список ID разбивается на пакеты.
+        Все пакеты - в одной транзакции
+        """
+        chunk_size = chunk_size or settings.CRUD_BULK_CHUNK_SIZE
+        chunks = [None] if ids is None else [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        affected: List[Any] = []
+        try:
+            for chunk in chunks:
+                result = await db.execute(self._bulk_where(query, filters, chunk))
+                affected.extend(result.scalars().all())
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await self.invalidate(affected)
+        return len(affected)
+
+    async def update_many(
+        self,
+        db: AsyncSession,
+        *,
+        values: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[Any]] = None,
+        chunk_size: Optional[int] = None
+    ) -> int:
+        """
+        Обновить объекты по фильтрам и/или списку ID одним UPDATE на пакет.
+        Возвращает число обновленных строк
+        """
+        if ids is not None and not ids:
+            return 0
+        return await self._run_bulk(db, update(self.model).values(**values), filters, ids, chunk_size)
+
+    async def delete_many(
+        self,
+        db: AsyncSession,
+        *,
+        filters: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[Any]] = None,
+        chunk_size: Optional[int] = None
+    ) -> int:
+        """
+        Удалить объекты по фильтрам и/или списку ID одним DELETE на пакет.
+        Возвращает число удаленных строк
+        """
+        if ids is not None and not ids:
+            return 0
+        return await self._run_bulk(db, delete(self.model), filters, ids, chunk_size)
+
     async def exists(
         self,
         db: AsyncSession,
         filters: Dict[str, Any]
     ) -> bool:
         """
-        Проверить существование объекта по фильтрам.
+        Проверить существование объекта по фильтрам (SELECT EXISTS без
+        загрузки строк).
         """
-        query = select(self.model)
-        for field, value in filters.items():
-            if hasattr(self.model, field):
-                query = query.filter(getattr(self.model, field) == value)
-                
-        result = await db.execute(query)
-        return result.first() is not None
+        query = self._apply_filters(select(literal(1)).select_from(self.model), filters)
+        result = await db.execute(select(query.limit(1).exists()))
+        return bool(result.scalar())
 
     async def count(
         self,
         db: AsyncSession,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        estimate: bool = False
     ) -> int:
         """
         Получить количество объектов с фильтрацией.
+
+        С estimate количество без фильтров берется из статистики
+        планировщика PostgreSQL (pg_class.reltuples) за O(1). Оценка
+        обновляется autovacuum/ANALYZE и может отставать; для таблиц меньше
+        CRUD_COUNT_ESTIMATE_MIN строк и таблиц без статистики выполняется
+        точный COUNT(*).
         """
-        query = select(self.model)
-        
-        if filters:
-            for field, value in filters.items():
-                if hasattr(self.model, field):
-                    query = query.filter(getattr(self.model, field) == value)
-                    
+        if estimate and not filters:
+            estimated = await self.estimate_count(db)
+            if estimated >= settings.CRUD_COUNT_ESTIMATE_MIN:
+                return estimated
+
+        query = self._apply_filters(select(func.count()).select_from(self.model), filters)
         result = await db.execute(query)
-        return len(result.scalars().all())
\ No newline at end of file
+        return result.scalar_one()
+
+    async def estimate_count(self, db: AsyncSession) -> int:
+        """
+        Оценка числа строк таблицы по статистике; -1, если таблица еще
+        не анализировалась
+        """
+        result = await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": self.model.__tablename__}
+        )
+        estimated = result.scalar()
+        return -1 if estimated is None else int(estimated)
\ No newline at end of file
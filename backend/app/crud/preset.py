@@ -108,6 +108,7 @@ class CRUDPreset(CRUDBase[Preset, PresetCreate, PresetUpdate]):
             temperature=original.temperature,
             max_tokens=original.max_tokens,
             system_prompt=original.system_prompt,
+            resource_class=original.resource_class,
             additional_config=original.additional_config
         )
 
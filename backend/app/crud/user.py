@@ -1,12 +1,20 @@
 from typing import Optional, Dict, Any, List
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from app.core.security import get_password_hash, verify_password
 from app.crud.base import CRUDBase
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+    loader_profiles = {
+        # Проверки лимитов тарифа: can_create_agent, can_create_preset
+        "with_agents": (selectinload(User.agents),),
+        "with_presets": (selectinload(User.presets),),
+    }
+    cache_exclude = ("hashed_password", "google_id")
+
     async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
         """
         Получить пользователя по email
@@ -42,6 +50,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await self.invalidate()
         return db_obj
 
     async def update(
@@ -1,5 +1,7 @@
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 # Создаем асинхронный движок SQLAlchemy
@@ -22,6 +24,18 @@ async_session = sessionmaker(
     autoflush=False,
 )
 
+# Режим тестов: неявная загрузка связи (под AsyncSession - скрытый запрос
+# или ошибка) становится исключением. Связи загружаются профилями CRUD
+if settings.DB_RAISE_ON_LAZY_LOAD:
+    @event.listens_for(Session, "do_orm_execute")
+    def raise_on_lazy_load(orm_execute_state):
+        state = orm_execute_state.lazy_loaded_from
+        if state is not None:
+            raise InvalidRequestError(
+                f"Неявная загрузка связи объекта {state.class_.__name__}: "
+                f"используйте профиль загрузки CRUD"
+            )
+
 # Функция для инициализации базы данных
 async def init_db() -> None:
     async with engine.begin() as conn:
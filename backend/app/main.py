@@ -1,6 +1,12 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.metrics import render_queue_metrics
+from app.core.near_cache import near_cache
+from app.core.redis import redis_manager, task_queue
+from app.services.thread_logs import thread_logs
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -26,10 +32,35 @@ app.include_router(presets.router, prefix="/api/v1", tags=["presets"])
 app.include_router(agents.router, prefix="/api/v1", tags=["agents"])
 app.include_router(threads.router, prefix="/api/v1", tags=["threads"])
 
+@app.on_event("startup")
+async def startup_event():
+    # Фоновые задачи менеджера браузеров: таймауты и тёплый пул. В режиме
+    # очереди браузеры запускают воркеры, и пул держат только они
+    await agents.browser_manager.start(warm_pool=not settings.THREAD_LAUNCH_VIA_QUEUE)
+    # Инвалидация локального кеша Redis
+    app.state.near_cache_task = asyncio.create_task(near_cache.listen(redis_manager.redis))
+    # Запись логов потоков в базу (пишет один процесс под блокировкой)
+    app.state.thread_logs_task = asyncio.create_task(thread_logs.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.near_cache_task.cancel()
+    app.state.thread_logs_task.cancel()
+    await agents.browser_manager.cleanup()
+
 @app.get("/api/v1/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Метрики очередей задач для Prometheus
+    queue_metrics = await task_queue.get_metrics(settings.TASK_METRICS_QUEUES)
+    return PlainTextResponse(
+        render_queue_metrics(queue_metrics),
+        media_type="text/plain; version=0.0.4"
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
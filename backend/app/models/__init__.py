@@ -0,0 +1,9 @@
+# Все модели регистрируются при импорте любой из них: связи задаются по
+# имени класса и разрешаются при настройке мапперов, которую вызывают уже
+# опции загрузчика в профилях CRUD
+from app.models.base import Base
+from app.models.user import User
+from app.models.preset import Preset
+from app.models.agent import Agent, Thread
+
+__all__ = ["Base", "User", "Preset", "Agent", "Thread"]
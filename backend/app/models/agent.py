@@ -1,10 +1,16 @@
-from sqlalchemy import Column, String, JSON, ForeignKey, Boolean, Integer
+from sqlalchemy import Column, String, JSON, ForeignKey, Boolean, Integer, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from app.models.base import Base, PrimaryKeyMixin, TimestampMixin
 
 class Agent(Base, PrimaryKeyMixin, TimestampMixin):
     """Модель ИИ-агента"""
     __tablename__ = "agents"
+    __table_args__ = (
+        # Пагинация по ключу списка агентов пользователя
+        Index("ix_agents_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_agents_user_id_status_created_at", "user_id", "status", "created_at", "id"),
+        Index("ix_agents_user_id_active", "user_id", postgresql_where=text("is_active")),
+    )
 
     name = Column(String, nullable=False)
     description = Column(String)
@@ -56,6 +62,14 @@ class Agent(Base, PrimaryKeyMixin, TimestampMixin):
 class Thread(Base, PrimaryKeyMixin, TimestampMixin):
     """Модель потока выполнения агента"""
     __tablename__ = "threads"
+    __table_args__ = (
+        # Пагинация по ключу списка потоков агента
+        Index("ix_threads_agent_id_created_at_id", "agent_id", "created_at", "id"),
+        Index("ix_threads_agent_id_status_created_at", "agent_id", "status", "created_at", "id"),
+        # Частичные индексы выполняющихся потоков
+        Index("ix_threads_agent_id_running", "agent_id", postgresql_where=text("status = 'running'")),
+        Index("ix_threads_running_updated_at", "updated_at", postgresql_where=text("status = 'running'")),
+    )
 
     # Состояние потока
     status = Column(String, nullable=False, default="created")  # created, running, completed, error
@@ -69,6 +83,7 @@ class Thread(Base, PrimaryKeyMixin, TimestampMixin):
     
     # Логи и результаты
     logs = Column(JSON, default=[])
+    logs_flushed_id = Column(String)  # последняя запись потока логов Redis, сохраненная в logs
     results = Column(JSON, default={})
     
     # Внешние ключи
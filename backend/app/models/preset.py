@@ -1,10 +1,14 @@
-from sqlalchemy import Column, String, Float, JSON, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.models.base import Base, PrimaryKeyMixin, TimestampMixin
 
 class Preset(Base, PrimaryKeyMixin, TimestampMixin):
     """Модель пресета для ИИ-агента"""
     __tablename__ = "presets"
+    __table_args__ = (
+        Index("ix_presets_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_presets_user_id_name", "user_id", "name"),
+    )
 
     name = Column(String, nullable=False)
     description = Column(String)
@@ -15,6 +19,9 @@ class Preset(Base, PrimaryKeyMixin, TimestampMixin):
     max_tokens = Column(Integer, nullable=False, default=2000)
     system_prompt = Column(String, nullable=False)
     
+    # Класс ресурсов браузера (см. settings.BROWSER_RESOURCE_CLASSES)
+    resource_class = Column(String, nullable=True)
+
     # Дополнительные настройки
     additional_config = Column(JSON, default={})
     
@@ -35,6 +42,7 @@ class Preset(Base, PrimaryKeyMixin, TimestampMixin):
             "temperature": self.temperature,
             "max_tokens": self.max_tokens,
             "system_prompt": self.system_prompt,
+            "resource_class": self.resource_class,
             "additional_config": self.additional_config,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
@@ -56,4 +56,12 @@ class User(Base, PrimaryKeyMixin, TimestampMixin):
         """Проверка возможности создания нового агента"""
         if self.MAX_AGENTS.get(self.role, 0) == -1:
             return True
-        return len(self.agents) < self.MAX_AGENTS.get(self.role, 0)
\ No newline at end of file
+        return len(self.agents) < self.MAX_AGENTS.get(self.role, 0)
+
+    @classmethod
+    def max_running_tasks(cls, role: str) -> int:
+        """Лимит одновременно выполняемых задач роли, -1 - без ограничений"""
+        max_agents = cls.MAX_AGENTS.get(role, 0)
+        if max_agents == -1:
+            return -1
+        return max(1, max_agents * settings.MAX_THREADS_PER_AGENT)
@@ -1,6 +1,7 @@
-from typing import Optional, List, Dict
+from typing import Annotated, Optional, List, Dict
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import AfterValidator, BaseModel, Field
+from app.core.config import settings
 
 class ThreadBase(BaseModel):
     status: str = "created"
@@ -33,6 +34,60 @@ class Thread(ThreadBase):
 class ThreadResponse(Thread):
     pass
 
+class ThreadComplete(BaseModel):
+    success: bool
+    error_message: Optional[str] = None
+    results: Optional[Dict] = None
+
+class ThreadLogAppend(BaseModel):
+    lines: List[str] = Field(..., min_length=1, max_length=1000)
+
+class ThreadLogResponse(BaseModel):
+    thread_id: int
+    logs: List[str]
+
+class ScheduleCreate(BaseModel):
+    run_at: Optional[datetime] = None
+    interval: Optional[int] = Field(None, ge=settings.SCHEDULE_MIN_INTERVAL)  # в секундах
+    thread: ThreadCreate = ThreadCreate()
+
+class ScheduleResponse(BaseModel):
+    id: str
+    agent_id: int
+    interval: Optional[int] = None
+    next_run: Optional[datetime] = None
+    created_at: datetime
+
+class ThreadBatchCreate(BaseModel):
+    count: int = Field(..., ge=1, le=settings.MAX_THREADS_PER_BATCH)
+    thread: ThreadCreate = ThreadCreate()
+
+class ThreadBatchItem(BaseModel):
+    thread_id: int
+    status: str
+    browser_id: Optional[str] = None
+    error: Optional[str] = None
+
+class ThreadBatchResponse(BaseModel):
+    started: int
+    failed: int
+    results: List[ThreadBatchItem]
+
+def check_resource_class(v: Optional[str]) -> Optional[str]:
+    if v is not None and v not in settings.BROWSER_RESOURCE_CLASSES:
+        raise ValueError(f"Неизвестный класс ресурсов {v}")
+    return v
+
+def check_browser_config(v: Optional[Dict]) -> Optional[Dict]:
+    if v:
+        check_resource_class(v.get("resource_class"))
+    return v
+
+# Класс ресурсов проверяется только во входных схемах: строки в базе со
+# старым или удаленным из настроек классом должны читаться без ошибки
+ResourceClass = Annotated[Optional[str], AfterValidator(check_resource_class)]
+BrowserConfig = Annotated[Optional[Dict], AfterValidator(check_browser_config)]
+
 class AgentBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -43,9 +98,11 @@ class AgentBase(BaseModel):
 class AgentCreate(AgentBase):
     preset_id: int
     credentials: Optional[Dict] = None
+    browser_config: BrowserConfig = None
 
 class AgentUpdate(AgentBase):
     credentials: Optional[Dict] = None
+    browser_config: BrowserConfig = None
     status: Optional[str] = None
 
 class Agent(AgentBase):
@@ -78,13 +135,14 @@ class PresetBase(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 2000
     system_prompt: str
+    resource_class: Optional[str] = None
     additional_config: Optional[Dict] = None
 
 class PresetCreate(PresetBase):
-    pass
+    resource_class: ResourceClass = None
 
 class PresetUpdate(PresetBase):
-    pass
+    resource_class: ResourceClass = None
 
 class Preset(PresetBase):
     id: int
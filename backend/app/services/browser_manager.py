@@ -1,91 +1,627 @@
 import asyncio
 import logging
-from typing import Dict, Optional
+import os
+import socket
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
 import docker
 from datetime import datetime
 from app.core.config import settings
+from app.core.redis import browser_state
+from app.crud.agent import thread_crud
+from app.db.session import async_session
+from app.services.browser_profiles import ProfileSnapshotStore
+from app.services.browser_telemetry import TelemetryCollector
+from app.services.deadline_scheduler import DeadlineScheduler
+from app.services.docker_hosts import DockerHost, DockerHostPool, container_demand
 
 logger = logging.getLogger(__name__)
 
+class WarmPoolMetrics:
+    """Метрики тёплого пула браузеров"""
+
+    def __init__(self, window: int = 1000):
+        self.hits = 0
+        self.misses = 0
+        self.claim_latencies: Deque[float] = deque(maxlen=window)
+        self.refill_lags: Deque[float] = deque(maxlen=window)
+
+    def record_claim(self, hit: bool, latency: float):
+        """
+        Учесть выдачу браузера (из пула или холодным стартом)
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.claim_latencies.append(latency)
+
+    def record_refill(self, lag: float):
+        """
+        Учесть время восполнения слота пула после выдачи
+        """
+        self.refill_lags.append(lag)
+
+    @staticmethod
+    def _summary(samples: Deque[float]) -> dict:
+        if not samples:
+            return {"count": 0, "avg_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+        }
+
+    def snapshot(self) -> dict:
+        """
+        Текущие значения метрик
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "claim_latency": self._summary(self.claim_latencies),
+            "refill_lag": self._summary(self.refill_lags),
+        }
+
 class BrowserManager:
     def __init__(self):
-        self.docker_client = docker.from_env()
+        self.hosts = DockerHostPool.from_settings()
+        self.deadlines = DeadlineScheduler(batch_size=settings.BROWSER_TIMEOUT_BATCH_SIZE)
+        # Сетевой трафик браузера в статистике Docker считается активностью
+        self.telemetry = TelemetryCollector(on_activity=self.deadlines.touch)
+        self.profiles = ProfileSnapshotStore()
         self.active_browsers: Dict[str, dict] = {}
         self.max_instances = int(settings.MAX_BROWSER_INSTANCES)
         self.browser_timeout = int(settings.BROWSER_TIMEOUT)
+        self.idle_timeout = settings.BROWSER_IDLE_TIMEOUT
+
+        # Общий реестр браузеров в Redis: лимит действует на все API-процессы
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = int(settings.BROWSER_LEASE_TTL)
+
+        # Тёплый пул: заранее запущенные контейнеры без назначения
+        # (хост, контейнер, аренда слота). Аренда переходит к браузеру при выдаче
+        self.resource_classes = settings.BROWSER_RESOURCE_CLASSES
+        self.warm_pool_sizes = settings.BROWSER_WARM_POOL_SIZES
+        self.warm_pool: Dict[str, Deque[Tuple[DockerHost, Any, str]]] = {
+            resource_class: deque() for resource_class in self.warm_pool_sizes
+        }
+        # Моменты выдачи из пула, ожидающие восполнения (для метрики refill lag)
+        self.pending_refills: Dict[str, Deque[float]] = {
+            resource_class: deque() for resource_class in self.warm_pool_sizes
+        }
+        self.pool_metrics = WarmPoolMetrics()
+        # Браузеры, запуск которых уже начат, но еще не завершен
+        self._starting = 0
+        self._refill_event = asyncio.Event()
+        self._background_tasks: List[asyncio.Task] = []
 
-    async def create_browser(self, agent_id: int, thread_id: int) -> Optional[str]:
+    def _pooled_count(self) -> int:
+        return sum(len(pool) for pool in self.warm_pool.values())
+
+    def claimable(self) -> int:
         """
-        Создает новый изолированный браузер для агента
+        Контейнеры тёплого пула процесса: их выдача не требует нового слота
         """
-        if len(self.active_browsers) >= self.max_instances:
-            logger.error("Достигнут лимит браузеров")
-            return None
+        return self._pooled_count()
+
+    def _in_use(self) -> int:
+        return len(self.active_browsers) + self._starting + self._pooled_count()
+
+    async def _reserve_slot(self, lease: str) -> bool:
+        """
+        Занимает слот в общем лимите, при нехватке освобождая слоты
+        контейнеров тёплого пула этого процесса
+        """
+        while not await browser_state.reserve_capacity(lease, self.max_instances, self.lease_ttl):
+            if not await self._evict_warm():
+                return False
+        return True
+
+    async def _run_container(
+        self,
+        resource_class: str,
+        name: str,
+        environment: Dict[str, str],
+        labels: Dict[str, str],
+        volumes: Optional[Dict[str, dict]] = None
+    ) -> Tuple[DockerHost, Any]:
+        """
+        Размещает и запускает контейнер browser-use с лимитами класса ресурсов
+        """
+        limits = self.resource_classes[resource_class]
+        host = self.hosts.place(limits)
+        if host is None:
+            raise RuntimeError(f"Нет Docker-хоста со свободными ресурсами для класса {resource_class}")
 
+        demand = container_demand(limits)
         try:
-            container = self.docker_client.containers.run(
-                "browseruse/browser-use:latest",
+            container = await host.docker.run_container(
+                settings.BROWSER_IMAGE,
                 detach=True,
                 remove=True,
-                environment={
-                    "AGENT_ID": str(agent_id),
-                    "THREAD_ID": str(thread_id)
+                environment=environment,
+                labels={
+                    "replinet.browser": "1",
+                    "replinet.resource_class": resource_class,
+                    "replinet.owner": self.instance_id,
+                    # Потребность в ресурсах для учета занятости хоста
+                    "replinet.memory": str(demand["memory"]),
+                    "replinet.cpus": str(demand["cpus"]),
+                    **labels
                 },
-                network="replinet_network",
-                mem_limit="1g",
-                cpu_quota=100000,  # 1 CPU
-                name=f"browser_{agent_id}_{thread_id}_{datetime.now().timestamp()}"
+                network=settings.BROWSER_NETWORK,
+                mem_limit=limits["mem_limit"],
+                cpu_quota=limits["cpu_quota"],
+                volumes=volumes,
+                name=name
             )
+        except Exception:
+            host.release(demand)
+            raise
+        return host, container
+
+    async def _stop_container(self, host: DockerHost, container, resource_class: str):
+        """
+        Останавливает контейнер и возвращает его ресурсы хосту
+        """
+        try:
+            await host.docker.stop_container(container)
+        finally:
+            host.release(container_demand(self.resource_classes[resource_class]))
+
+    async def _claim_warm(self, resource_class: str):
+        """
+        Забирает живой контейнер из тёплого пула
+        """
+        pool = self.warm_pool.get(resource_class)
+        while pool:
+            host, container, lease = pool.popleft()
+            try:
+                await host.docker.reload_container(container)
+                if container.status == "running" and not host.draining:
+                    self.pending_refills[resource_class].append(time.perf_counter())
+                    self._refill_event.set()
+                    return host, container, lease
+            except Exception:
+                pass
+            logger.warning(f"Контейнер пула {container.id} недоступен, пропускаем")
+            await self._discard_warm(host, container, resource_class, lease)
+        return None
+
+    async def _discard_warm(self, host: DockerHost, container, resource_class: str, lease: str):
+        try:
+            await self._stop_container(host, container, resource_class)
+        except Exception as e:
+            logger.error(f"Ошибка остановки контейнера пула {container.id}: {e}")
+        await browser_state.release_capacity(lease)
+
+    async def _evict_warm(self) -> bool:
+        """
+        Освобождает слот, останавливая контейнер из самого большого пула
+        """
+        resource_class = max(self.warm_pool, key=lambda rc: len(self.warm_pool[rc]), default=None)
+        if resource_class is None or not self.warm_pool[resource_class]:
+            return False
+        host, container, lease = self.warm_pool[resource_class].pop()
+        await self._discard_warm(host, container, resource_class, lease)
+        return True
+
+    async def adaptive_resource_class(self, agent_id: int) -> Optional[str]:
+        """
+        Наименьший класс ресурсов, покрывающий пиковое потребление последних
+        запусков агента с запасом. None, если запусков пока недостаточно.
+        """
+        try:
+            peaks = await browser_state.get_run_peaks(agent_id)
+        except Exception as e:
+            logger.error(f"Не удалось получить пики потребления агента {agent_id}: {e}")
+            return None
+        if len(peaks) < settings.BROWSER_ADAPTIVE_MIN_RUNS:
+            return None
+
+        headroom = settings.BROWSER_ADAPTIVE_HEADROOM
+        needed_memory = max(peak["memory"] for peak in peaks) * headroom
+        needed_cpus = max(peak["cpu"] for peak in peaks) / 100 * headroom
+
+        by_size = sorted(
+            self.resource_classes,
+            key=lambda rc: tuple(container_demand(self.resource_classes[rc]).values())
+        )
+        for resource_class in by_size:
+            demand = container_demand(self.resource_classes[resource_class])
+            if demand["memory"] >= needed_memory and demand["cpus"] >= needed_cpus:
+                return resource_class
+        return by_size[-1]
+
+    async def create_browser(
+        self,
+        agent_id: int,
+        thread_id: int,
+        resource_class: Optional[str] = None,
+        preset_id: Optional[int] = None,
+        runtime_limit: Optional[int] = None,
+        idle_limit: Optional[int] = None,
+        persist_profile: bool = False,
+        adaptive: bool = False
+    ) -> Optional[str]:
+        """
+        Создает новый изолированный браузер для агента.
+
+        При persist_profile браузер получает рабочую копию снимка профиля
+        агента. Такой контейнер всегда запускается заново: к уже запущенному
+        контейнеру тёплого пула каталог профиля не подключить.
+
+        При adaptive и включенном адаптивном режиме класс ресурсов
+        подбирается по наблюдаемому потреблению агента.
+        """
+        resource_class = resource_class or settings.DEFAULT_BROWSER_RESOURCE_CLASS
+        if adaptive and settings.BROWSER_ADAPTIVE_LIMITS:
+            resource_class = await self.adaptive_resource_class(agent_id) or resource_class
+        if resource_class not in self.resource_classes:
+            logger.error(f"Неизвестный класс ресурсов {resource_class}")
+            return None
+
+        started = time.perf_counter()
+        name = f"browser_{agent_id}_{thread_id}_{datetime.now().timestamp()}"
+
+        self._starting += 1
+        # Аренда слота: имя нового контейнера или аренда контейнера пула
+        lease = None
+        profile_path = None
+        try:
+            volumes = None
+            environment = {
+                "AGENT_ID": str(agent_id),
+                "THREAD_ID": str(thread_id)
+            }
+            if persist_profile:
+                try:
+                    profile_path = await self.profiles.checkout(agent_id, name)
+                    volumes = {profile_path: {"bind": "/profile", "mode": "rw"}}
+                    environment["PROFILE_DIR"] = "/profile"
+                except Exception as e:
+                    logger.error(f"Не удалось подготовить профиль агента {agent_id}: {e}")
+
+            claimed = None if volumes else await self._claim_warm(resource_class)
+            hit = claimed is not None
+            if hit:
+                host, container, lease = claimed
+                await host.docker.rename_container(container, name)
+            else:
+                if not await self._reserve_slot(name):
+                    logger.error("Достигнут лимит браузеров")
+                    if profile_path:
+                        await self.profiles.discard(profile_path)
+                    return None
+                lease = name
+                host, container = await self._run_container(
+                    resource_class,
+                    name,
+                    environment=environment,
+                    labels={
+                        "replinet.agent_id": str(agent_id),
+                        "replinet.thread_id": str(thread_id)
+                    },
+                    volumes=volumes
+                )
 
             browser_id = container.id
             self.active_browsers[browser_id] = {
                 "container": container,
+                "name": name,
                 "agent_id": agent_id,
                 "thread_id": thread_id,
+                "preset_id": preset_id,
+                "resource_class": resource_class,
+                "host": host,
+                "lease": lease,
+                "profile_path": profile_path,
                 "started_at": datetime.now()
             }
+            entry = {
+                "name": name,
+                "agent_id": agent_id,
+                "thread_id": thread_id,
+                "preset_id": preset_id,
+                "resource_class": resource_class,
+                "host": host.name,
+                "lease": lease,
+                "profile_path": profile_path,
+                "owner": self.instance_id,
+                "started_at": self.active_browsers[browser_id]["started_at"].isoformat()
+            }
+            await browser_state.register_browser(browser_id, entry)
+            # Метки контейнера пула не содержат потока: назначение сохраняется
+            # отдельно от реестра, записи которого удаляются с арендой
+            await browser_state.set_container_owner(name, {
+                **entry,
+                "browser_id": browser_id,
+                "registered_at": time.time()
+            })
+            self.telemetry.watch(browser_id, container, agent_id, preset_id)
+            self.deadlines.add(
+                browser_id,
+                runtime_limit=runtime_limit or self.browser_timeout,
+                idle_limit=idle_limit or self.idle_timeout
+            )
+
+            # Контейнеры пула получают назначение через Redis
+            await browser_state.set_browser_state(
+                browser_id,
+                {"agent_id": agent_id, "thread_id": thread_id, "status": "assigned"},
+                ttl=self.browser_timeout
+            )
 
-            logger.info(f"Создан браузер {browser_id} для агента {agent_id}")
+            self.pool_metrics.record_claim(hit, time.perf_counter() - started)
+            logger.info(
+                f"Создан браузер {browser_id} для агента {agent_id} "
+                f"({'тёплый пул' if hit else 'холодный старт'})"
+            )
             return browser_id
 
         except Exception as e:
             logger.error(f"Ошибка создания браузера: {e}")
+            if lease:
+                await browser_state.release_capacity(lease)
+            if profile_path:
+                await self.profiles.discard(profile_path)
             return None
+        finally:
+            self._starting -= 1
 
-    async def stop_browser(self, browser_id: str) -> bool:
+    async def refill_warm_pool(self):
         """
-        Останавливает и удаляет browser-use контейнер
+        Дозаполняет тёплый пул до целевых размеров в пределах лимита браузеров.
+
+        Каждый контейнер пула занимает слот в общем лимите кластера, как и
+        работающий браузер.
         """
+        for resource_class, size in self.warm_pool_sizes.items():
+            pool = self.warm_pool[resource_class]
+            while len(pool) < size:
+                if self._in_use() >= self.max_instances:
+                    return
+
+                name = f"browser_pool_{resource_class}_{datetime.now().timestamp()}"
+                if not await browser_state.reserve_capacity(name, self.max_instances, self.lease_ttl):
+                    return
+                try:
+                    host, container = await self._run_container(
+                        resource_class,
+                        name,
+                        environment={"WARM_POOL": "1", "RESOURCE_CLASS": resource_class},
+                        labels={"replinet.pool": resource_class}
+                    )
+                except Exception:
+                    await browser_state.release_capacity(name)
+                    raise
+                pool.append((host, container, name))
+
+                pending = self.pending_refills[resource_class]
+                if pending:
+                    self.pool_metrics.record_refill(time.perf_counter() - pending.popleft())
+
+    async def maintain_warm_pool(self):
+        """
+        Фоновое восполнение тёплого пула после выдачи контейнеров
+        """
+        while True:
+            try:
+                await self.refill_warm_pool()
+            except Exception as e:
+                logger.error(f"Ошибка восполнения тёплого пула: {e}")
+
+            self._refill_event.clear()
+            try:
+                await asyncio.wait_for(
+                    self._refill_event.wait(),
+                    timeout=settings.BROWSER_WARM_POOL_REFILL_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def get_pool_metrics(self) -> dict:
+        """
+        Возвращает размеры тёплого пула и метрики выдачи
+        """
+        return {
+            "sizes": {rc: len(pool) for rc, pool in self.warm_pool.items()},
+            "targets": dict(self.warm_pool_sizes),
+            **self.pool_metrics.snapshot()
+        }
+
+    async def stop_browser(self, browser_id: str, save_profile: bool = False) -> bool:
+        """
+        Останавливает и удаляет browser-use контейнер.
+
+        При save_profile рабочая копия профиля сохраняется как снимок агента,
+        иначе удаляется.
+        """
+        info = None
         try:
             if browser_id in self.active_browsers:
-                container = self.active_browsers[browser_id]["container"]
-                container.stop()
-                del self.active_browsers[browser_id]
-                logger.info(f"Остановлен браузер {browser_id}")
-                return True
+                info = self.active_browsers[browser_id]
+                await self._stop_container(info["host"], info["container"], info["resource_class"])
+            else:
+                info = await browser_state.get_registered_browser(browser_id)
+                if not info:
+                    return False
+                # Браузер запущен другим API-процессом
+                host = self.hosts.get(info["host"])
+                container = await host.docker.get_container(browser_id)
+                await self._stop_container(host, container, info["resource_class"])
+        except docker.errors.NotFound:
+            # Контейнер уже остановлен и удален (remove=True)
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка остановки браузера {browser_id}: {e}")
             return False
+
+        try:
+            self.active_browsers.pop(browser_id, None)
+            self.deadlines.remove(browser_id)
+            self.telemetry.unwatch(browser_id)
+            await browser_state.unregister_browser(browser_id)
+            if info and info.get("name"):
+                await browser_state.remove_container_owners([info["name"]])
+            if info and info.get("profile_path"):
+                if save_profile:
+                    await self.profiles.commit(info["agent_id"], info["profile_path"])
+                else:
+                    await self.profiles.discard(info["profile_path"])
+            await browser_state.delete_browser_state(browser_id)
+            self._refill_event.set()
+            logger.info(f"Остановлен браузер {browser_id}")
+            return True
         except Exception as e:
             logger.error(f"Ошибка остановки браузера {browser_id}: {e}")
             return False
 
-    async def check_timeouts(self):
+    async def complete_browser(self, browser_id: str, success: bool) -> bool:
+        """
+        Завершает браузер потока; профиль сохраняется только при успехе
+        """
+        return await self.stop_browser(browser_id, save_profile=success)
+
+    async def renew_leases(self):
+        """
+        Продлевает аренды слотов браузеров этого процесса
+        """
+        while True:
+            try:
+                await browser_state.heartbeat(self.instance_id, self.lease_ttl)
+                leases = [info["lease"] for info in self.active_browsers.values()]
+                leases += [lease for pool in self.warm_pool.values() for _, _, lease in pool]
+                await browser_state.renew_leases(leases, self.lease_ttl)
+                pruned = await browser_state.prune_registry()
+                if pruned:
+                    logger.warning(f"Удалено {pruned} браузеров с истекшей арендой из реестра")
+            except Exception as e:
+                logger.error(f"Ошибка продления аренд браузеров: {e}")
+            await asyncio.sleep(self.lease_ttl / 3)
+
+    async def sync_hosts(self):
+        """
+        Обновляет емкость, загрузку и статус вывода из эксплуатации Docker-хостов
+        """
+        draining = await browser_state.get_draining_hosts()
+        await self.hosts.sync(draining)
+
+    async def maintain_hosts(self):
         """
-        Проверяет и останавливает зависшие браузеры
+        Периодическая синхронизация состояния Docker-хостов
         """
         while True:
-            current_time = datetime.now()
-            browsers_to_stop = []
+            await asyncio.sleep(settings.DOCKER_HOSTS_SYNC_INTERVAL)
+            try:
+                await self.sync_hosts()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации Docker-хостов: {e}")
+
+    async def drain_host(self, name: str, stop_running: bool = False) -> dict:
+        """
+        Выводит хост из эксплуатации: новые браузеры на нем не размещаются,
+        контейнеры тёплого пула останавливаются. При stop_running также
+        останавливаются работающие на хосте браузеры.
+        """
+        host = self.hosts.get(name)
+        await browser_state.set_host_draining(name, True)
+        host.draining = True
+
+        stopped_pool = 0
+        for resource_class, pool in self.warm_pool.items():
+            on_host = [entry for entry in pool if entry[0] is host]
+            for entry in on_host:
+                pool.remove(entry)
+            await asyncio.gather(
+                *(self._discard_warm(h, container, resource_class, lease) for h, container, lease in on_host)
+            )
+            stopped_pool += len(on_host)
+
+        registered = await browser_state.list_registered_browsers()
+        running = [browser_id for browser_id, info in registered.items() if info.get("host") == name]
+        if stop_running:
+            await asyncio.gather(*(self.stop_browser(browser_id) for browser_id in running))
+        self._refill_event.set()
+
+        logger.info(f"Docker-хост {name} выводится из эксплуатации")
+        return {
+            "host": name,
+            "stopped_pool_containers": stopped_pool,
+            "running_browsers": 0 if stop_running else len(running),
+        }
+
+    async def undrain_host(self, name: str):
+        """
+        Возвращает хост в эксплуатацию
+        """
+        host = self.hosts.get(name)
+        await browser_state.set_host_draining(name, False)
+        host.draining = False
+        self._refill_event.set()
 
-            for browser_id, info in self.active_browsers.items():
-                duration = (current_time - info["started_at"]).total_seconds()
-                if duration > self.browser_timeout:
-                    browsers_to_stop.append(browser_id)
+    def get_hosts(self) -> List[dict]:
+        """
+        Состояние Docker-хостов
+        """
+        return self.hosts.to_list()
 
-            for browser_id in browsers_to_stop:
-                logger.warning(f"Таймаут браузера {browser_id}")
-                await self.stop_browser(browser_id)
+    async def touch_browser(self, browser_id: str) -> bool:
+        """
+        Отмечает активность браузера, откладывая таймаут простоя. Для
+        браузеров других процессов отметка сохраняется в Redis
+        """
+        if browser_id in self.active_browsers:
+            return self.deadlines.touch(browser_id)
+        return await browser_state.touch_browser(browser_id)
 
-            await asyncio.sleep(10)  # Проверка каждые 10 секунд
+    async def extend_browser(self, browser_id: str, seconds: int) -> bool:
+        """
+        Продлевает лимит времени работы браузера. Для браузеров других
+        процессов продление сохраняется в Redis
+        """
+        if browser_id in self.active_browsers:
+            return self.deadlines.extend(browser_id, seconds)
+        return await browser_state.extend_browser(browser_id, seconds)
+
+    async def _stop_expired(self, browser_ids: List[str]):
+        """
+        Параллельно останавливает пачку браузеров с истекшим дедлайном
+        """
+        for browser_id in browser_ids:
+            logger.warning(f"Таймаут браузера {browser_id}")
+        results = await asyncio.gather(
+            *(self.stop_browser(browser_id) for browser_id in browser_ids)
+        )
+        for browser_id, stopped in zip(browser_ids, results):
+            if not stopped and browser_id in self.active_browsers:
+                # Повторная попытка остановки через 10 секунд
+                self.deadlines.add(browser_id, runtime_limit=10)
+
+    async def _refresh_deadlines(self, browser_ids: List[str]):
+        """
+        Переносит на дедлайны отметки активности и продления из Redis,
+        оставленные другими процессами
+        """
+        now = time.monotonic()
+        updates = await browser_state.take_deadline_updates(browser_ids)
+        for browser_id, (age, extension) in updates.items():
+            if age is not None:
+                self.deadlines.touch(browser_id, at=now - age)
+            if extension:
+                self.deadlines.extend(browser_id, extension)
+
+    async def check_timeouts(self):
+        """
+        Останавливает браузеры по наступлению дедлайна (лимит работы или простоя)
+        """
+        await self.deadlines.run(self._stop_expired, refresh=self._refresh_deadlines)
 
     def get_browser_status(self, browser_id: str) -> Optional[dict]:
         """
@@ -94,22 +630,264 @@ class BrowserManager:
         if browser_id in self.active_browsers:
             info = self.active_browsers[browser_id]
             container = info["container"]
-            
+
             return {
                 "status": container.status,
                 "agent_id": info["agent_id"],
                 "thread_id": info["thread_id"],
+                "resource_class": info["resource_class"],
                 "started_at": info["started_at"].isoformat(),
+                "expires_in": self.deadlines.remaining(browser_id),
                 "container_id": browser_id
             }
         return None
 
-    async def cleanup(self):
+    async def _adopt(self, host: DockerHost, container, thread, entry: Optional[dict]) -> bool:
+        """
+        Берет под управление браузер, оставшийся от завершившегося процесса
+        """
+        labels = container.labels
+        entry = entry or {}
+        lease = entry.get("lease") or container.name
+        if not await browser_state.reserve_capacity(lease, self.max_instances, self.lease_ttl):
+            return False
+
+        started_at = (
+            datetime.fromisoformat(entry["started_at"]) if entry.get("started_at")
+            else thread.start_time or datetime.now()
+        )
+        info = {
+            "container": container,
+            "name": container.name,
+            "agent_id": thread.agent_id,
+            "thread_id": thread.id,
+            "preset_id": entry.get("preset_id"),
+            "resource_class": labels["replinet.resource_class"],
+            "host": host,
+            "lease": lease,
+            "profile_path": entry.get("profile_path"),
+            "started_at": started_at
+        }
+        self.active_browsers[container.id] = info
+        await browser_state.register_browser(container.id, {
+            **{k: v for k, v in info.items() if k not in ("container", "host", "started_at")},
+            "host": host.name,
+            "owner": self.instance_id,
+            "started_at": started_at.isoformat()
+        })
+        self.telemetry.watch(container.id, container, thread.agent_id, entry.get("preset_id"))
+
+        elapsed = (datetime.now() - started_at).total_seconds()
+        self.deadlines.add(
+            container.id,
+            runtime_limit=max(self.browser_timeout - elapsed, 1),
+            idle_limit=self.idle_timeout
+        )
+        return True
+
+    async def reconcile(self) -> dict:
+        """
+        Сверка контейнеров браузеров после перезапуска.
+
+        Контейнеры с метками replinet получаются одним запросом на каждый
+        хост. Контейнеры живых процессов не трогаются; браузеры завершившихся
+        процессов, чьи потоки еще выполняются, берутся под управление, прочие
+        (включая тёплый пул) останавливаются параллельно. Выполняющиеся потоки
+        без живого браузера переводятся в ошибку одним UPDATE. Если какой-то
+        хост недоступен, в ошибку переводятся только потоки, браузер которых
+        находился на просмотренных хостах.
+        """
+        token = await browser_state.acquire_lock("browsers:reconcile", ttl=120)
+        if not token:
+            logger.info("Сверка браузеров уже выполняется другим процессом")
+            return {"skipped": True}
+
+        try:
+            reconcile_started = datetime.utcnow()
+            listing_started = time.time()
+            live_instances = await browser_state.get_live_instances()
+            registry = await browser_state.list_registered_browsers()
+            owners = await browser_state.list_container_owners()
+
+            async def list_host(host: DockerHost):
+                if not host.healthy:
+                    return host, None
+                try:
+                    return host, await host.docker.list_containers({"label": "replinet.browser=1"})
+                except Exception as e:
+                    logger.error(f"Не удалось получить контейнеры Docker-хоста {host.name}: {e}")
+                    return host, None
+
+            listings = await asyncio.gather(*(list_host(host) for host in self.hosts.hosts.values()))
+            listed_hosts = {host.name for host, containers in listings if containers is not None}
+
+            live_ids = set()
+            listed_ids = set()
+            listed_names = set()
+            candidates = []
+            to_stop = []
+            for host, containers in listings:
+                for container in containers or []:
+                    listed_ids.add(container.id)
+                    listed_names.add(container.name)
+                    labels = container.labels
+                    if labels.get("replinet.owner") in live_instances:
+                        live_ids.add(container.id)
+                        continue
+                    entry = registry.get(container.id) or owners.get(container.name)
+                    thread_id = (entry or {}).get("thread_id") or labels.get("replinet.thread_id")
+                    if thread_id is None:
+                        to_stop.append((host, container))
+                    else:
+                        candidates.append((host, container, int(thread_id), entry))
+
+            async with async_session() as db:
+                threads = {
+                    thread.id: thread
+                    for thread in await thread_crud.get_by_ids(
+                        db, ids=[thread_id for _, _, thread_id, _ in candidates]
+                    )
+                }
+
+                adopted = 0
+                for host, container, thread_id, entry in candidates:
+                    thread = threads.get(thread_id)
+                    if (
+                        thread is not None
+                        and thread.status == "running"
+                        and thread.browser_id == container.id
+                        and await self._adopt(host, container, thread, entry)
+                    ):
+                        live_ids.add(container.id)
+                        adopted += 1
+                    else:
+                        to_stop.append((host, container))
+
+                async def stop_orphan(host: DockerHost, container):
+                    try:
+                        await self._stop_container(
+                            host, container, container.labels["replinet.resource_class"]
+                        )
+                    except docker.errors.NotFound:
+                        pass
+                    await browser_state.unregister_browser(container.id)
+                    await browser_state.remove_container_owners([container.name])
+
+                results = await asyncio.gather(
+                    *(stop_orphan(host, container) for host, container in to_stop),
+                    return_exceptions=True
+                )
+                for (_, container), result in zip(to_stop, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Ошибка остановки контейнера {container.id}: {result}")
+
+                only_browser_ids = None
+                if len(listed_hosts) < len(self.hosts.hosts):
+                    # Браузеры на непросмотренных хостах могут быть живы
+                    on_listed = listed_ids | {
+                        browser_id for browser_id, entry in registry.items()
+                        if entry.get("host") in listed_hosts
+                    } | {
+                        entry["browser_id"] for entry in owners.values()
+                        if entry.get("host") in listed_hosts and entry.get("browser_id")
+                    }
+                    only_browser_ids = list(on_listed - live_ids)
+
+                # Назначения контейнеров, которых больше нет на просмотренных
+                # хостах; записи новее списка контейнеров не трогаются
+                await browser_state.remove_container_owners([
+                    name for name, entry in owners.items()
+                    if entry.get("host") in listed_hosts
+                    and name not in listed_names
+                    and entry.get("registered_at", 0) < listing_started
+                ])
+
+                failed_threads = await thread_crud.fail_orphaned(
+                    db,
+                    live_browser_ids=list(live_ids),
+                    updated_before=reconcile_started,
+                    error_message="Браузер потерян при перезапуске менеджера",
+                    only_browser_ids=only_browser_ids
+                )
+
+            summary = {
+                "adopted": adopted,
+                "stopped": len(to_stop),
+                "failed_threads": failed_threads,
+            }
+            logger.info(f"Сверка браузеров завершена: {summary}")
+            return summary
+        finally:
+            await browser_state.release_lock("browsers:reconcile", token)
+
+    async def get_browser_telemetry(self, browser_id: str) -> Optional[dict]:
+        """
+        Ряды CPU, памяти и сети браузера: из памяти процесса или из Redis,
+        если браузер обслуживает другой API-процесс
         """
-        Очистка всех браузеров при выключении
+        return self.telemetry.get_series(browser_id) or await browser_state.get_telemetry(browser_id)
+
+    async def start(self, warm_pool: bool = True):
         """
-        for browser_id in list(self.active_browsers.keys()):
-            await self.stop_browser(browser_id)
+        Запуск фоновых задач менеджера.
+
+        Тёплый пул занимает слоты общего лимита, поэтому его держат только
+        процессы, которые сами запускают браузеры (warm_pool=True).
+        """
+        await browser_state.heartbeat(self.instance_id, self.lease_ttl)
+        await self.sync_hosts()
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.error(f"Ошибка сверки контейнеров браузеров: {e}")
+
+        self._background_tasks = [
+            asyncio.create_task(self.check_timeouts()),
+            asyncio.create_task(self.maintain_hosts()),
+            asyncio.create_task(self.renew_leases()),
+            asyncio.create_task(self.telemetry.run()),
+        ]
+        if warm_pool:
+            self._background_tasks.append(asyncio.create_task(self.maintain_warm_pool()))
+
+    async def cleanup(self, stop_browsers: bool = True):
+        """
+        Очистка браузеров при выключении.
+
+        Без stop_browsers работающие браузеры не останавливаются. Процесс
+        перестает продлевать аренды и heartbeat, они истекают через
+        BROWSER_LEASE_TTL, и записи реестра удаляет prune_registry. Сверка
+        (reconcile) следующего запущенного процесса видит, что владелец
+        контейнера не жив, находит поток по реестру или browsers:owners
+        (назначение контейнера хранится без аренды) и берет браузер под
+        управление с остатком лимита времени. До этого дедлайны браузеров
+        никто не проверяет, а их слоты не учитываются в общем лимите.
+        Контейнеры тёплого пула останавливаются всегда.
+        """
+        for task in self._background_tasks:
+            task.cancel()
+        self._background_tasks = []
+
+        if stop_browsers:
+            await asyncio.gather(
+                *(self.stop_browser(browser_id) for browser_id in list(self.active_browsers))
+            )
+
+        pooled = [
+            (host, container, resource_class, lease)
+            for resource_class, pool in self.warm_pool.items()
+            for host, container, lease in pool
+        ]
+        for pool in self.warm_pool.values():
+            pool.clear()
+        await asyncio.gather(*(self._discard_warm(*entry) for entry in pooled))
+
+        try:
+            await self.telemetry.flush()
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки телеметрии браузеров: {e}")
+        self.telemetry.close()
+        self.hosts.close()
 
 async def main():
     """
@@ -117,18 +895,19 @@ async def main():
     """
     logging.basicConfig(level=logging.INFO)
     manager = BrowserManager()
-    
+
     try:
-        # Запуск проверки таймаутов
-        asyncio.create_task(manager.check_timeouts())
-        
+        # Запуск проверки таймаутов; браузеры этот процесс не запускает,
+        # поэтому тёплый пул ему не нужен
+        await manager.start(warm_pool=False)
+
         # Держим сервис запущенным
         while True:
             await asyncio.sleep(1)
-            
+
     except KeyboardInterrupt:
         logger.info("Остановка менеджера браузеров")
         await manager.cleanup()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SIZE_FILE = ".replinet_size"
+
+# Каталоги кеша Chromium, которые удаляются первыми при превышении лимита
+CACHE_DIRS = ("Cache", "Code Cache", "GPUCache", os.path.join("Service Worker", "CacheStorage"))
+
+def dir_size(path: str) -> int:
+    """
+    Размер каталога в байтах
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+class ProfileSnapshotStore:
+    """
+    Снимки профилей браузера (cookies, local storage, кеш) по агентам.
+
+    Новый поток получает рабочую копию снимка, созданную через
+    cp --reflink=auto: на btrfs/XFS копия разделяет блоки со снимком
+    (copy-on-write), на других ФС выполняется обычное копирование. После
+    успешного завершения потока рабочая копия атомарно заменяет снимок.
+    Копирование и замена снимка одного агента выполняются под файловой
+    блокировкой, общей для всех процессов. Каталог должен быть доступен по
+    одному пути менеджеру и Docker-хостам.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_snapshot_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None
+    ):
+        self.root = root or settings.BROWSER_PROFILES_DIR
+        self.max_snapshot_bytes = max_snapshot_bytes or settings.BROWSER_PROFILE_MAX_BYTES
+        self.max_total_bytes = max_total_bytes or settings.BROWSER_PROFILES_MAX_TOTAL_BYTES
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+        self.work_dir = os.path.join(self.root, "work")
+
+    def _snapshot_path(self, agent_id: int) -> str:
+        return os.path.join(self.snapshots_dir, f"agent_{agent_id}")
+
+    @contextmanager
+    def _lock(self, agent_id: int, exclusive: bool) -> Iterator[None]:
+        """
+        Блокировка снимка агента: разделяемая для копирования, монопольная для замены
+        """
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        with open(os.path.join(self.snapshots_dir, f".agent_{agent_id}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _checkout(self, agent_id: int, name: str) -> str:
+        os.makedirs(self.work_dir, exist_ok=True)
+        work_path = os.path.join(self.work_dir, name)
+        snapshot = self._snapshot_path(agent_id)
+
+        with self._lock(agent_id, exclusive=False):
+            if os.path.isdir(snapshot):
+                try:
+                    subprocess.run(
+                        ["cp", "-a", "--reflink=auto", snapshot, work_path],
+                        check=True,
+                        capture_output=True
+                    )
+                except Exception:
+                    shutil.rmtree(work_path, ignore_errors=True)
+                    raise
+                # Время последнего использования для LRU-вытеснения
+                os.utime(snapshot)
+            else:
+                os.makedirs(work_path)
+        return work_path
+
+    def _trim_caches(self, path: str):
+        for root, dirs, _ in os.walk(path):
+            for name in list(dirs):
+                candidate = os.path.join(root, name)
+                if any(candidate.endswith(os.sep + cache_dir) for cache_dir in CACHE_DIRS):
+                    shutil.rmtree(candidate, ignore_errors=True)
+                    dirs.remove(name)
+
+    def _commit(self, agent_id: int, work_path: str) -> bool:
+        try:
+            return self._replace_snapshot(agent_id, work_path)
+        finally:
+            # После успешной замены рабочей копии уже нет; при любом сбое
+            # она удаляется, чтобы не занимать место
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    def _replace_snapshot(self, agent_id: int, work_path: str) -> bool:
+        size = dir_size(work_path)
+        if size > self.max_snapshot_bytes:
+            self._trim_caches(work_path)
+            size = dir_size(work_path)
+        if size > self.max_snapshot_bytes:
+            logger.warning(
+                f"Профиль агента {agent_id} ({size} байт) превышает лимит, снимок не сохранен"
+            )
+            return False
+
+        # Размер запоминается, чтобы вытеснение не обходило все снимки
+        with open(os.path.join(work_path, SIZE_FILE), "w") as f:
+            f.write(str(size))
+
+        snapshot = self._snapshot_path(agent_id)
+        # Уникальное имя: параллельные замены не используют один каталог
+        trash = os.path.join(self.work_dir, f"trash_{uuid.uuid4().hex}")
+        with self._lock(agent_id, exclusive=True):
+            replaced = os.path.isdir(snapshot)
+            if replaced:
+                os.rename(snapshot, trash)
+            try:
+                os.rename(work_path, snapshot)
+            except Exception:
+                if replaced:
+                    os.rename(trash, snapshot)
+                raise
+            os.utime(snapshot)
+        shutil.rmtree(trash, ignore_errors=True)
+
+        self._evict(keep=snapshot)
+        return True
+
+    def _evict(self, keep: str):
+        """
+        Вытесняет давно не использованные снимки сверх общего лимита
+        """
+        snapshots: List[Tuple[float, int, str]] = []
+        for entry in os.scandir(self.snapshots_dir):
+            if entry.is_dir():
+                try:
+                    with open(os.path.join(entry.path, SIZE_FILE)) as f:
+                        size = int(f.read())
+                except (OSError, ValueError):
+                    size = dir_size(entry.path)
+                snapshots.append((entry.stat().st_mtime, size, entry.path))
+
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_total_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f"Вытеснен снимок профиля {path}")
+
+    async def checkout(self, agent_id: int, name: str) -> str:
+        """
+        Создать рабочую копию профиля агента для нового браузера
+        """
+        return await asyncio.to_thread(self._checkout, agent_id, name)
+
+    async def commit(self, agent_id: int, work_path: str) -> bool:
+        """
+        Сохранить рабочую копию как новый снимок профиля агента
+        """
+        started = time.perf_counter()
+        saved = await asyncio.to_thread(self._commit, agent_id, work_path)
+        if saved:
+            logger.info(
+                f"Сохранен снимок профиля агента {agent_id} "
+                f"за {time.perf_counter() - started:.2f} с"
+            )
+        return saved
+
+    async def discard(self, work_path: str):
+        """
+        Удалить рабочую копию без сохранения
+        """
+        await asyncio.to_thread(shutil.rmtree, work_path, True)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.core.redis import browser_state
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("timestamp", "cpu_percent", "memory_bytes", "rx_bytes", "tx_bytes")
+
+class RingBuffer:
+    """Кольцевой буфер фиксированного размера для числового ряда"""
+
+    __slots__ = ("size", "_data", "_head", "_count")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = array("d", [0.0]) * size
+        self._head = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def last(self) -> float:
+        """
+        Последнее значение (0, если буфер пуст)
+        """
+        return self._data[self._head - 1] if self._count else 0.0
+
+    def values(self) -> List[float]:
+        """
+        Значения от старых к новым
+        """
+        if self._count < self.size:
+            return self._data[:self._count].tolist()
+        return (self._data[self._head:] + self._data[:self._head]).tolist()
+
+def parse_stats(stats: dict) -> Optional[Dict[str, float]]:
+    """
+    Переводит ответ Docker stats в точку ряда
+    """
+    cpu_stats = stats.get("cpu_stats") or {}
+    precpu_stats = stats.get("precpu_stats") or {}
+    memory_stats = stats.get("memory_stats") or {}
+    if "usage" not in memory_stats:
+        # Контейнер уже остановлен
+        return None
+
+    cpu_delta = (
+        cpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+        - precpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+    )
+    system_delta = (
+        cpu_stats.get("system_cpu_usage", 0) - precpu_stats.get("system_cpu_usage", 0)
+    )
+    online_cpus = cpu_stats.get("online_cpus") or 1
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 else 0.0
+
+    # Как docker stats: страничный кеш не считается используемой памятью
+    cache = memory_stats.get("stats", {}).get("inactive_file", 0)
+    networks = (stats.get("networks") or {}).values()
+
+    return {
+        "timestamp": time.time(),
+        "cpu_percent": cpu_percent,
+        "memory_bytes": memory_stats["usage"] - cache,
+        "rx_bytes": sum(n.get("rx_bytes", 0) for n in networks),
+        "tx_bytes": sum(n.get("tx_bytes", 0) for n in networks),
+    }
+
+class BrowserSeries:
+    """Ряды телеметрии одного браузера и сводка с момента последней выгрузки"""
+
+    def __init__(self, window: int, agent_id: int, preset_id: Optional[int]):
+        self.agent_id = agent_id
+        self.preset_id = preset_id
+        self.buffers = {metric: RingBuffer(window) for metric in METRICS}
+        self.peak_cpu = 0.0
+        self.peak_memory = 0.0
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self.pending_peak_cpu = 0.0
+        self.pending_peak_memory = 0.0
+        self.pending_cpu_sum = 0.0
+        self.pending_memory_sum = 0.0
+        self.pending_samples = 0
+
+    def record(self, sample: Dict[str, float]):
+        for metric in METRICS:
+            self.buffers[metric].append(sample[metric])
+        self.peak_cpu = max(self.peak_cpu, sample["cpu_percent"])
+        self.peak_memory = max(self.peak_memory, sample["memory_bytes"])
+        self.pending_peak_cpu = max(self.pending_peak_cpu, sample["cpu_percent"])
+        self.pending_peak_memory = max(self.pending_peak_memory, sample["memory_bytes"])
+        self.pending_cpu_sum += sample["cpu_percent"]
+        self.pending_memory_sum += sample["memory_bytes"]
+        self.pending_samples += 1
+
+    def traffic(self) -> float:
+        """
+        Сетевой трафик браузера по последней точке
+        """
+        return self.buffers["rx_bytes"].last() + self.buffers["tx_bytes"].last()
+
+    def take_pending(self) -> Optional[dict]:
+        """
+        Забрать накопленную сводку для агрегатов по агенту и пресету
+        """
+        if not self.pending_samples:
+            return None
+        usage = {
+            "peak_cpu": self.pending_peak_cpu,
+            "peak_memory": self.pending_peak_memory,
+            "cpu_sum": self.pending_cpu_sum,
+            "memory_sum": self.pending_memory_sum,
+            "samples": self.pending_samples,
+        }
+        self._reset_pending()
+        return usage
+
+    def to_dict(self) -> dict:
+        return {
+            "agent_id": self.agent_id,
+            "preset_id": self.preset_id,
+            "peak_cpu_percent": self.peak_cpu,
+            "peak_memory_bytes": self.peak_memory,
+            "series": {metric: buffer.values() for metric, buffer in self.buffers.items()},
+        }
+
+class TelemetryCollector:
+    """
+    Сбор потоковой статистики Docker по активным браузерам.
+
+    Для каждого браузера открывается поток container.stats(stream=True) в
+    отдельном пуле потоков, точки складываются в кольцевые буферы. Раз в
+    интервал выгрузки последние ряды публикуются в Redis, чтобы их видели
+    все API-процессы, а сводки добавляются к агрегатам по агенту и пресету.
+    """
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        max_streams: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        on_activity: Optional[Callable[[str], Any]] = None
+    ):
+        self.window = window or settings.BROWSER_TELEMETRY_WINDOW
+        self.flush_interval = flush_interval or settings.BROWSER_TELEMETRY_FLUSH_INTERVAL
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_streams or settings.BROWSER_TELEMETRY_MAX_STREAMS,
+            thread_name_prefix="telemetry"
+        )
+        self.series: Dict[str, BrowserSeries] = {}
+        self._stop_flags: Dict[str, threading.Event] = {}
+        # Сводки остановленных браузеров, еще не выгруженные в Redis
+        self._finished: List[BrowserSeries] = []
+        # Вызывается для браузера, у которого вырос сетевой трафик
+        self.on_activity = on_activity
+
+    def _stream(self, browser_id: str, container, stop: threading.Event, loop):
+        try:
+            for stats in container.stats(stream=True, decode=True):
+                if stop.is_set():
+                    break
+                sample = parse_stats(stats)
+                if sample is not None:
+                    loop.call_soon_threadsafe(self._record, browser_id, sample)
+        except Exception as e:
+            if not stop.is_set():
+                logger.warning(f"Поток статистики браузера {browser_id} прерван: {e}")
+
+    def _record(self, browser_id: str, sample: Dict[str, float]):
+        series = self.series.get(browser_id)
+        if series is None:
+            return
+        traffic = series.traffic()
+        series.record(sample)
+        if self.on_activity is not None and series.traffic() > traffic:
+            self.on_activity(browser_id)
+
+    def watch(self, browser_id: str, container, agent_id: int, preset_id: Optional[int] = None):
+        """
+        Начать сбор статистики браузера
+        """
+        self.series[browser_id] = BrowserSeries(self.window, agent_id, preset_id)
+        stop = threading.Event()
+        self._stop_flags[browser_id] = stop
+        self.executor.submit(self._stream, browser_id, container, stop, asyncio.get_running_loop())
+
+    def unwatch(self, browser_id: str) -> Optional[BrowserSeries]:
+        """
+        Прекратить сбор статистики браузера
+        """
+        stop = self._stop_flags.pop(browser_id, None)
+        if stop is not None:
+            stop.set()
+        series = self.series.pop(browser_id, None)
+        if series is not None:
+            self._finished.append(series)
+        return series
+
+    def get_series(self, browser_id: str) -> Optional[dict]:
+        """
+        Ряды телеметрии браузера из памяти процесса
+        """
+        series = self.series.get(browser_id)
+        return series.to_dict() if series else None
+
+    async def flush(self):
+        """
+        Публикует ряды активных браузеров и сводки для агрегатов в Redis
+        """
+        finished, self._finished = self._finished, []
+        usage = []
+        for series in [*self.series.values(), *finished]:
+            pending = series.take_pending()
+            if pending:
+                usage.append((series.agent_id, series.preset_id, pending))
+
+        await browser_state.publish_telemetry(
+            {browser_id: series.to_dict() for browser_id, series in self.series.items()},
+            ttl=int(self.flush_interval * 3)
+        )
+        await browser_state.record_usage(usage)
+        await browser_state.record_run_peaks(
+            [
+                (series.agent_id, series.peak_cpu, series.peak_memory)
+                for series in finished
+                if len(series.buffers["timestamp"])
+            ],
+            history=settings.BROWSER_ADAPTIVE_HISTORY
+        )
+
+    async def run(self):
+        """
+        Периодическая выгрузка телеметрии
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки телеметрии браузеров: {e}")
+
+    def close(self):
+        for stop in self._stop_flags.values():
+            stop.set()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DeadlineEntry:
+    """Дедлайны одного ключа: абсолютный лимит и лимит простоя"""
+
+    __slots__ = ("hard_deadline", "idle_limit", "last_activity", "generation")
+
+    def __init__(
+        self,
+        hard_deadline: Optional[float],
+        idle_limit: Optional[float],
+        generation: int
+    ):
+        now = time.monotonic()
+        self.hard_deadline = hard_deadline
+        self.idle_limit = idle_limit
+        self.last_activity = now
+        self.generation = generation
+
+    def deadline(self) -> float:
+        """
+        Ближайший из двух дедлайнов
+        """
+        candidates = [self.hard_deadline] if self.hard_deadline is not None else []
+        if self.idle_limit is not None:
+            candidates.append(self.last_activity + self.idle_limit)
+        return min(candidates) if candidates else float("inf")
+
+class DeadlineScheduler:
+    """
+    Планировщик дедлайнов на куче.
+
+    Продление и отметка активности только сдвигают дедлайн вперед, поэтому
+    выполняются за O(1) без перестройки кучи: устаревшая запись всплывает,
+    пересчитывается и возвращается в кучу с актуальным временем. Записи
+    удаленных ключей отбрасываются по номеру поколения.
+    """
+
+    def __init__(self, batch_size: int = 50):
+        self.batch_size = batch_size
+        self._entries: Dict[str, DeadlineEntry] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._generation = 0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _push(self, key: str, entry: DeadlineEntry):
+        when = entry.deadline()
+        if when == float("inf"):
+            return
+        if not self._heap or when < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (when, entry.generation, key))
+
+    def add(
+        self,
+        key: str,
+        runtime_limit: Optional[float] = None,
+        idle_limit: Optional[float] = None
+    ):
+        """
+        Зарегистрировать ключ с лимитом времени работы и/или простоя (в секундах)
+        """
+        self._generation += 1
+        hard_deadline = time.monotonic() + runtime_limit if runtime_limit else None
+        entry = DeadlineEntry(hard_deadline, idle_limit or None, self._generation)
+        self._entries[key] = entry
+        self._push(key, entry)
+
+    def remove(self, key: str) -> bool:
+        """
+        Снять ключ с контроля
+        """
+        return self._entries.pop(key, None) is not None
+
+    def touch(self, key: str, at: Optional[float] = None) -> bool:
+        """
+        Отметить активность (по умолчанию текущим моментом), сдвинув дедлайн простоя
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry.last_activity = max(entry.last_activity, time.monotonic() if at is None else at)
+        return True
+
+    def extend(self, key: str, seconds: float) -> bool:
+        """
+        Продлить абсолютный лимит времени работы
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.hard_deadline is None:
+            return False
+        entry.hard_deadline += seconds
+        return True
+
+    def remaining(self, key: str) -> Optional[float]:
+        """
+        Секунд до ближайшего дедлайна
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry.deadline() - time.monotonic())
+
+    def due(self) -> List[str]:
+        """
+        Ключи, дедлайн которых по куче уже наступил (без извлечения)
+        """
+        now = time.monotonic()
+        keys = []
+        # Обход только вершин кучи с наступившим временем
+        stack = [0] if self._heap else []
+        while stack:
+            i = stack.pop()
+            when, generation, key = self._heap[i]
+            if when > now:
+                continue
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation == generation:
+                keys.append(key)
+            stack.extend(j for j in (2 * i + 1, 2 * i + 2) if j < len(self._heap))
+        return keys
+
+    def pop_expired(self) -> List[str]:
+        """
+        Извлечь все ключи с истекшим дедлайном
+        """
+        now = time.monotonic()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, generation, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry.generation != generation:
+                continue
+            if entry.deadline() <= now:
+                del self._entries[key]
+                expired.append(key)
+            else:
+                # Дедлайн был продлен после постановки в кучу
+                heapq.heappush(self._heap, (entry.deadline(), generation, key))
+        return expired
+
+    async def run(
+        self,
+        on_expired: Callable[[List[str]], Awaitable[None]],
+        refresh: Optional[Callable[[List[str]], Awaitable[None]]] = None
+    ):
+        """
+        Ждет ближайший дедлайн и передает истекшие ключи пачками.
+        refresh вызывается перед извлечением для ключей с наступившим
+        дедлайном и может отметить их активность или продлить лимит
+        """
+        while True:
+            if refresh is not None:
+                due = self.due()
+                if due:
+                    try:
+                        await refresh(due)
+                    except Exception as e:
+                        logger.error(f"Ошибка обновления дедлайнов: {e}")
+            expired = self.pop_expired()
+            for i in range(0, len(expired), self.batch_size):
+                try:
+                    await on_expired(expired[i:i + self.batch_size])
+                except Exception as e:
+                    logger.error(f"Ошибка обработки истекших дедлайнов: {e}")
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class DockerOperationTimeout(Exception):
+    """Операция Docker не уложилась в таймаут"""
+
+class AsyncDockerAdapter:
+    """
+    Асинхронная обертка над синхронным docker SDK.
+
+    Вызовы выполняются в ограниченном пуле потоков, поэтому не блокируют
+    event loop. Для каждого типа операции действует свой лимит
+    параллельности и таймаут.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_workers: Optional[int] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        timeouts: Optional[Dict[str, float]] = None
+    ):
+        self.client = client
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.DOCKER_EXECUTOR_WORKERS,
+            thread_name_prefix="docker"
+        )
+        self.concurrency = concurrency or settings.DOCKER_OP_CONCURRENCY
+        self.timeouts = timeouts or settings.DOCKER_OP_TIMEOUTS
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, operation: str) -> asyncio.Semaphore:
+        if operation not in self._semaphores:
+            self._semaphores[operation] = asyncio.Semaphore(
+                self.concurrency.get(operation, self.concurrency["default"])
+            )
+        return self._semaphores[operation]
+
+    async def _call(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Выполняет синхронный вызов в пуле потоков с лимитом и таймаутом.
+
+        Слот семафора освобождается только после фактического завершения
+        вызова в потоке, поэтому зависшие по таймауту операции продолжают
+        учитываться в лимите параллельности.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(operation)
+        await semaphore.acquire()
+        try:
+            future = loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: semaphore.release())
+
+        timeout = self.timeouts.get(operation, self.timeouts["default"])
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Таймаут операции Docker {operation} ({timeout} с)")
+            raise DockerOperationTimeout(operation)
+
+    async def run_container(self, image: str, **kwargs) -> Any:
+        """
+        Запустить контейнер
+        """
+        return await self._call("run", self.client.containers.run, image, **kwargs)
+
+    async def stop_container(self, container, timeout: int = 10) -> None:
+        """
+        Остановить контейнер
+        """
+        await self._call("stop", container.stop, timeout=timeout)
+
+    async def reload_container(self, container) -> None:
+        """
+        Обновить атрибуты контейнера
+        """
+        await self._call("inspect", container.reload)
+
+    async def rename_container(self, container, name: str) -> None:
+        """
+        Переименовать контейнер
+        """
+        await self._call("inspect", container.rename, name)
+
+    async def get_container(self, container_id: str) -> Any:
+        """
+        Получить контейнер по ID
+        """
+        return await self._call("inspect", self.client.containers.get, container_id)
+
+    async def list_containers(self, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """
+        Список контейнеров по фильтрам
+        """
+        return await self._call("list", self.client.containers.list, filters=filters or {})
+
+    async def info(self) -> Dict[str, Any]:
+        """
+        Сведения о Docker-демоне (память, число CPU)
+        """
+        return await self._call("inspect", self.client.info)
+
+    def close(self):
+        """
+        Остановка пула потоков
+        """
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+import docker
+from app.core.config import settings
+from app.services.docker_adapter import AsyncDockerAdapter
+
+logger = logging.getLogger(__name__)
+
+CPU_PERIOD = 100000  # период CFS по умолчанию, cpu_quota=100000 - одно ядро
+
+def parse_memory(value: Any) -> int:
+    """
+    Переводит лимит памяти в формате Docker ("512m", "1g") в байты
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    units = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = str(value).strip().lower()
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def container_demand(limits: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Потребность контейнера в памяти (байты) и CPU (ядра)
+    """
+    return {
+        "memory": parse_memory(limits["mem_limit"]),
+        "cpus": limits["cpu_quota"] / CPU_PERIOD,
+    }
+
+class DockerHost:
+    """Docker-демон, на котором размещаются браузеры"""
+
+    def __init__(
+        self,
+        name: str,
+        client,
+        memory: Optional[Any] = None,
+        cpus: Optional[float] = None
+    ):
+        self.name = name
+        self.docker = AsyncDockerAdapter(client)
+        self.memory = parse_memory(memory) if memory else 0
+        self.cpus = float(cpus) if cpus else 0.0
+        self.allocated_memory = 0
+        self.allocated_cpus = 0.0
+        self.draining = False
+        self.healthy = True
+
+    @property
+    def free_memory(self) -> int:
+        return self.memory - self.allocated_memory
+
+    @property
+    def free_cpus(self) -> float:
+        return self.cpus - self.allocated_cpus
+
+    def fits(self, demand: Dict[str, float]) -> bool:
+        return (
+            self.healthy
+            and not self.draining
+            and self.free_memory >= demand["memory"]
+            and self.free_cpus >= demand["cpus"]
+        )
+
+    def allocate(self, demand: Dict[str, float]):
+        self.allocated_memory += demand["memory"]
+        self.allocated_cpus += demand["cpus"]
+
+    def release(self, demand: Dict[str, float]):
+        self.allocated_memory = max(0, self.allocated_memory - demand["memory"])
+        self.allocated_cpus = max(0.0, self.allocated_cpus - demand["cpus"])
+
+    def load(self) -> float:
+        """
+        Доля занятых ресурсов по наиболее загруженному измерению
+        """
+        memory_load = self.allocated_memory / self.memory if self.memory else 1.0
+        cpu_load = self.allocated_cpus / self.cpus if self.cpus else 1.0
+        return max(memory_load, cpu_load)
+
+    async def sync(self):
+        """
+        Пересчитывает емкость и занятые ресурсы по данным демона.
+
+        Учитываются все браузеры на хосте, включая запущенные другими
+        API-процессами, поэтому размещение опирается на общую картину.
+        """
+        if not self.memory or not self.cpus:
+            info = await self.docker.info()
+            self.memory = self.memory or int(info["MemTotal"])
+            self.cpus = self.cpus or float(info["NCPU"])
+
+        containers = await self.docker.list_containers({"label": "replinet.browser=1"})
+        memory, cpus = 0, 0.0
+        for container in containers:
+            labels = container.labels
+            memory += int(labels.get("replinet.memory", 0))
+            cpus += float(labels.get("replinet.cpus", 0))
+        self.allocated_memory = memory
+        self.allocated_cpus = cpus
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "memory": self.memory,
+            "cpus": self.cpus,
+            "allocated_memory": self.allocated_memory,
+            "allocated_cpus": self.allocated_cpus,
+            "load": round(self.load(), 4),
+        }
+
+class DockerHostPool:
+    """
+    Набор Docker-хостов с размещением контейнеров по свободным ресурсам.
+
+    Стратегия "binpack" выбирает хост с наименьшим остатком, на который
+    контейнер еще помещается, и оставляет крупные окна на других хостах.
+    Стратегия "least_loaded" выбирает наименее загруженный хост.
+    """
+
+    def __init__(self, hosts: List[DockerHost], strategy: str = "binpack"):
+        if strategy not in ("binpack", "least_loaded"):
+            raise ValueError(f"Неизвестная стратегия размещения {strategy}")
+        self.hosts: Dict[str, DockerHost] = {host.name: host for host in hosts}
+        self.strategy = strategy
+
+    @classmethod
+    def from_settings(cls) -> "DockerHostPool":
+        hosts = []
+        for config in settings.DOCKER_HOSTS:
+            url = config.get("url")
+            client = docker.DockerClient(base_url=url) if url else docker.from_env()
+            hosts.append(DockerHost(
+                config["name"],
+                client,
+                memory=config.get("memory"),
+                cpus=config.get("cpus")
+            ))
+        return cls(hosts, strategy=settings.BROWSER_PLACEMENT_STRATEGY)
+
+    def get(self, name: str) -> DockerHost:
+        return self.hosts[name]
+
+    def place(self, limits: Dict[str, Any]) -> Optional[DockerHost]:
+        """
+        Выбирает хост для контейнера и резервирует на нем ресурсы
+        """
+        demand = container_demand(limits)
+        candidates = [host for host in self.hosts.values() if host.fits(demand)]
+        if not candidates:
+            return None
+
+        if self.strategy == "binpack":
+            host = min(
+                candidates,
+                key=lambda h: (h.free_memory - demand["memory"]) / h.memory
+                + (h.free_cpus - demand["cpus"]) / h.cpus
+            )
+        else:
+            host = min(candidates, key=lambda h: h.load())
+
+        host.allocate(demand)
+        return host
+
+    def release(self, name: str, limits: Dict[str, Any]):
+        """
+        Возвращает ресурсы контейнера хосту
+        """
+        host = self.hosts.get(name)
+        if host:
+            host.release(container_demand(limits))
+
+    async def sync(self, draining: Set[str]):
+        """
+        Обновляет состояние всех хостов параллельно
+        """
+        async def sync_host(host: DockerHost):
+            host.draining = host.name in draining
+            try:
+                await host.sync()
+                host.healthy = True
+            except Exception as e:
+                host.healthy = False
+                logger.error(f"Docker-хост {host.name} недоступен: {e}")
+
+        await asyncio.gather(*(sync_host(host) for host in self.hosts.values()))
+
+    def to_list(self) -> List[dict]:
+        return [host.to_dict() for host in self.hosts.values()]
+
+    def close(self):
+        for host in self.hosts.values():
+            host.docker.close()
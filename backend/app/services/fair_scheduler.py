@@ -0,0 +1,440 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.core.codecs import json_dumps, json_loads
+from app.core.config import settings
+from app.core.redis import QUEUE_METRICS_LUA, task_queue
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Возврат пользователя в набор готовых, если у него есть задачи и не
+# исчерпан лимит выполняемых. Проход (pass) не может отставать от
+# виртуального времени, иначе простаивавший пользователь накопил бы кредит.
+ACTIVATE_USER_LUA = """
+local function activate(ready, users, vtime, uid, list_key)
+    if redis.call('ZSCORE', ready, uid) or redis.call('LLEN', list_key) == 0 then
+        return
+    end
+    local cap = tonumber(redis.call('HGET', users, uid .. ':cap') or '-1')
+    local running = tonumber(redis.call('HGET', users, uid .. ':running') or '0')
+    if cap >= 0 and running >= cap then
+        return
+    end
+    local pass = tonumber(redis.call('HGET', users, uid .. ':pass') or '0')
+    local now = tonumber(redis.call('GET', vtime) or '0')
+    if pass < now then
+        pass = now
+        redis.call('HSET', users, uid .. ':pass', pass)
+    end
+    redis.call('ZADD', ready, pass, uid)
+end
+"""
+
+# KEYS: ready, users, vtime, counter, waiting, stats. ARGV: uid, weight,
+# cap, ttl (0 - без срока хранения), префикс ID задачи, префикс очереди
+# пользователя, данные задач
+FAIR_ENQUEUE_SCRIPT = ACTIVATE_USER_LUA + QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local uid = ARGV[1]
+local list_key = ARGV[6] .. uid
+local n = #ARGV - 6
+local last = redis.call('INCRBY', KEYS[4], n)
+local ids = {}
+for i = 1, n do
+    local task_id = ARGV[5] .. (last - n + i)
+    if tonumber(ARGV[4]) > 0 then
+        redis.call('SET', task_id, ARGV[6 + i], 'EX', ARGV[4])
+    else
+        redis.call('SET', task_id, ARGV[6 + i])
+    end
+    redis.call('LPUSH', list_key, task_id)
+    redis.call('ZADD', KEYS[5], now_ms, task_id)
+    ids[i] = task_id
+end
+redis.call('HINCRBY', KEYS[6], 'enqueued', n)
+redis.call('HSET', KEYS[2], uid .. ':weight', ARGV[2], uid .. ':cap', ARGV[3])
+activate(KEYS[1], KEYS[2], KEYS[3], uid, list_key)
+return ids
+"""
+
+# Выдача до ARGV[3] задач: каждый раз берется пользователь с наименьшим
+# проходом, его проход увеличивается на 1 / вес (stride scheduling).
+# KEYS: ready, users, vtime, processing, inflight, owners, deliveries,
+# task_users, waiting, reserved_at, stats. ARGV: срок видимости (мс),
+# воркер, количество, префикс очереди пользователя
+FAIR_RESERVE_SCRIPT = QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local result = {}
+local reserved = 0
+while reserved < tonumber(ARGV[3]) do
+    local top = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if #top == 0 then
+        break
+    end
+    local uid, pass = top[1], tonumber(top[2])
+    local list_key = ARGV[4] .. uid
+    local task_id = redis.call('RPOP', list_key)
+    local payload = task_id and redis.call('GET', task_id)
+    if payload then
+        redis.call('LPUSH', KEYS[4], task_id)
+        redis.call('ZADD', KEYS[5], now_ms + tonumber(ARGV[1]), task_id)
+        redis.call('HSET', KEYS[6], task_id, ARGV[2])
+        redis.call('HSET', KEYS[8], task_id, uid)
+        mark_taken(KEYS[9], KEYS[10], KEYS[11], task_id, now_ms)
+        table.insert(result, task_id)
+        table.insert(result, payload)
+        table.insert(result, redis.call('HINCRBY', KEYS[7], task_id, 1))
+        reserved = reserved + 1
+
+        local weight = tonumber(redis.call('HGET', KEYS[2], uid .. ':weight') or '1')
+        local cap = tonumber(redis.call('HGET', KEYS[2], uid .. ':cap') or '-1')
+        local running = redis.call('HINCRBY', KEYS[2], uid .. ':running', 1)
+        pass = pass + 1 / weight
+        redis.call('HSET', KEYS[2], uid .. ':pass', pass)
+        redis.call('SET', KEYS[3], top[2])
+        if (cap >= 0 and running >= cap) or redis.call('LLEN', list_key) == 0 then
+            redis.call('ZREM', KEYS[1], uid)
+        else
+            redis.call('ZADD', KEYS[1], pass, uid)
+        end
+    elseif not task_id then
+        redis.call('ZREM', KEYS[1], uid)
+    else
+        redis.call('ZREM', KEYS[9], task_id)
+        redis.call('HINCRBY', KEYS[11], 'expired', 1)
+    end
+end
+redis.call('HINCRBY', KEYS[11], 'dequeued', reserved)
+return result
+"""
+
+# Подтверждение ('ack') или отказ ('requeue' / 'drop'). Задача
+# освобождает слот пользователя, при возврате встает в голову его очереди.
+# KEYS: ready, users, vtime, inflight, owners, deliveries, task_users,
+# waiting, reserved_at, stats. ARGV: ID задачи, режим, префикс списков
+# обработки, префикс очереди пользователя
+FAIR_FINISH_SCRIPT = ACTIVATE_USER_LUA + QUEUE_METRICS_LUA + """
+if redis.call('ZREM', KEYS[4], ARGV[1]) == 0 then
+    return 0
+end
+local now_ms = queue_now_ms()
+mark_finished(KEYS[9], KEYS[10], ARGV[1], now_ms, true)
+local events = {ack = 'acked', requeue = 'requeued', drop = 'dropped'}
+redis.call('HINCRBY', KEYS[10], events[ARGV[2]] or 'dropped', 1)
+local worker = redis.call('HGET', KEYS[5], ARGV[1])
+redis.call('HDEL', KEYS[5], ARGV[1])
+if worker then
+    redis.call('LREM', ARGV[3] .. worker, 1, ARGV[1])
+end
+local uid = redis.call('HGET', KEYS[7], ARGV[1])
+redis.call('HDEL', KEYS[7], ARGV[1])
+if not uid then
+    return 1
+end
+redis.call('HINCRBY', KEYS[2], uid .. ':running', -1)
+local list_key = ARGV[4] .. uid
+if ARGV[2] == 'requeue' then
+    redis.call('RPUSH', list_key, ARGV[1])
+    redis.call('ZADD', KEYS[8], now_ms, ARGV[1])
+else
+    redis.call('HDEL', KEYS[6], ARGV[1])
+    redis.call('DEL', ARGV[1])
+end
+activate(KEYS[1], KEYS[2], KEYS[3], uid, list_key)
+return 1
+"""
+
+# Возврат задач с истекшим сроком видимости в очереди их пользователей.
+# Возвращает число возвращенных задач и пары (ID, данные) задач, ушедших
+# в очередь недоставленных.
+# KEYS: ready, users, vtime, inflight, owners, deliveries, task_users, dead,
+# waiting, reserved_at, stats. ARGV: размер пакета, лимит выдач, префикс
+# списков обработки, префикс очереди пользователя
+FAIR_REQUEUE_EXPIRED_SCRIPT = ACTIVATE_USER_LUA + QUEUE_METRICS_LUA + """
+local now_ms = queue_now_ms()
+local expired = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now_ms, 'LIMIT', 0, tonumber(ARGV[1]))
+local requeued = 0
+local dead = {}
+for _, task_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[4], task_id)
+    mark_finished(KEYS[10], KEYS[11], task_id, now_ms, false)
+    local worker = redis.call('HGET', KEYS[5], task_id)
+    redis.call('HDEL', KEYS[5], task_id)
+    if worker then
+        redis.call('LREM', ARGV[3] .. worker, 1, task_id)
+    end
+    local uid = redis.call('HGET', KEYS[7], task_id)
+    redis.call('HDEL', KEYS[7], task_id)
+    local deliveries = tonumber(redis.call('HGET', KEYS[6], task_id) or '0')
+    if deliveries >= tonumber(ARGV[2]) or not uid then
+        redis.call('HDEL', KEYS[6], task_id)
+        redis.call('LPUSH', KEYS[8], task_id)
+        redis.call('HINCRBY', KEYS[11], 'dead', 1)
+        table.insert(dead, task_id)
+        table.insert(dead, redis.call('GET', task_id) or '')
+    else
+        redis.call('RPUSH', ARGV[4] .. uid, task_id)
+        redis.call('ZADD', KEYS[9], now_ms, task_id)
+        requeued = requeued + 1
+    end
+    if uid then
+        redis.call('HINCRBY', KEYS[2], uid .. ':running', -1)
+        activate(KEYS[1], KEYS[2], KEYS[3], uid, ARGV[4] .. uid)
+    end
+end
+redis.call('HINCRBY', KEYS[11], 'timed_out', #expired)
+table.insert(dead, 1, requeued)
+return dead
+"""
+
+class FairShareQueue:
+    """
+    Очередь задач со справедливым распределением между пользователями.
+
+    У каждого пользователя своя подочередь. Готовые к выдаче пользователи
+    хранятся в sorted set по проходу (pass): выдача берет пользователя с
+    наименьшим проходом и увеличивает его на 1 / вес роли, поэтому доля
+    выдач пропорциональна весу, а выбор стоит O(log пользователей).
+    Пользователь, упершийся в лимит выполняемых задач своего тарифа,
+    выходит из набора до подтверждения одной из задач.
+
+    Выданные задачи хранятся в тех же структурах, что и надежный режим
+    TaskQueue (список обработки воркера, сроки видимости, счетчики выдач),
+    и ведут те же метрики, поэтому task_queue.get_metrics работает и для
+    этой очереди.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.redis = task_queue.redis
+        self.worker_id = task_queue.worker_id
+        self.ready_key = f"fair:{name}:ready"
+        self.users_key = f"fair:{name}:users"
+        self.vtime_key = f"fair:{name}:vtime"
+        self.task_users_key = f"fair:{name}:task_users"
+        self.user_queue_prefix = f"fair:{name}:user:"
+        self.processing_prefix = f"queue:{name}:processing:"
+        self.inflight_key = f"queue:{name}:inflight"
+        self.owners_key = f"queue:{name}:owners"
+        self.deliveries_key = f"queue:{name}:deliveries"
+        self.dead_key = f"queue:{name}:dead"
+        self.waiting_key = f"queue:{name}:waiting"
+        self.reserved_at_key = f"queue:{name}:reserved_at"
+        self.stats_key = f"queue:{name}:stats"
+        self._enqueue = self.redis.register_script(FAIR_ENQUEUE_SCRIPT)
+        self._reserve = self.redis.register_script(FAIR_RESERVE_SCRIPT)
+        self._finish = self.redis.register_script(FAIR_FINISH_SCRIPT)
+        self._requeue_expired = self.redis.register_script(FAIR_REQUEUE_EXPIRED_SCRIPT)
+
+    @staticmethod
+    def weight_for(role: str) -> int:
+        """
+        Вес роли при распределении задач
+        """
+        return settings.FAIR_SHARE_WEIGHTS.get(role, 1)
+
+    def _enqueue_keys(self) -> List[str]:
+        return [
+            self.ready_key,
+            self.users_key,
+            self.vtime_key,
+            f"{self.name}:counter",
+            self.waiting_key,
+            self.stats_key,
+        ]
+
+    def _enqueue_args(
+        self,
+        user_id: int,
+        role: str,
+        tasks: List[dict],
+        ttl: Optional[int]
+    ) -> list:
+        return [
+            user_id,
+            self.weight_for(role),
+            User.max_running_tasks(role),
+            task_queue.default_ttl if ttl is None else ttl,
+            f"task:{self.name}:",
+            self.user_queue_prefix,
+            *(json_dumps(task) for task in tasks)
+        ]
+
+    async def enqueue_many(
+        self,
+        user_id: int,
+        role: str,
+        tasks: List[dict],
+        ttl: Optional[int] = None
+    ) -> List[str]:
+        """
+        Добавить задачи пользователя в его подочередь за один запрос.
+        ttl - срок хранения данных задачи в секундах (0 - без срока)
+        """
+        if not tasks:
+            return []
+        return await self._enqueue(
+            keys=self._enqueue_keys(),
+            args=self._enqueue_args(user_id, role, tasks, ttl)
+        )
+
+    async def enqueue_for_users(
+        self,
+        batches: Dict[Tuple[int, str], List[dict]],
+        ttl: Optional[int] = None
+    ) -> List[str]:
+        """
+        Добавить задачи нескольких пользователей за один запрос.
+        Ключ batches - (ID пользователя, роль)
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for (user_id, role), tasks in batches.items():
+            if tasks:
+                await self._enqueue(
+                    keys=self._enqueue_keys(),
+                    args=self._enqueue_args(user_id, role, tasks, ttl),
+                    client=pipe
+                )
+        results = await pipe.execute()
+        return [task_id for ids in results for task_id in ids]
+
+    async def enqueue(
+        self,
+        user_id: int,
+        role: str,
+        task_data: dict,
+        ttl: Optional[int] = None
+    ) -> str:
+        """
+        Добавить задачу пользователя
+        """
+        return (await self.enqueue_many(user_id, role, [task_data], ttl))[0]
+
+    async def reserve_many(
+        self,
+        count: int,
+        visibility_timeout: Optional[int] = None
+    ) -> List[Tuple[str, dict, int]]:
+        """
+        Получить до count задач в обработку с учетом весов пользователей
+        """
+        result = await self._reserve(
+            keys=[
+                self.ready_key,
+                self.users_key,
+                self.vtime_key,
+                f"{self.processing_prefix}{self.worker_id}",
+                self.inflight_key,
+                self.owners_key,
+                self.deliveries_key,
+                self.task_users_key,
+                self.waiting_key,
+                self.reserved_at_key,
+                self.stats_key,
+            ],
+            args=[
+                (visibility_timeout or settings.TASK_VISIBILITY_TIMEOUT) * 1000,
+                self.worker_id,
+                count,
+                self.user_queue_prefix
+            ]
+        )
+        return [
+            (task_id, json_loads(payload), int(deliveries))
+            for task_id, payload, deliveries in zip(result[::3], result[1::3], result[2::3])
+        ]
+
+    async def _finish_task(self, task_id: str, mode: str) -> bool:
+        return bool(await self._finish(
+            keys=[
+                self.ready_key,
+                self.users_key,
+                self.vtime_key,
+                self.inflight_key,
+                self.owners_key,
+                self.deliveries_key,
+                self.task_users_key,
+                self.waiting_key,
+                self.reserved_at_key,
+                self.stats_key,
+            ],
+            args=[task_id, mode, self.processing_prefix, self.user_queue_prefix]
+        ))
+
+    async def ack(self, task_id: str) -> bool:
+        """
+        Подтвердить выполнение задачи и освободить слот пользователя
+        """
+        return await self._finish_task(task_id, "ack")
+
+    async def nack(self, task_id: str, requeue: bool = True) -> bool:
+        """
+        Отказаться от задачи, по умолчанию вернув ее в голову подочереди
+        """
+        return await self._finish_task(task_id, "requeue" if requeue else "drop")
+
+    async def requeue_expired(
+        self,
+        batch_size: Optional[int] = None
+    ) -> Tuple[int, List[Tuple[str, Optional[dict]]]]:
+        """
+        Вернуть в подочереди задачи с истекшим сроком видимости.
+        Возвращает число возвращенных задач и задачи, исчерпавшие лимит
+        выдач (данные None, если срок их хранения истек)
+        """
+        result = await self._requeue_expired(
+            keys=[
+                self.ready_key,
+                self.users_key,
+                self.vtime_key,
+                self.inflight_key,
+                self.owners_key,
+                self.deliveries_key,
+                self.task_users_key,
+                self.dead_key,
+                self.waiting_key,
+                self.reserved_at_key,
+                self.stats_key,
+            ],
+            args=[
+                batch_size or settings.TASK_REAPER_BATCH_SIZE,
+                settings.TASK_MAX_DELIVERIES,
+                self.processing_prefix,
+                self.user_queue_prefix
+            ]
+        )
+        dead = [
+            (task_id, json_loads(payload) if payload else None)
+            for task_id, payload in zip(result[1::2], result[2::2])
+        ]
+        return int(result[0]), dead
+
+    async def extend_visibility(self, task_id: str, seconds: int) -> bool:
+        """
+        Продлить срок видимости выполняющейся задачи
+        """
+        return await task_queue.extend_visibility(self.name, task_id, seconds)
+
+    async def get_user_stats(self, user_id: int) -> dict:
+        """
+        Ожидающие и выполняющиеся задачи пользователя
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(f"{self.user_queue_prefix}{user_id}")
+        pipe.hmget(self.users_key, f"{user_id}:running", f"{user_id}:weight", f"{user_id}:cap")
+        pending, (running, weight, cap) = await pipe.execute()
+        return {
+            "pending": pending,
+            "running": int(running or 0),
+            "weight": int(weight or 0),
+            "cap": int(cap) if cap is not None else None,
+        }
+
+    async def count_active_users(self) -> int:
+        """
+        Количество пользователей, готовых к выдаче задач
+        """
+        return await self.redis.zcard(self.ready_key)
+
+# Очередь задач агентов
+agent_task_queue = FairShareQueue("agent_tasks")
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.redis import redis_manager
+from app.services.fair_scheduler import FairShareQueue, agent_task_queue
+
+logger = logging.getLogger(__name__)
+
+# Извлечение наступивших запусков. Повторяющиеся расписания переносятся на
+# следующий интервал (пропущенные за время простоя запуски не догоняются),
+# разовые удаляются. Запуски сохраняются в хеше promoting до постановки в
+# очередь задач, поэтому сбой между скриптом и постановкой их не теряет.
+# Время берется из Redis.
+PROMOTE_DUE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[1]))
+local promoted = 0
+for i = 1, #due, 2 do
+    local schedule_id, score = due[i], tonumber(due[i + 1])
+    local entry = redis.call('HGET', KEYS[2], schedule_id)
+    if entry then
+        local decoded = cjson.decode(entry)
+        local interval = tonumber(decoded['interval']) or 0
+        if interval > 0 then
+            local skipped = math.floor((now - score) / interval) + 1
+            redis.call('ZADD', KEYS[1], score + skipped * interval, schedule_id)
+        else
+            redis.call('ZREM', KEYS[1], schedule_id)
+            redis.call('HDEL', KEYS[2], schedule_id)
+            redis.call('SREM', ARGV[2] .. decoded['agent_id'], schedule_id)
+        end
+        redis.call('HSET', KEYS[3], schedule_id .. ':' .. due[i + 1], entry)
+        promoted = promoted + 1
+    else
+        redis.call('ZREM', KEYS[1], schedule_id)
+    end
+end
+return promoted
+"""
+
+class RunScheduler:
+    """
+    Отложенные и повторяющиеся запуски потоков агентов.
+
+    Расписания хранятся в хеше, время следующего запуска - в sorted set.
+    Цикл планировщика под блокировкой (один активный экземпляр на кластер)
+    переносит наступившие запуски в очередь задач агентов пакетами. Чтобы
+    тысячи расписаний на одну минуту не создавали всплеск, время каждого
+    повторяющегося расписания сдвигается на случайную величину до
+    SCHEDULE_JITTER секунд; сдвиг сохраняется для всех повторов. Разовые
+    запуски выполняются точно в заданное время.
+    """
+
+    due_key = "schedules:due"
+    entries_key = "schedules:entries"
+    agent_prefix = "schedules:agent:"
+    promoting_key = "schedules:promoting"
+    lock_name = "schedules:promote"
+
+    def __init__(self, queue: Optional[FairShareQueue] = None):
+        self.redis = redis_manager.redis
+        self.queue = queue or agent_task_queue
+        self._promote = self.redis.register_script(PROMOTE_DUE_SCRIPT)
+
+    async def create(
+        self,
+        agent_id: int,
+        user_id: int,
+        role: str,
+        thread: dict,
+        options: dict,
+        run_at: Optional[float] = None,
+        interval: Optional[int] = None
+    ) -> dict:
+        """
+        Создать расписание. run_at - unix-время первого запуска,
+        interval - период повтора в секундах
+        """
+        jitter = min(random.uniform(0, settings.SCHEDULE_JITTER), interval / 2) if interval else 0.0
+        entry = {
+            "id": uuid.uuid4().hex,
+            "agent_id": agent_id,
+            "user_id": user_id,
+            "role": role,
+            "thread": thread,
+            "options": options,
+            "interval": interval,
+            "jitter": jitter,
+            "created_at": time.time(),
+        }
+        next_run = (run_at or time.time() + (interval or 0)) + jitter
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self.entries_key, entry["id"], json.dumps(entry))
+        pipe.zadd(self.due_key, {entry["id"]: next_run})
+        pipe.sadd(f"{self.agent_prefix}{agent_id}", entry["id"])
+        await pipe.execute()
+        return {**entry, "next_run": next_run}
+
+    async def list_for_agent(self, agent_id: int) -> List[dict]:
+        """
+        Расписания агента со временем следующего запуска
+        """
+        ids = list(await self.redis.smembers(f"{self.agent_prefix}{agent_id}"))
+        if not ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hmget(self.entries_key, ids)
+        pipe.zmscore(self.due_key, ids)
+        entries, scores = await pipe.execute()
+        return [
+            {**json.loads(entry), "next_run": score}
+            for entry, score in zip(entries, scores)
+            if entry
+        ]
+
+    async def delete(self, agent_id: int, schedule_id: str) -> bool:
+        """
+        Удалить расписание агента
+        """
+        if not await self.redis.srem(f"{self.agent_prefix}{agent_id}", schedule_id):
+            return False
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hdel(self.entries_key, schedule_id)
+        pipe.zrem(self.due_key, schedule_id)
+        await pipe.execute()
+        return True
+
+    async def promote_due(self, batch_size: Optional[int] = None) -> int:
+        """
+        Перенести пакет наступивших запусков в очередь задач. Запуски,
+        оставшиеся в promoting после сбоя прошлого прохода, ставятся вместе
+        с ним: повторная постановка возможна, потеря - нет
+        """
+        await self._promote(
+            keys=[self.due_key, self.entries_key, self.promoting_key],
+            args=[batch_size or settings.SCHEDULER_BATCH_SIZE, self.agent_prefix]
+        )
+        promoting = await self.redis.hgetall(self.promoting_key)
+        if not promoting:
+            return 0
+
+        enqueued_at = time.time()
+        batches: Dict[Tuple[int, str], List[dict]] = defaultdict(list)
+        for raw in promoting.values():
+            entry = json.loads(raw)
+            batches[(entry["user_id"], entry["role"])].append({
+                "type": "scheduled_run",
+                "schedule_id": entry["id"],
+                "agent_id": entry["agent_id"],
+                "user_id": entry["user_id"],
+                "role": entry["role"],
+                "thread": entry["thread"],
+                "options": entry["options"],
+                "enqueued_at": enqueued_at,
+            })
+        await self.queue.enqueue_for_users(batches)
+        await self.redis.hdel(self.promoting_key, *promoting)
+        return len(promoting)
+
+    async def run(self):
+        """
+        Цикл планировщика. Наступившие запуски переносит только экземпляр,
+        захвативший блокировку; при полном пакете проход повторяется сразу
+        """
+        while True:
+            try:
+                token = await redis_manager.acquire_lock(self.lock_name, settings.SCHEDULER_LOCK_TTL)
+                if token:
+                    try:
+                        started = time.monotonic()
+                        batch_size = settings.SCHEDULER_BATCH_SIZE
+                        while time.monotonic() - started < settings.SCHEDULER_LOCK_TTL / 2:
+                            promoted = await self.promote_due(batch_size)
+                            if promoted:
+                                logger.info(f"Запусков по расписанию поставлено в очередь: {promoted}")
+                            if promoted < batch_size:
+                                break
+                    finally:
+                        await redis_manager.release_lock(self.lock_name, token)
+            except Exception as e:
+                logger.error(f"Ошибка планировщика запусков: {e}")
+            await asyncio.sleep(settings.SCHEDULER_INTERVAL)
+
+# Создаем глобальный экземпляр планировщика
+run_scheduler = RunScheduler()
+
+async def main():
+    """
+    Запуск планировщика отдельным процессом
+    """
+    logging.basicConfig(level=logging.INFO)
+    await run_scheduler.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
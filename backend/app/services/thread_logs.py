@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.redis import redis_manager
+from app.db.session import async_session
+from app.models.agent import Thread
+
+logger = logging.getLogger(__name__)
+
+# Добавление строк в поток логов. Поток попадает в очередь на запись в
+# базу: сразу, если накопилось THREAD_LOG_FLUSH_SIZE строк, иначе со
+# временем первой несохраненной строки.
+APPEND_LOGS_SCRIPT = """
+for i = 5, #ARGV do
+    redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'line', ARGV[i])
+end
+local length = redis.call('XLEN', KEYS[1])
+if length >= tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[2], 0, ARGV[3])
+else
+    redis.call('ZADD', KEYS[2], 'NX', ARGV[4], ARGV[3])
+end
+return length
+"""
+
+# Удаление сохраненных записей (пустой MINID удаляет поток целиком). Поток
+# снимается с очереди на запись, только если новых строк не появилось.
+TRIM_LOGS_SCRIPT = """
+if ARGV[1] == '' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('XTRIM', KEYS[1], 'MINID', ARGV[1])
+end
+local length = redis.call('XLEN', KEYS[1])
+if length == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+elseif length >= tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[2], 0, ARGV[2])
+else
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[2])
+end
+return length
+"""
+
+APPEND_PERSISTED_LOGS = text(
+    "UPDATE threads SET "
+    "logs = (COALESCE(logs::jsonb, '[]'::jsonb) || CAST(:lines AS jsonb))::json, "
+    "logs_flushed_id = :flushed_id "
+    "WHERE id = :id"
+)
+
+def parse_stream_id(stream_id: str) -> Tuple[int, int]:
+    ms, seq = stream_id.split("-")
+    return int(ms), int(seq)
+
+def next_stream_id(stream_id: str) -> str:
+    """
+    Наименьший ID записи после данного
+    """
+    ms, seq = parse_stream_id(stream_id)
+    return f"{ms}-{seq + 1}"
+
+def unflushed_lines(entries: List[Tuple[str, dict]], flushed_id: Optional[str]) -> List[str]:
+    """
+    Строки записей потока после последней сохраненной в базе
+    """
+    flushed = parse_stream_id(flushed_id) if flushed_id else None
+    return [
+        fields["line"]
+        for entry_id, fields in entries
+        if flushed is None or parse_stream_id(entry_id) > flushed
+    ]
+
+class ThreadLogStore:
+    """
+    Логи потоков: добавление в Redis Streams и пакетная запись в PostgreSQL.
+
+    Строки добавляются в поток thread:{id}:logs без обращения к базе.
+    Запись в базу выполняет один процесс под блокировкой: строки многих
+    потоков дописываются к колонке logs одним пакетом UPDATE вместе с ID
+    последней сохраненной записи, после чего удаляются из Redis. Чтение
+    объединяет сохраненные строки с еще не записанным хвостом потока.
+    """
+
+    pending_key = "threads:logs:pending"
+    lock_name = "threads:logs:flush"
+
+    def __init__(self):
+        self.redis = redis_manager.redis
+        self._append = self.redis.register_script(APPEND_LOGS_SCRIPT)
+        self._trim = self.redis.register_script(TRIM_LOGS_SCRIPT)
+
+    @staticmethod
+    def stream_key(thread_id: int) -> str:
+        return f"thread:{thread_id}:logs"
+
+    async def append(self, thread_id: int, lines: List[str]) -> int:
+        """
+        Добавить строки в лог потока. Возвращает число несохраненных строк
+        """
+        if not lines:
+            return 0
+        return await self._append(
+            keys=[self.stream_key(thread_id), self.pending_key],
+            args=[
+                settings.THREAD_LOG_STREAM_MAXLEN,
+                settings.THREAD_LOG_FLUSH_SIZE,
+                thread_id,
+                time.time(),
+                *lines
+            ]
+        )
+
+    async def read(self, db: AsyncSession, thread_id: int) -> List[str]:
+        """
+        Сохраненные строки лога и несохраненный хвост.
+
+        Хвост читается до строки из базы: записи удаляются из Redis только
+        после фиксации в базе, поэтому строки после logs_flushed_id еще есть
+        в прочитанном хвосте, а более ранние отбрасываются.
+        """
+        entries = await self.redis.xrange(self.stream_key(thread_id))
+        result = await db.execute(
+            select(Thread.logs, Thread.logs_flushed_id).filter(Thread.id == thread_id)
+        )
+        row = result.first()
+        if row is None:
+            return []
+        return list(row[0] or []) + unflushed_lines(entries, row[1])
+
+    async def flush(self, batch_size: Optional[int] = None) -> int:
+        """
+        Записать в базу логи потоков, ожидающих записи. Возвращает число строк
+        """
+        due_before = time.time() - settings.THREAD_LOG_FLUSH_INTERVAL
+        thread_ids = [
+            int(thread_id)
+            for thread_id in await self.redis.zrangebyscore(
+                self.pending_key, "-inf", due_before,
+                start=0, num=batch_size or settings.THREAD_LOG_FLUSH_BATCH
+            )
+        ]
+        if not thread_ids:
+            return 0
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for thread_id in thread_ids:
+                pipe.xrange(self.stream_key(thread_id))
+            streams = dict(zip(thread_ids, await pipe.execute()))
+
+        async with async_session() as db:
+            result = await db.execute(
+                select(Thread.id, Thread.logs_flushed_id).filter(Thread.id.in_(thread_ids))
+            )
+            flushed_ids: Dict[int, Optional[str]] = dict(result.all())
+
+            params = []
+            flushed_lines = 0
+            last_ids: Dict[int, str] = {}
+            for thread_id, entries in streams.items():
+                if not entries:
+                    continue
+                last_ids[thread_id] = entries[-1][0]
+                if thread_id not in flushed_ids:
+                    continue
+                # Записи, сохраненные до сбоя между фиксацией и удалением
+                # из Redis, пропускаются
+                lines = unflushed_lines(entries, flushed_ids[thread_id])
+                if lines:
+                    flushed_lines += len(lines)
+                    params.append({
+                        "id": thread_id,
+                        "lines": json.dumps(lines),
+                        "flushed_id": last_ids[thread_id],
+                    })
+
+            if params:
+                await db.execute(APPEND_PERSISTED_LOGS, params)
+                await db.commit()
+
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for thread_id in thread_ids:
+                if thread_id in last_ids and thread_id in flushed_ids:
+                    min_id = next_stream_id(last_ids[thread_id])
+                else:
+                    # Поток удален из базы или лог пуст
+                    min_id = ""
+                await self._trim(
+                    keys=[self.stream_key(thread_id), self.pending_key],
+                    args=[min_id, thread_id, settings.THREAD_LOG_FLUSH_SIZE, now],
+                    client=pipe
+                )
+            await pipe.execute()
+
+        return flushed_lines
+
+    async def run(self):
+        """
+        Периодическая запись логов в базу. Пишет только процесс,
+        захвативший блокировку
+        """
+        while True:
+            try:
+                token = await redis_manager.acquire_lock(self.lock_name, settings.SCHEDULER_LOCK_TTL)
+                if token:
+                    try:
+                        started = time.monotonic()
+                        while time.monotonic() - started < settings.SCHEDULER_LOCK_TTL / 2:
+                            if not await self.flush():
+                                break
+                    finally:
+                        await redis_manager.release_lock(self.lock_name, token)
+            except Exception as e:
+                logger.error(f"Ошибка записи логов потоков: {e}")
+            await asyncio.sleep(min(settings.THREAD_LOG_FLUSH_INTERVAL, 1.0))
+
+# Создаем глобальный экземпляр хранилища логов
+thread_logs = ThreadLogStore()
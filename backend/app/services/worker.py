@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import signal
+import time
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.near_cache import near_cache
+from app.core.redis import browser_state, redis_manager
+from app.crud.agent import agent_crud, thread_crud
+from app.db.session import async_session
+from app.services.browser_manager import BrowserManager
+from app.schemas.agent import ThreadCreate
+from app.services.fair_scheduler import FairShareQueue, agent_task_queue
+from app.services.run_scheduler import run_scheduler
+from app.services.thread_logs import thread_logs
+
+logger = logging.getLogger(__name__)
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class WorkerMetrics:
+    """Задержки и счетчики задач воркера"""
+
+    def __init__(self, window: int = 1000):
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+        self.wait_times: Deque[float] = deque(maxlen=window)
+        self.run_times: Deque[float] = deque(maxlen=window)
+
+    def record(self, wait: Optional[float], run: float, ok: bool):
+        if wait is not None:
+            self.wait_times.append(wait)
+        self.run_times.append(run)
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def to_dict(self) -> dict:
+        wait_times = list(self.wait_times)
+        run_times = list(self.run_times)
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "wait_p50_s": round(percentile(wait_times, 0.50), 3),
+            "wait_p99_s": round(percentile(wait_times, 0.99), 3),
+            "run_p50_s": round(percentile(run_times, 0.50), 3),
+            "run_p99_s": round(percentile(run_times, 0.99), 3),
+        }
+
+class RetryTask(Exception):
+    """Задачу нужно вернуть в очередь и повторить позже"""
+
+class Worker:
+    """
+    Воркер очереди задач агентов.
+
+    Задачи выбираются из очереди пакетами в локальный буфер и выполняются
+    с ограниченной параллельностью. Пока браузерные слоты кластера заняты,
+    новые задачи не выбираются. По SIGTERM воркер перестает брать задачи,
+    возвращает в очередь невыполненные из буфера и дожидается выполняющихся.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[FairShareQueue] = None,
+        concurrency: Optional[int] = None,
+        prefetch: Optional[int] = None
+    ):
+        self.queue = queue or agent_task_queue
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY
+        self.prefetch = prefetch or settings.WORKER_PREFETCH
+        self.browser_manager = BrowserManager()
+        self.metrics = WorkerMetrics()
+        self.handlers: Dict[str, Callable[[dict, int], Awaitable[None]]] = {
+            "launch_thread": self.launch_thread,
+            "scheduled_run": self.scheduled_run,
+        }
+        self.buffer: asyncio.Queue = asyncio.Queue()
+        self.stopping = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    def stop(self):
+        """
+        Прекратить выборку задач
+        """
+        self.stopping.set()
+        self._space.set()
+
+    async def has_browser_capacity(self) -> bool:
+        """
+        Можно ли запустить браузер: в тёплом пуле процесса есть готовый
+        контейнер (его слот уже занят) или в кластере есть свободный слот
+        """
+        if self.browser_manager.claimable():
+            return True
+        return await browser_state.count_leases() < self.browser_manager.max_instances
+
+    async def launch_thread(self, data: dict, deliveries: int):
+        """
+        Запуск браузера потока. Лимит выполняющихся потоков агента
+        проверяется повторно: допуск в API учитывал поток как ожидающий
+        """
+        thread_id = data["thread_id"]
+        async with async_session() as db:
+            agent = await agent_crud.get(db, id=data["agent_id"], profile="with_preset")
+            running = await thread_crud.count_by_status(
+                db, agent_id=data["agent_id"], statuses=["running"]
+            )
+        if agent is None:
+            logger.warning(f"Агент {data['agent_id']} удален, поток {thread_id} не запущен")
+            return
+        if running >= agent.preset.max_threads:
+            if deliveries < settings.TASK_MAX_DELIVERIES:
+                raise RetryTask(f"достигнут лимит активных потоков агента {agent.id}")
+            async with async_session() as db:
+                await thread_crud.set_batch_outcomes(db, outcomes=[{
+                    "id": thread_id,
+                    "status": "error",
+                    "error_message": f"Достигнут лимит активных потоков ({agent.preset.max_threads})",
+                }])
+            return
+
+        browser_id = await self.browser_manager.create_browser(
+            data["agent_id"], thread_id, **data.get("options", {})
+        )
+        if browser_id:
+            outcome = {
+                "id": thread_id,
+                "status": "running",
+                "browser_id": browser_id,
+                "start_time": datetime.utcnow(),
+            }
+        elif deliveries < settings.TASK_MAX_DELIVERIES:
+            raise RetryTask(f"не удалось запустить браузер потока {thread_id}")
+        else:
+            outcome = {
+                "id": thread_id,
+                "status": "error",
+                "error_message": "Не удалось запустить браузер",
+            }
+
+        async with async_session() as db:
+            await thread_crud.set_batch_outcomes(db, outcomes=[outcome])
+
+    async def scheduled_run(self, data: dict, deliveries: int):
+        """
+        Запуск по расписанию: создает поток и ставит задачу на запуск его браузера.
+        Поток создается отдельной задачей, чтобы повтор запуска браузера
+        не создавал новых потоков
+        """
+        async with async_session() as db:
+            agent = await agent_crud.get(db, id=data["agent_id"])
+            if not agent:
+                await run_scheduler.delete(data["agent_id"], data["schedule_id"])
+                logger.warning(
+                    f"Агент {data['agent_id']} удален, расписание {data['schedule_id']} снято"
+                )
+                return
+            thread = await thread_crud.create(
+                db, obj_in=ThreadCreate(**data["thread"]), agent_id=agent.id
+            )
+
+        await self.queue.enqueue(data["user_id"], data["role"], {
+            "type": "launch_thread",
+            "agent_id": data["agent_id"],
+            "thread_id": thread.id,
+            "options": data["options"],
+            "enqueued_at": data["enqueued_at"],
+        }, ttl=0)
+
+    async def fail_launch(self, data: Optional[dict], reason: str):
+        """
+        Перевести в ошибку поток задачи запуска, которая не будет выполнена:
+        иначе поток остается в статусе created и занимает слот агента
+        """
+        if not data or data.get("type") != "launch_thread":
+            return
+        async with async_session() as db:
+            await thread_crud.set_batch_outcomes(db, outcomes=[{
+                "id": data["thread_id"],
+                "status": "error",
+                "error_message": reason,
+            }])
+
+    async def process(self, task: Tuple[str, dict, int]):
+        """
+        Выполнение одной задачи с подтверждением
+        """
+        task_id, data, deliveries = task
+        started = time.time()
+        enqueued_at = data.get("enqueued_at")
+        wait = started - enqueued_at if enqueued_at else None
+        handler = self.handlers.get(data.get("type"))
+
+        try:
+            if handler is None:
+                raise ValueError(f"неизвестный тип задачи {data.get('type')}")
+            await handler(data, deliveries)
+        except RetryTask as e:
+            self.metrics.requeued += 1
+            logger.warning(f"Задача {task_id} возвращена в очередь: {e}")
+            # Пауза перед возвратом, чтобы задача не выбиралась повторно сразу
+            await self._sleep(settings.WORKER_POLL_INTERVAL)
+            await self.queue.nack(task_id)
+            return
+        except Exception as e:
+            run = time.time() - started
+            self.metrics.record(wait, run, ok=False)
+            logger.error(f"Ошибка выполнения задачи {task_id}: {e}")
+            requeue = handler is not None and deliveries < settings.TASK_MAX_DELIVERIES
+            await self.queue.nack(task_id, requeue=requeue)
+            if not requeue:
+                await self.fail_launch(data, f"Не удалось запустить поток: {e}")
+            return
+
+        run = time.time() - started
+        self.metrics.record(wait, run, ok=True)
+        await self.queue.ack(task_id)
+        logger.info(
+            f"Задача {task_id} ({data['type']}) выполнена: "
+            f"ожидание {wait if wait is not None else 0:.2f} с, выполнение {run:.2f} с"
+        )
+
+    async def fetch(self):
+        """
+        Выборка задач пакетами по мере освобождения буфера
+        """
+        while not self.stopping.is_set():
+            try:
+                await self._space.wait()
+                if self.stopping.is_set():
+                    break
+                free = self.prefetch - self.buffer.qsize()
+                if free <= 0:
+                    self._space.clear()
+                    continue
+                if not await self.has_browser_capacity():
+                    await self._sleep(settings.WORKER_POLL_INTERVAL)
+                    continue
+
+                tasks = await self.queue.reserve_many(free)
+                if not tasks:
+                    await self._sleep(settings.WORKER_POLL_INTERVAL)
+                    continue
+                for task in tasks:
+                    self.buffer.put_nowait(task)
+                if self.buffer.qsize() >= self.prefetch:
+                    self._space.clear()
+            except Exception as e:
+                logger.error(f"Ошибка выборки задач: {e}")
+                await self._sleep(settings.WORKER_POLL_INTERVAL)
+
+    async def consume(self):
+        """
+        Выполнение задач из буфера
+        """
+        while True:
+            task = await self.buffer.get()
+            self._space.set()
+            if task is None:
+                return
+            await self.process(task)
+
+    async def reap(self):
+        """
+        Возврат в очередь задач упавших воркеров
+        """
+        while True:
+            await asyncio.sleep(settings.WORKER_REAPER_INTERVAL)
+            try:
+                requeued, dead = await self.queue.requeue_expired()
+                if requeued:
+                    logger.info(f"Возвращено в очередь просроченных задач: {requeued}")
+                for task_id, data in dead:
+                    logger.warning(f"Задача {task_id} исчерпала лимит выдач")
+                    await self.fail_launch(data, "Запуск потока не подтвержден воркером")
+            except Exception as e:
+                logger.error(f"Ошибка возврата просроченных задач: {e}")
+
+    async def report(self):
+        """
+        Периодический вывод метрик воркера
+        """
+        while True:
+            await asyncio.sleep(settings.WORKER_METRICS_INTERVAL)
+            logger.info(f"Метрики воркера: {self.metrics.to_dict()}")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self, consumers: List[asyncio.Task]):
+        """
+        Возврат невыполненных задач буфера и ожидание выполняющихся
+        """
+        returned = 0
+        while not self.buffer.empty():
+            task = self.buffer.get_nowait()
+            if task is not None:
+                await self.queue.nack(task[0])
+                returned += 1
+        if returned:
+            logger.info(f"Возвращено в очередь задач из буфера: {returned}")
+
+        for _ in consumers:
+            self.buffer.put_nowait(None)
+        done, pending = await asyncio.wait(consumers, timeout=settings.WORKER_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            # Неподтвержденные задачи вернет в очередь reaper другого воркера
+            logger.warning(f"Не дождались завершения задач: {len(pending)}")
+
+    async def run(self):
+        """
+        Основной цикл воркера
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        await self.browser_manager.start()
+        consumers = [asyncio.create_task(self.consume()) for _ in range(self.concurrency)]
+        background = [
+            asyncio.create_task(self.reap()),
+            asyncio.create_task(self.report()),
+            asyncio.create_task(run_scheduler.run()),
+            asyncio.create_task(thread_logs.run()),
+            asyncio.create_task(near_cache.listen(redis_manager.redis)),
+        ]
+        logger.info(
+            f"Воркер {self.queue.worker_id} запущен: "
+            f"параллельность {self.concurrency}, предвыборка {self.prefetch}"
+        )
+
+        try:
+            await self.fetch()
+            logger.info("Остановка воркера")
+            await self.drain(consumers)
+        finally:
+            for task in background:
+                task.cancel()
+            logger.info(f"Метрики воркера: {self.metrics.to_dict()}")
+            # Браузеры выполняющихся потоков не останавливаются: остановка
+            # оборвала бы потоки пользователей при каждом перезапуске воркера.
+            # После выхода аренды слотов и heartbeat процесса истекают через
+            # BROWSER_LEASE_TTL, и сверка при старте следующего процесса
+            # (обычно воркера-замены) берет браузеры под управление по
+            # реестру и хешу browsers:owners
+            await self.browser_manager.cleanup(stop_browsers=False)
+
+async def main():
+    """
+    Запуск воркера очереди задач
+    """
+    logging.basicConfig(level=logging.INFO)
+    await Worker().run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
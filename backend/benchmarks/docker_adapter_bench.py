@@ -0,0 +1,89 @@
+"""
+Бенчмарк: задержка обработки запросов API, пока одновременно стартуют 50 контейнеров.
+
+Запуск: python -m benchmarks.docker_adapter_bench [--containers 50] [--start-delay 0.5]
+
+Docker SDK заменен клиентом с блокирующим time.sleep, чтобы воспроизвести
+поведение containers.run без демона. Пробник имитирует легкий обработчик
+запроса и измеряет, насколько его выполнение задерживается event loop'ом.
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+from app.services.docker_adapter import AsyncDockerAdapter
+
+class FakeContainer:
+    def __init__(self, name: str):
+        self.id = name
+        self.status = "running"
+
+class FakeContainers:
+    def __init__(self, start_delay: float):
+        self.start_delay = start_delay
+
+    def run(self, image: str, **kwargs) -> FakeContainer:
+        time.sleep(self.start_delay)
+        return FakeContainer(kwargs.get("name", image))
+
+class FakeClient:
+    def __init__(self, start_delay: float):
+        self.containers = FakeContainers(start_delay)
+
+async def probe(latencies: List[float], stop: asyncio.Event, interval: float = 0.005):
+    """
+    Имитация обработчика запроса: время от планирования до выполнения
+    """
+    while not stop.is_set():
+        scheduled = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append(time.perf_counter() - scheduled - interval)
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+async def run_scenario(mode: str, containers: int, start_delay: float) -> dict:
+    client = FakeClient(start_delay)
+    adapter = AsyncDockerAdapter(client)
+    latencies: List[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop))
+    await asyncio.sleep(0.05)
+
+    async def start_blocking(i: int):
+        # Поведение до адаптера: синхронный вызов внутри async def
+        return client.containers.run("browser", name=f"b{i}")
+
+    async def start_async(i: int):
+        return await adapter.run_container("browser", name=f"b{i}")
+
+    starter = start_blocking if mode == "blocking" else start_async
+    started = time.perf_counter()
+    await asyncio.gather(*(starter(i) for i in range(containers)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    adapter.close()
+    return {
+        "mode": mode,
+        "wall_s": round(elapsed, 2),
+        "probe_samples": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--containers", type=int, default=50)
+    parser.add_argument("--start-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for mode in ("blocking", "adapter"):
+        result = await run_scenario(mode, args.containers, args.start_delay)
+        print(result)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Бенчмарк: задержка записи и чтения состояния браузера и память Redis по кодекам.
+
+Запуск: python -m benchmarks.redis_codec_bench [--keys 500] [--points 300]
+
+Нужен доступный Redis (REDIS_HOST/REDIS_PORT из настроек). Состояние
+браузера имитирует ряды телеметрии за окно в --points точек. Ключи
+бенчмарка удаляются после каждого сценария.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from typing import List
+from app.core.codecs import Codec, msgpack, orjson
+from app.core.redis import BrowserStateManager
+
+def make_state(points: int) -> dict:
+    now = time.time()
+    return {
+        "agent_id": 1,
+        "preset_id": 1,
+        "status": "assigned",
+        "series": {
+            "timestamp": [now + i for i in range(points)],
+            "cpu_percent": [random.uniform(0, 200) for _ in range(points)],
+            "memory_bytes": [float(random.randint(200, 900) * 1024 ** 2) for _ in range(points)],
+            "rx_bytes": [float(i * 4096) for i in range(points)],
+            "tx_bytes": [float(i * 1024) for i in range(points)],
+        },
+    }
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+async def run_scenario(codec: Codec, keys: int, state: dict) -> dict:
+    manager = BrowserStateManager()
+    manager.codec = codec
+    prefix = f"bench_{uuid.uuid4().hex}"
+    browser_ids = [f"{prefix}_{i}" for i in range(keys)]
+    latencies: List[float] = []
+    try:
+        for browser_id in browser_ids:
+            started = time.perf_counter()
+            await manager.set_browser_state(browser_id, state)
+            await manager.get_browser_state(browser_id)
+            latencies.append(time.perf_counter() - started)
+
+        memory = 0
+        for browser_id in browser_ids:
+            memory += await manager.redis.memory_usage(f"browser:{browser_id}:state") or 0
+    finally:
+        await manager.redis.delete(*(f"browser:{browser_id}:state" for browser_id in browser_ids))
+
+    return {
+        "codec": codec.name,
+        "compressed": codec.compress_threshold >= 0,
+        "value_bytes": len(codec.encode(state)),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "redis_bytes_per_key": memory // keys,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=500)
+    parser.add_argument("--points", type=int, default=300)
+    args = parser.parse_args()
+
+    state = make_state(args.points)
+    names = ["json"]
+    if orjson is not None:
+        names.append("orjson")
+    if msgpack is not None:
+        names.append("msgpack")
+
+    for name in names:
+        for threshold in (-1, 1024):
+            print(await run_scenario(Codec(name, compress_threshold=threshold), args.keys, state))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Бенчмарк: пропускная способность очереди задач (задач/с) при разных размерах пакета.
+
+Запуск: python -m benchmarks.task_queue_bench [--tasks 5000] [--batch-sizes 1,10,100,1000]
+
+Нужен доступный Redis (REDIS_HOST/REDIS_PORT из настроек). Бенчмарк пишет
+в очередь bench:<uuid> и удаляет ее ключи после каждого сценария.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import List
+from app.core.redis import task_queue
+
+TASK = {"agent_id": 1, "thread_id": 1, "prompt": "x" * 200}
+
+async def cleanup(queue_name: str):
+    keys = [key async for key in task_queue.redis.scan_iter(f"*{queue_name}*")]
+    if keys:
+        await task_queue.redis.delete(*keys)
+
+async def enqueue_legacy(queue_name: str, tasks: int):
+    """
+    Поведение до пакетного API: INCR, SET и LPUSH на каждую задачу
+    """
+    for _ in range(tasks):
+        task_id = f"task:{queue_name}:{await task_queue.increment(f'{queue_name}:counter')}"
+        await task_queue.set(task_id, TASK)
+        await task_queue.redis.lpush(f"queue:{queue_name}", task_id)
+
+async def dequeue_legacy(queue_name: str, tasks: int):
+    """
+    Поведение до пакетного API: RPOP, GET и DEL на каждую задачу
+    """
+    for _ in range(tasks):
+        task_id = await task_queue.redis.rpop(f"queue:{queue_name}")
+        json.loads(await task_queue.redis.get(task_id))
+        await task_queue.redis.delete(task_id)
+
+async def run_scenario(tasks: int, batch_size: int, inline: bool) -> dict:
+    queue_name = f"bench:{uuid.uuid4().hex}"
+    batch = [TASK] * batch_size
+    try:
+        started = time.perf_counter()
+        if batch_size == 0:
+            await enqueue_legacy(queue_name, tasks)
+        else:
+            for _ in range(tasks // batch_size):
+                await task_queue.enqueue_many(queue_name, batch, inline=inline)
+        enqueue_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if batch_size == 0:
+            await dequeue_legacy(queue_name, tasks)
+        else:
+            while await task_queue.dequeue_many(queue_name, batch_size):
+                pass
+        dequeue_elapsed = time.perf_counter() - started
+    finally:
+        await cleanup(queue_name)
+
+    return {
+        "mode": "legacy" if batch_size == 0 else ("inline" if inline else "keyed"),
+        "batch_size": batch_size or 1,
+        "enqueue_tasks_per_s": round(tasks / enqueue_elapsed),
+        "dequeue_tasks_per_s": round(tasks / dequeue_elapsed),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000")
+    args = parser.parse_args()
+    batch_sizes: List[int] = [int(size) for size in args.batch_sizes.split(",")]
+
+    print(await run_scenario(args.tasks, 0, inline=False))
+    for batch_size in batch_sizes:
+        for inline in (False, True):
+            print(await run_scenario(args.tasks, batch_size, inline))
+
+if __name__ == "__main__":
+    asyncio.run(main())
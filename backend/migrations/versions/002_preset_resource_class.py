@@ -0,0 +1,22 @@
+"""Add resource class to presets
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # NULL - класс ресурсов по умолчанию (DEFAULT_BROWSER_RESOURCE_CLASS)
+    op.add_column('presets', sa.Column('resource_class', sa.String(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('presets', 'resource_class')
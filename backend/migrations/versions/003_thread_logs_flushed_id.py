@@ -0,0 +1,22 @@
+"""Add flushed log stream position to threads
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # ID последней записи Redis Stream логов потока, сохраненной в logs
+    op.add_column('threads', sa.Column('logs_flushed_id', sa.String(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('threads', 'logs_flushed_id')
@@ -0,0 +1,37 @@
+"""Add keyset pagination indexes for agents and threads
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_agents_user_id_created_at_id', 'agents', ['user_id', 'created_at', 'id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_threads_agent_id_created_at_id', 'threads', ['agent_id', 'created_at', 'id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_threads_agent_id_created_at_id', table_name='threads',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_agents_user_id_created_at_id', table_name='agents',
+            postgresql_concurrently=True, if_exists=True
+        )
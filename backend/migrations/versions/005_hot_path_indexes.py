@@ -0,0 +1,64 @@
+"""Add indexes for hot filter columns of threads, agents and presets
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    # Выполняющиеся потоки агента: лимит потоков (count_by_status)
+    ('ix_threads_agent_id_running', 'threads', ['agent_id'], "status = 'running'"),
+    # Все выполняющиеся потоки: get_active_threads, fail_orphaned по updated_at
+    ('ix_threads_running_updated_at', 'threads', ['updated_at'], "status = 'running'"),
+    # Список потоков агента с фильтром по статусу
+    ('ix_threads_agent_id_status_created_at', 'threads', ['agent_id', 'status', 'created_at', 'id'], None),
+    # Активные агенты пользователя
+    ('ix_agents_user_id_active', 'agents', ['user_id'], 'is_active'),
+    # Список агентов пользователя с фильтром по статусу
+    ('ix_agents_user_id_status_created_at', 'agents', ['user_id', 'status', 'created_at', 'id'], None),
+    # Пресеты пользователя от новых к старым и их количество
+    ('ix_presets_user_id_created_at_id', 'presets', ['user_id', 'created_at', 'id'], None),
+    # Поиск пресета по имени у пользователя
+    ('ix_presets_user_id_name', 'presets', ['user_id', 'name'], None),
+]
+
+def drop_invalid_index(name: str, table: str) -> None:
+    """
+    Удаляет индекс, оставшийся невалидным после прерванного CREATE INDEX
+    CONCURRENTLY: if_not_exists такой индекс не пересоздает
+    """
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT NOT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name}
+    ).scalar()
+    if invalid:
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает в транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            drop_invalid_index(name, table)
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,87 @@
+"""
+Отметки активности браузеров через общий Redis. Скрипты Lua выполняются в
+fakeredis (нужен пакет fakeredis[lua]), без него тесты пропускаются.
+"""
+import pytest
+import pytest_asyncio
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.core import redis as redis_module  # noqa: E402
+from app.services import browser_manager as browser_manager_module  # noqa: E402
+from app.services.browser_manager import BrowserManager  # noqa: E402
+from app.services.docker_hosts import DockerHostPool  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def state(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_module.redis, "Redis", lambda **kwargs: client)
+    state = redis_module.BrowserStateManager()
+    monkeypatch.setattr(browser_manager_module, "browser_state", state)
+    yield state
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def manager(monkeypatch, state):
+    monkeypatch.setattr(DockerHostPool, "from_settings", classmethod(lambda cls: cls([])))
+    manager = BrowserManager()
+    yield manager
+    manager.telemetry.close()
+
+
+@pytest.mark.asyncio
+async def test_touch_requires_registered_browser(state):
+    assert not await state.touch_browser("b1")
+    await state.register_browser("b1", {"lease": "l1"})
+    assert await state.touch_browser("b1")
+
+    [(browser_id, (age, extension))] = (await state.take_deadline_updates(["b1", "b2"])).items()
+    assert browser_id == "b1"
+    assert 0 <= age < 5
+    assert extension == 0
+    # Отметка забирается один раз
+    assert await state.take_deadline_updates(["b1"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_unregister_drops_activity(state):
+    await state.register_browser("b1", {"lease": "l1"})
+    await state.touch_browser("b1")
+    await state.extend_browser("b1", 30)
+    await state.unregister_browser("b1")
+    assert await state.take_deadline_updates(["b1"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_remote_activity_postpones_idle_deadline(manager, state):
+    # Браузер принадлежит этому процессу и почти простоял лимит
+    manager.deadlines.add("b1", runtime_limit=100, idle_limit=10)
+    manager.deadlines._entries["b1"].last_activity -= 9
+    assert manager.deadlines.remaining("b1") == pytest.approx(1, abs=0.5)
+
+    # Браузера нет в active_browsers процесса: отметка уходит в Redis,
+    # как из процесса, которому браузер не принадлежит
+    await state.register_browser("b1", {"lease": "l1"})
+    assert await manager.touch_browser("b1")
+
+    await manager._refresh_deadlines(["b1"])
+    assert manager.deadlines.remaining("b1") == pytest.approx(10, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_remote_extension_postpones_hard_deadline(manager, state):
+    manager.deadlines.add("b1", runtime_limit=10)
+    assert not await manager.extend_browser("b1", 60)
+
+    # Продление из процесса, которому браузер не принадлежит, копится в Redis
+    await state.register_browser("b1", {"lease": "l1"})
+    assert await manager.extend_browser("b1", 20)
+    assert await manager.extend_browser("b1", 40)
+    assert manager.deadlines.remaining("b1") == pytest.approx(10, abs=1)
+
+    await manager._refresh_deadlines(["b1"])
+    assert manager.deadlines.remaining("b1") == pytest.approx(70, abs=1)
+    assert await state.take_deadline_updates(["b1"]) == {}
@@ -0,0 +1,64 @@
+import pytest
+
+from app.services.browser_telemetry import (
+    BrowserSeries, RingBuffer, TelemetryCollector, parse_stats
+)
+
+
+def test_ring_buffer_keeps_last_values_in_order():
+    buffer = RingBuffer(3)
+    assert buffer.values() == []
+    for value in (1, 2):
+        buffer.append(value)
+    assert buffer.values() == [1.0, 2.0]
+    for value in (3, 4, 5):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.values() == [3.0, 4.0, 5.0]
+
+
+def test_parse_stats():
+    stats = {
+        "cpu_stats": {
+            "cpu_usage": {"total_usage": 300},
+            "system_cpu_usage": 2000,
+            "online_cpus": 2,
+        },
+        "precpu_stats": {
+            "cpu_usage": {"total_usage": 100},
+            "system_cpu_usage": 1000,
+        },
+        "memory_stats": {"usage": 1000, "stats": {"inactive_file": 200}},
+        "networks": {
+            "eth0": {"rx_bytes": 10, "tx_bytes": 20},
+            "eth1": {"rx_bytes": 1, "tx_bytes": 2},
+        },
+    }
+    sample = parse_stats(stats)
+    assert sample["cpu_percent"] == pytest.approx(40.0)
+    assert sample["memory_bytes"] == 800
+    assert sample["rx_bytes"] == 11
+    assert sample["tx_bytes"] == 22
+
+
+def test_parse_stats_of_stopped_container():
+    assert parse_stats({"cpu_stats": {}, "memory_stats": {}}) is None
+
+
+def test_parse_stats_without_system_delta():
+    sample = parse_stats({"memory_stats": {"usage": 100}})
+    assert sample["cpu_percent"] == 0.0
+    assert sample["rx_bytes"] == 0
+
+
+def test_network_traffic_counts_as_activity():
+    active = []
+    collector = TelemetryCollector(max_streams=1, on_activity=active.append)
+    collector.series["b1"] = BrowserSeries(10, agent_id=1, preset_id=None)
+    sample = {"timestamp": 0.0, "cpu_percent": 1.0, "memory_bytes": 1.0, "rx_bytes": 10, "tx_bytes": 0}
+
+    collector._record("b1", sample)
+    collector._record("b1", {**sample, "cpu_percent": 50.0})
+    collector._record("b1", {**sample, "tx_bytes": 5})
+    collector.close()
+    assert active == ["b1", "b1"]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.core import codecs
+from app.core.codecs import COMPRESSED, FORMAT_JSON, FORMAT_MSGPACK, Codec, CodecError
+
+VALUE = {"id": 1, "name": "агент", "tags": ["a", "b"], "score": 0.5, "meta": None}
+
+AVAILABLE = ["json"]
+if codecs.orjson is not None:
+    AVAILABLE.append("orjson")
+if codecs.msgpack is not None:
+    AVAILABLE.append("msgpack")
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_round_trip(name):
+    codec = Codec(name, compress_threshold=-1)
+    data = codec.encode(VALUE)
+    assert not data[0] & COMPRESSED
+    assert data[0] == (FORMAT_MSGPACK if name == "msgpack" else FORMAT_JSON)
+    assert codec.decode(data) == VALUE
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_round_trip_compressed(name):
+    codec = Codec(name, compress_threshold=16)
+    value = {"logs": ["строка лога"] * 100}
+    data = codec.encode(value)
+    assert data[0] & COMPRESSED
+    assert len(data) < len(json.dumps(value))
+    assert codec.decode(data) == value
+
+
+@pytest.mark.parametrize("name", AVAILABLE)
+def test_decodes_values_of_other_codecs(name):
+    codec = Codec(name, compress_threshold=-1)
+    for other in AVAILABLE:
+        assert codec.decode(Codec(other, compress_threshold=0).encode(VALUE)) == VALUE
+
+
+@pytest.mark.parametrize("legacy", [json.dumps(VALUE), json.dumps([1, 2]), json.dumps("text"), "42"])
+def test_decodes_legacy_json_without_header(legacy):
+    assert Codec("json").decode(legacy.encode()) == json.loads(legacy)
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        Codec("pickle")
+    with pytest.raises(CodecError):
+        Codec("json").encode({"value": object()})
+    with pytest.raises(CodecError):
+        Codec("json").decode(bytes([FORMAT_JSON | COMPRESSED]) + b"not zlib")
+    with pytest.raises(CodecError):
+        Codec("json").decode(b"")
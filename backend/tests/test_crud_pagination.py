@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.crud.agent import thread_crud
+from app.crud.base import CRUDBase
+from app.models.agent import Thread
+
+NOW = datetime(2026, 1, 1, 12, 0, 0, 123456)
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    ))
+
+
+def make_threads(count: int):
+    return [Thread(id=100 - i, created_at=NOW - timedelta(seconds=i)) for i in range(count)]
+
+
+def test_cursor_round_trip():
+    cursor = CRUDBase.encode_cursor(Thread(id=42, created_at=NOW))
+    assert "=" not in cursor
+    assert CRUDBase.decode_cursor(cursor) == (NOW, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", "WyJ4IiwgMV0"])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        CRUDBase.decode_cursor(cursor)
+
+
+@pytest.mark.asyncio
+async def test_get_page_orders_newest_first(recording_session):
+    recording_session.rows = make_threads(3)
+    objs, next_cursor = await thread_crud.get_page(
+        recording_session, limit=5, filters={"agent_id": 1}
+    )
+
+    sql = compile_sql(recording_session.statements[-1])
+    assert "ORDER BY threads.created_at DESC, threads.id DESC" in sql
+    assert "LIMIT 6" in sql
+    assert "threads.agent_id = 1" in sql
+    assert [obj.id for obj in objs] == [100, 99, 98]
+    assert next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_page_returns_cursor_of_last_row(recording_session):
+    recording_session.rows = make_threads(3)
+    objs, next_cursor = await thread_crud.get_page(recording_session, limit=2)
+
+    assert [obj.id for obj in objs] == [100, 99]
+    assert CRUDBase.decode_cursor(next_cursor) == (objs[-1].created_at, objs[-1].id)
+
+    await thread_crud.get_page(recording_session, limit=2, cursor=next_cursor)
+    sql = compile_sql(recording_session.statements[-1])
+    assert "(threads.created_at, threads.id) < ('2026-01-01 11:59:59.123456', 99)" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_multi_offset_has_stable_order(recording_session):
+    await thread_crud.get_multi(recording_session, skip=20, limit=10, filters={"agent_id": 1})
+    sql = compile_sql(recording_session.statements[-1])
+    assert "ORDER BY threads.created_at DESC, threads.id DESC" in sql
+    assert "LIMIT 10 OFFSET 20" in sql
+
+
+@pytest.mark.asyncio
+async def test_offset_and_cursor_modes_share_first_page(recording_session):
+    recording_session.rows = make_threads(2)
+    by_offset = await thread_crud.get_multi(recording_session, skip=0, limit=2)
+    by_cursor, _ = await thread_crud.get_page(recording_session, limit=2)
+
+    offset_sql, cursor_sql = (compile_sql(s) for s in recording_session.statements[-2:])
+    order_by = "ORDER BY threads.created_at DESC, threads.id DESC"
+    assert order_by in offset_sql and order_by in cursor_sql
+    assert [obj.id for obj in by_offset] == [obj.id for obj in by_cursor] == [100, 99]
@@ -0,0 +1,28 @@
+import pytest
+
+from app.crud.agent import agent_crud
+from app.crud.user import user_crud
+from app.models.agent import Agent
+from app.models.user import User
+
+
+@pytest.mark.asyncio
+async def test_update_sets_column_missing_from_cached_object(recording_session):
+    # Как у объекта из кеша: колонки cache_exclude не загружены
+    user = User(id=1, email="user@example.com", role="free_user")
+    updated = await user_crud.update(
+        recording_session, db_obj=user, obj_in={"hashed_password": "new-hash", "google_id": "g-1"}
+    )
+
+    assert updated.hashed_password == "new-hash"
+    assert updated.google_id == "g-1"
+    assert recording_session.added == [user]
+
+
+@pytest.mark.asyncio
+async def test_update_skips_unknown_fields(recording_session):
+    agent = Agent(id=1, name="old")
+    await agent_crud.update(recording_session, db_obj=agent, obj_in={"name": "new", "extra": 1})
+
+    assert agent.name == "new"
+    assert not hasattr(agent, "extra")
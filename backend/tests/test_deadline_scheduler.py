@@ -0,0 +1,106 @@
+import pytest
+
+from app.services import deadline_scheduler
+from app.services.deadline_scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(deadline_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def test_expired_in_deadline_order(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("late", runtime_limit=30)
+    scheduler.add("early", runtime_limit=10)
+    scheduler.add("idle", idle_limit=20)
+
+    clock.now += 15
+    assert scheduler.pop_expired() == ["early"]
+    clock.now += 10
+    assert scheduler.pop_expired() == ["idle"]
+    clock.now += 10
+    assert scheduler.pop_expired() == ["late"]
+    assert len(scheduler) == 0
+
+
+def test_extend_postpones_hard_deadline(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("browser", runtime_limit=10)
+    assert scheduler.extend("browser", 20)
+
+    clock.now += 15
+    assert scheduler.pop_expired() == []
+    assert scheduler.remaining("browser") == pytest.approx(15)
+    clock.now += 15
+    assert scheduler.pop_expired() == ["browser"]
+
+
+def test_touch_postpones_idle_deadline(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("browser", runtime_limit=100, idle_limit=10)
+
+    clock.now += 8
+    assert scheduler.touch("browser")
+    clock.now += 8
+    assert scheduler.pop_expired() == []
+    clock.now += 3
+    assert scheduler.pop_expired() == ["browser"]
+
+
+def test_removed_and_replaced_keys_skip_stale_entries(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("removed", runtime_limit=5)
+    scheduler.add("replaced", runtime_limit=5)
+    assert scheduler.remove("removed")
+    # Повторная регистрация: старая запись кучи отбрасывается по поколению
+    scheduler.add("replaced", runtime_limit=50)
+
+    clock.now += 10
+    assert scheduler.pop_expired() == []
+    assert scheduler.remaining("removed") is None
+    clock.now += 50
+    assert scheduler.pop_expired() == ["replaced"]
+
+
+def test_unknown_keys(clock):
+    scheduler = DeadlineScheduler()
+    assert not scheduler.touch("missing")
+    assert not scheduler.extend("missing", 10)
+    assert not scheduler.remove("missing")
+    # Без лимитов ключ не попадает в кучу и не истекает
+    scheduler.add("unbounded")
+    clock.now += 10 ** 6
+    assert scheduler.pop_expired() == []
+
+
+def test_due_lists_keys_without_popping(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("early", runtime_limit=10)
+    scheduler.add("idle", idle_limit=12)
+    scheduler.add("late", runtime_limit=30)
+
+    clock.now += 15
+    assert sorted(scheduler.due()) == ["early", "idle"]
+    assert len(scheduler) == 3
+
+
+def test_touch_at_moment_only_moves_forward(clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add("browser", idle_limit=10)
+
+    clock.now += 9
+    assert scheduler.touch("browser", at=clock.now - 1)
+    assert scheduler.remaining("browser") == pytest.approx(9)
+    assert scheduler.touch("browser", at=clock.now - 5)
+    assert scheduler.remaining("browser") == pytest.approx(9)
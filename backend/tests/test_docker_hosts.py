@@ -0,0 +1,68 @@
+import pytest
+
+from app.services.docker_hosts import DockerHost, DockerHostPool, container_demand, parse_memory
+
+SMALL = {"mem_limit": "1g", "cpu_quota": 100000}
+LARGE = {"mem_limit": "4g", "cpu_quota": 200000}
+
+
+@pytest.fixture
+def make_pool():
+    hosts = []
+
+    def make(strategy: str, *capacities):
+        for i, (memory, cpus) in enumerate(capacities):
+            hosts.append(DockerHost(f"host{i}", None, memory=memory, cpus=cpus))
+        return DockerHostPool(hosts[-len(capacities):], strategy=strategy)
+
+    yield make
+    for host in hosts:
+        host.docker.close()
+
+
+def test_parse_memory():
+    assert parse_memory("512m") == 512 * 1024 ** 2
+    assert parse_memory("1.5g") == int(1.5 * 1024 ** 3)
+    assert parse_memory(1024) == 1024
+    assert container_demand(LARGE) == {"memory": 4 * 1024 ** 3, "cpus": 2.0}
+
+
+def test_binpack_fills_the_tightest_host(make_pool):
+    pool = make_pool("binpack", ("8g", 4), ("4g", 2))
+    assert pool.place(SMALL).name == "host1"
+    assert pool.place(SMALL).name == "host1"
+    # На host1 осталось 2g и 0 CPU: контейнер помещается только на host0
+    assert pool.place(SMALL).name == "host0"
+
+
+def test_least_loaded_spreads_containers(make_pool):
+    pool = make_pool("least_loaded", ("8g", 4), ("8g", 4))
+    first = pool.place(SMALL).name
+    second = pool.place(SMALL).name
+    assert {first, second} == {"host0", "host1"}
+
+
+def test_place_skips_unavailable_hosts_and_reserves(make_pool):
+    pool = make_pool("binpack", ("8g", 4), ("8g", 4), ("16g", 8))
+    pool.get("host0").draining = True
+    pool.get("host1").healthy = False
+
+    host = pool.place(LARGE)
+    assert host.name == "host2"
+    assert host.allocated_memory == 4 * 1024 ** 3
+    assert host.allocated_cpus == 2.0
+
+    pool.release("host2", LARGE)
+    assert host.allocated_memory == 0
+    assert host.allocated_cpus == 0.0
+
+
+def test_place_returns_none_when_nothing_fits(make_pool):
+    pool = make_pool("binpack", ("2g", 4))
+    assert pool.place(LARGE) is None
+    assert pool.get("host0").allocated_memory == 0
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        DockerHostPool([], strategy="random")
@@ -0,0 +1,91 @@
+"""
+Stride-распределение FairShareQueue. Скрипты Lua выполняются в fakeredis
+(нужен пакет fakeredis[lua]), без него тесты пропускаются.
+"""
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.core.config import settings  # noqa: E402
+from app.core.redis import task_queue  # noqa: E402
+from app.services.fair_scheduler import FairShareQueue  # noqa: E402
+
+ADMIN, FREE = 1, 2  # веса 8 и 1, free_user выполняет не более 5 задач
+
+
+@pytest_asyncio.fixture
+async def queue(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(task_queue, "redis", client)
+    yield FairShareQueue("test")
+    await client.aclose()
+
+
+async def fill(queue: FairShareQueue, count: int):
+    await queue.enqueue_many(ADMIN, "admin", [{"user": ADMIN}] * count)
+    await queue.enqueue_many(FREE, "free_user", [{"user": FREE}] * count)
+
+
+@pytest.mark.asyncio
+async def test_shares_follow_role_weights(queue):
+    await fill(queue, 20)
+    reserved = await queue.reserve_many(9)
+    assert Counter(payload["user"] for _, payload, _ in reserved) == {ADMIN: 8, FREE: 1}
+
+
+@pytest.mark.asyncio
+async def test_running_cap_removes_user_until_ack(queue):
+    await fill(queue, 20)
+    reserved = await queue.reserve_many(40)
+    users = Counter(payload["user"] for _, payload, _ in reserved)
+    assert users == {ADMIN: 20, FREE: 5}
+    assert (await queue.get_user_stats(FREE))["running"] == 5
+    assert await queue.count_active_users() == 0
+
+    task_id = next(task_id for task_id, payload, _ in reserved if payload["user"] == FREE)
+    assert await queue.ack(task_id)
+    assert await queue.count_active_users() == 1
+    [(_, payload, deliveries)] = await queue.reserve_many(5)
+    assert payload["user"] == FREE
+    assert deliveries == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_user_does_not_bank_credit(queue):
+    await queue.enqueue_many(ADMIN, "admin", [{"user": ADMIN}] * 40)
+    await queue.reserve_many(32)  # проход администратора вырос до 4
+
+    # Новый пользователь начинает с текущего виртуального времени, а не с нуля
+    await queue.enqueue_many(FREE, "free_user", [{"user": FREE}] * 5)
+    reserved = await queue.reserve_many(9)
+    assert Counter(payload["user"] for _, payload, _ in reserved) == {ADMIN: 8, FREE: 1}
+
+
+@pytest.mark.asyncio
+async def test_nack_requeues_to_head_of_user_queue(queue):
+    await queue.enqueue_many(ADMIN, "admin", [{"n": 1}, {"n": 2}])
+    [(task_id, payload, _)] = await queue.reserve_many(1)
+    assert payload == {"n": 1}
+    assert await queue.nack(task_id)
+
+    [(again_id, payload, deliveries)] = await queue.reserve_many(1)
+    assert again_id == task_id
+    assert deliveries == 2
+
+
+@pytest.mark.asyncio
+async def test_requeue_expired_returns_dead_payloads(queue, monkeypatch):
+    monkeypatch.setattr(settings, "TASK_MAX_DELIVERIES", 1)
+    await queue.enqueue(ADMIN, "admin", {"type": "launch_thread", "thread_id": 7}, ttl=0)
+    [(task_id, _, _)] = await queue.reserve_many(1)
+    assert await task_queue.redis.ttl(task_id) == -1
+
+    await task_queue.redis.zadd(queue.inflight_key, {task_id: 0})
+    requeued, dead = await queue.requeue_expired()
+    assert requeued == 0
+    assert dead == [(task_id, {"type": "launch_thread", "thread_id": 7})]
+    assert await queue.reserve_many(1) == []
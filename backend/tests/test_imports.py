@@ -0,0 +1,29 @@
+"""
+Модули сервисов импортируются в чистом интерпретаторе, без предварительного
+импорта моделей (как при запуске python -m app.services.worker)
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", [
+    "app.crud.user",
+    "app.crud.agent",
+    "app.core.deps",
+    "app.services.browser_manager",
+    "app.services.worker",
+])
+def test_module_imports_in_fresh_interpreter(module):
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stderr
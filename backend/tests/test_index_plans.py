@@ -0,0 +1,126 @@
+"""
+Планы запросов CRUD: используются индексы миграций 004 и 005.
+
+Запросы берутся из самих методов CRUD (через сессию, запоминающую
+запросы) и выполняются как EXPLAIN (FORMAT JSON) с отключенным
+последовательным сканированием: на маленькой тестовой базе планировщик
+иначе выбирает seq scan, а проверяется, что подходящий индекс вообще
+применим. Нужна база DATABASE_URL с примененными миграциями, без нее
+тесты пропускаются.
+"""
+import json
+from datetime import datetime
+from typing import Set
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.crud.agent import agent_crud, thread_crud
+from app.crud.base import CRUDBase
+from app.crud.preset import preset_crud
+from app.models.agent import Thread
+
+NOW = datetime(2026, 1, 1)
+
+def plan_indexes(node: dict) -> Set[str]:
+    """
+    Имена индексов во всех узлах плана
+    """
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+@pytest_asyncio.fixture
+async def explain(recording_session):
+    url = make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url)
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+
+    await conn.execute(text("SET enable_seqscan = off"))
+
+    async def run(call) -> Set[str]:
+        """
+        Индексы в плане запроса, выполненного вызовом CRUD
+        """
+        recording_session.statements.clear()
+        await call(recording_session)
+        statement = recording_session.statements[-1]
+        sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan_indexes(plan[0]["Plan"])
+
+    yield run
+    await conn.close()
+    await engine.dispose()
+
+CASES = [
+    (
+        "thread_crud.get_page: потоки агента",
+        lambda db: thread_crud.get_page(
+            db, cursor=CRUDBase.encode_cursor(Thread(created_at=NOW, id=1000)),
+            filters={"agent_id": 1}
+        ),
+        {"ix_threads_agent_id_created_at_id", "ix_threads_agent_id_status_created_at"},
+    ),
+    (
+        "thread_crud.get_page: потоки агента по статусу",
+        lambda db: thread_crud.get_page(db, filters={"agent_id": 1, "status": "error"}),
+        {"ix_threads_agent_id_status_created_at"},
+    ),
+    (
+        "thread_crud.count_by_status: лимит потоков агента",
+        lambda db: thread_crud.count_by_status(db, agent_id=1, statuses=["running"]),
+        {"ix_threads_agent_id_running", "ix_threads_agent_id_status_created_at"},
+    ),
+    (
+        "thread_crud.get_active_threads(agent_id)",
+        lambda db: thread_crud.get_active_threads(db, agent_id=1),
+        {"ix_threads_agent_id_running"},
+    ),
+    (
+        "thread_crud.fail_orphaned",
+        lambda db: thread_crud.fail_orphaned(
+            db, live_browser_ids=["live"], updated_before=NOW, error_message="test"
+        ),
+        {"ix_threads_running_updated_at"},
+    ),
+    (
+        "agent_crud.get_page: агенты пользователя",
+        lambda db: agent_crud.get_page(db, filters={"user_id": 1}),
+        {"ix_agents_user_id_created_at_id", "ix_agents_user_id_status_created_at"},
+    ),
+    (
+        "agent_crud.get_active_agents(user_id)",
+        lambda db: agent_crud.get_active_agents(db, user_id=1),
+        {"ix_agents_user_id_active"},
+    ),
+    (
+        "preset_crud.get_user_preset_count",
+        lambda db: preset_crud.get_user_preset_count(db, user_id=1),
+        {"ix_presets_user_id_created_at_id", "ix_presets_user_id_name"},
+    ),
+    (
+        "preset_crud.get_by_name_and_user",
+        lambda db: preset_crud.get_by_name_and_user(db, name="default", user_id=1),
+        {"ix_presets_user_id_name"},
+    ),
+]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("title, call, expected", CASES, ids=[case[0] for case in CASES])
+async def test_crud_query_uses_index(explain, title, call, expected):
+    used = await explain(call)
+    assert used & expected, f"{title}: {', '.join(sorted(used)) or 'seq scan'}"
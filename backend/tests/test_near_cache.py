@@ -0,0 +1,69 @@
+from app.core.near_cache import NearCache
+
+
+def make_cache(**kwargs) -> NearCache:
+    cache = NearCache(prefixes=["crud:"], max_entries=kwargs.pop("max_entries", 100), ttl=60)
+    cache.active = True
+    return cache
+
+
+def test_put_and_get():
+    cache = make_cache()
+    cache.put("crud:agents:1", b"value", cache.generation())
+    assert cache.get("crud:agents:1") == b"value"
+    assert cache.enabled_for("crud:agents:1")
+    assert not cache.enabled_for("session:1")
+
+
+def test_value_read_before_invalidation_is_not_cached():
+    cache = make_cache()
+    generation = cache.generation()
+    # Ключ изменен, пока значение читалось из Redis
+    cache.invalidate("crud:agents:1")
+    cache.put("crud:agents:1", b"stale", generation)
+    assert cache.get("crud:agents:1") is None
+
+    cache.put("crud:agents:1", b"fresh", cache.generation())
+    assert cache.get("crud:agents:1") == b"fresh"
+
+
+def test_invalidation_of_other_key_does_not_block_put():
+    cache = make_cache()
+    generation = cache.generation()
+    cache.invalidate("crud:agents:2")
+    cache.put("crud:agents:1", b"value", generation)
+    assert cache.get("crud:agents:1") == b"value"
+
+
+def test_forgotten_generations_fall_back_to_floor():
+    cache = make_cache(max_entries=2)
+    generation = cache.generation()
+    for i in range(3):
+        cache.invalidate(f"crud:agents:{i}")
+    # Номера инвалидаций забыты, действует общий нижний порог
+    cache.put("crud:agents:0", b"stale", generation)
+    assert cache.get("crud:agents:0") is None
+
+
+def test_inactive_cache_and_clear():
+    cache = make_cache()
+    cache.active = False
+    cache.put("crud:agents:1", b"value", cache.generation())
+    assert cache.get("crud:agents:1") is None
+
+    cache.active = True
+    generation = cache.generation()
+    cache.clear()
+    cache.put("crud:agents:1", b"value", generation)
+    assert cache.get("crud:agents:1") is None
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    for key in ("crud:a", "crud:b"):
+        cache.put(key, key.encode(), cache.generation())
+    cache.get("crud:a")
+    cache.put("crud:c", b"crud:c", cache.generation())
+    assert cache.get("crud:b") is None
+    assert cache.get("crud:a") == b"crud:a"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,65 @@
+"""
+Перенос наступивших запусков в очередь. Скрипты Lua выполняются в fakeredis
+(нужен пакет fakeredis[lua]), без него тесты пропускаются.
+"""
+import time
+
+import pytest
+import pytest_asyncio
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.core.config import settings  # noqa: E402
+from app.core.redis import redis_manager, task_queue  # noqa: E402
+from app.services.fair_scheduler import FairShareQueue  # noqa: E402
+from app.services.run_scheduler import RunScheduler  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def scheduler(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(task_queue, "redis", client)
+    monkeypatch.setattr(redis_manager, "redis", client)
+    monkeypatch.setattr(settings, "SCHEDULE_JITTER", 60)
+    yield RunScheduler(FairShareQueue("test"))
+    await client.aclose()
+
+
+async def create(scheduler: RunScheduler, **kwargs) -> dict:
+    return await scheduler.create(
+        agent_id=1, user_id=1, role="admin", thread={}, options={}, **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_jitter_applies_only_to_interval_schedules(scheduler):
+    run_at = time.time() + 3600
+    once = await create(scheduler, run_at=run_at)
+    assert once["next_run"] == run_at
+    assert once["jitter"] == 0
+
+    repeated = await create(scheduler, run_at=run_at, interval=20)
+    assert run_at <= repeated["next_run"] <= run_at + 10
+
+
+@pytest.mark.asyncio
+async def test_failed_enqueue_keeps_runs_for_next_pass(scheduler, monkeypatch):
+    entry = await create(scheduler, run_at=time.time() - 1)
+
+    async def fail(batches, ttl=None):
+        raise ConnectionError("redis недоступен")
+
+    enqueue_for_users = scheduler.queue.enqueue_for_users
+    monkeypatch.setattr(scheduler.queue, "enqueue_for_users", fail)
+    with pytest.raises(ConnectionError):
+        await scheduler.promote_due()
+    # Разовое расписание уже удалено, но запуск не потерян
+    assert await scheduler.list_for_agent(1) == []
+    monkeypatch.setattr(scheduler.queue, "enqueue_for_users", enqueue_for_users)
+
+    assert await scheduler.promote_due() == 1
+    [(_, payload, _)] = await scheduler.queue.reserve_many(5)
+    assert payload["type"] == "scheduled_run"
+    assert payload["schedule_id"] == entry["id"]
+    assert await scheduler.promote_due() == 0
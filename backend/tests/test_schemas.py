@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.agent import Agent, AgentCreate, AgentUpdate, Preset, PresetCreate, PresetUpdate
+
+NOW = datetime(2026, 1, 1)
+PRESET = {"name": "p", "ai_model": "gpt", "system_prompt": "s"}
+
+
+@pytest.mark.parametrize("schema", [PresetCreate, PresetUpdate])
+def test_preset_input_rejects_unknown_resource_class(schema):
+    assert schema(**PRESET, resource_class="standard").resource_class == "standard"
+    with pytest.raises(ValidationError):
+        schema(**PRESET, resource_class="legacy")
+
+
+def test_agent_input_rejects_unknown_resource_class():
+    with pytest.raises(ValidationError):
+        AgentCreate(name="a", preset_id=1, browser_config={"resource_class": "legacy"})
+    with pytest.raises(ValidationError):
+        AgentUpdate(name="a", browser_config={"resource_class": "legacy"})
+    assert AgentUpdate(name="a", browser_config={"headless": True}).browser_config == {"headless": True}
+
+
+def test_responses_accept_legacy_resource_class():
+    preset = Preset(**PRESET, resource_class="legacy", id=1, user_id=1, created_at=NOW, updated_at=NOW)
+    assert preset.resource_class == "legacy"
+    agent = Agent(
+        name="a", browser_config={"resource_class": "legacy"},
+        id=1, user_id=1, preset_id=1, created_at=NOW, updated_at=NOW
+    )
+    assert agent.browser_config == {"resource_class": "legacy"}